@@ -0,0 +1,166 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+#  batch.py
+#
+#  Copyright 2014 Manu Varkey <manuvarkey@gmail.com>
+#
+#  This program is free software; you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation; either version 2 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software
+#  Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+#  MA 02110-1301, USA.
+#
+#
+
+"""Render CMBs and bills of a project without the user interface
+
+    Usage: python3 -m cmbautomiser.batch PROJECT [-o FOLDER] [-c N ...] [-b N ...] [-j JOBS] [-s FILE]
+"""
+
+import sys, os, time, argparse, logging, shutil
+
+# local files import
+from . import misc, data
+
+# Setup logger object
+log = logging.getLogger(__name__)
+
+
+def load_project(filename):
+    """Load project file into DataModel
+
+        Returns:
+            [DataModel object, project settings dictionary]
+    """
+    program_settings = misc.init_global_platform_vars()
+    project_settings = misc.init_project_settings_dict(program_settings)
+    data_model = data.datamodel.DataModel(program_settings=program_settings, project_settings=project_settings)
+    loader = data_model.load_file(filename)
+    while True:
+        try:
+            next(loader)
+        except StopIteration as stop:
+            project_settings.update(stop.value)
+            break
+    data_model.update()
+    return [data_model, project_settings]
+
+def render_project(data_model, project_settings, folder, cmbs=None, bills=None, max_jobs=None):
+    """Render CMBs and bills of project to folder
+
+        Arguments:
+            data_model: DataModel of project
+            project_settings: Project settings dictionary
+            folder: Output folder
+            cmbs: List of indices of CMBs to render, None for all
+            bills: List of indices of bills to render, None for all
+            max_jobs: Maximum number of latex processes run in parallel,
+                      defaults to misc.LATEX_MAX_JOBS
+        Returns:
+            List of results as tuples (document name, status code, message, time taken)
+    """
+    if cmbs is None:
+        cmbs = range(len(data_model.cmbs))
+    if bills is None:
+        bills = [row for row, bill in enumerate(data_model.bills)
+                 if bill.data.bill_type in (misc.BILL_NORMAL, misc.BILL_FINAL)]
+    jobs = [('cmb_' + str(row+1), data_model.render_cmb, row, len(data_model.cmbs)) for row in cmbs]
+    jobs += [('bill_' + str(row+1), data_model.render_bill, row, len(data_model.bills)) for row in bills]
+
+    results = []
+    for name, render_func, row, count in jobs:
+        start = time.perf_counter()
+        if 0 <= row < count:
+            code = render_func(folder, project_settings, [row], max_jobs=max_jobs)
+        else:
+            code = (misc.CMB_ERROR, 'Document not found in project')
+        duration = time.perf_counter() - start
+        results.append((name, code[0], code[1], duration))
+        log.info('render_project - ' + name + ' - ' + code[1])
+    return results
+
+def main(argv=None):
+    """Command line entry point, returns exit status"""
+    parser = argparse.ArgumentParser(prog='cmbautomiser.batch',
+                                     description='Render CMBs and bills of a CMBAutomiser project')
+    parser.add_argument('project', help='Project file (.proj)')
+    parser.add_argument('-o', '--output', help='Output folder (default: folder of project file)')
+    parser.add_argument('-c', '--cmbs', type=int, nargs='+', metavar='N',
+                        help='Numbers of CMBs to render (default: all if no bills selected)')
+    parser.add_argument('-b', '--bills', type=int, nargs='+', metavar='N',
+                        help='Numbers of bills to render (default: all if no CMBs selected)')
+    parser.add_argument('-j', '--jobs', type=int, default=misc.LATEX_MAX_JOBS,
+                        help='Maximum number of latex processes run in parallel (default: %(default)s)')
+    parser.add_argument('-s', '--save', metavar='FILE',
+                        help='Save project to FILE, as archive if extension is ' + misc.PROJECT_ARCHIVE_EXT + ' else as JSON')
+    parser.add_argument('-v', '--verbose', action='store_true', help='Log progress messages')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+                        stream=sys.stderr, level=logging.INFO if args.verbose else logging.WARNING)
+
+    # Load project
+    try:
+        data_model, project_settings = load_project(args.project)
+    except (OSError, ValueError, IndexError, KeyError, TypeError) as e:
+        print('Error opening project file - ' + str(e), file=sys.stderr)
+        return 2
+
+    # Convert project
+    if args.save:
+        try:
+            data_model.save_file(args.save, project_settings)
+        except OSError as e:
+            print('Error saving project file - ' + str(e), file=sys.stderr)
+            return 2
+        print('Project saved to ' + args.save)
+        if args.cmbs is None and args.bills is None and args.output is None:
+            return 0
+
+    folder = args.output if args.output else os.path.split(os.path.abspath(args.project))[0]
+    os.makedirs(folder, exist_ok=True)
+    if shutil.which(misc.get_latex_path()) is None:
+        print('Error rendering project - ' + misc.get_latex_path() + ' not found', file=sys.stderr)
+        return 2
+
+    # Select items, numbered from 1 as in output file names
+    if args.cmbs is None and args.bills is None:
+        cmbs = bills = None
+    else:
+        cmbs = [number-1 for number in args.cmbs or []]
+        bills = [number-1 for number in args.bills or []]
+
+    # Render
+    start = time.perf_counter()
+    try:
+        results = render_project(data_model, project_settings, folder, cmbs, bills, max(1, args.jobs))
+    except Exception as e:
+        log.exception('main - Error rendering project')
+        print('Error rendering project - ' + str(e), file=sys.stderr)
+        return 2
+    failed = 0
+    for name, code, message, duration in results:
+        if code == misc.CMB_ERROR:
+            status = 'FAILED'
+            failed += 1
+        elif code == misc.CMB_WARNING:
+            status = 'SKIPPED'
+        else:
+            status = 'OK'
+        print('{:<10} {:<8} {:>8.1f}s  {}'.format(name, status, duration, message))
+    print('{} documents rendered in {:.1f}s, {} failed'.format(len(results), time.perf_counter() - start, failed))
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
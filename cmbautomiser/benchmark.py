@@ -0,0 +1,303 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+#  benchmark.py
+#
+#  Copyright 2014 Manu Varkey <manuvarkey@gmail.com>
+#
+#  This program is free software; you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation; either version 2 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software
+#  Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+#  MA 02110-1301, USA.
+#
+#
+
+"""Benchmarks of data model operations on synthetic projects
+
+    Usage: python3 -m cmbautomiser.benchmark memory [-r RECORDS]
+           python3 -m cmbautomiser.benchmark locks [-p PATHS] [-b BILLS]
+"""
+
+import sys, time, random, argparse, tracemalloc, copy
+
+# local files import
+from . import misc, data
+
+
+def make_project_model(records, records_per_item=1000, items_per_measurement=20,
+                       measurements_per_cmb=10, schedule_items=100, plugin='_1_NLBH', seed=1):
+    """Build data model of a synthetic project
+
+        Arguments:
+            records: Total number of measurement records
+            records_per_item: Records in each custom measurement item
+            items_per_measurement: Custom measurement items in each measurement
+            measurements_per_cmb: Measurements in each CMB
+            schedule_items: Number of schedule items
+            plugin: Template of custom measurement items
+            seed: Seed for random data
+        Returns:
+            Model as accepted by DataModel.set_model()
+    """
+    rand = random.Random(seed)
+    schedule_model = [['1.' + str(i), 'Item ' + str(i), 'cum', str(100+i), str(50+i), '', '30', 'True']
+                      for i in range(schedule_items)]
+    cmb_models = []
+    items = []
+    measurements = []
+    count = 0
+    while count < records:
+        length = min(records_per_item, records - count)
+        record_models = [['Record ' + str(count+i), '', str(rand.randint(1, 3)),
+                          str(rand.randint(1, 40)/4), '2.0', '', ''] for i in range(length)]
+        itemno = '1.' + str(rand.randrange(schedule_items))
+        items.append(['MeasurementItemCustom', [[itemno], record_models, '', [''], [], plugin]])
+        count += length
+        if len(items) == items_per_measurement or count == records:
+            measurements.append(['Measurement', ['01-01-2020', items]])
+            items = []
+        if len(measurements) == measurements_per_cmb or (count == records and measurements):
+            cmb_models.append(['CMB', ['CMB ' + str(len(cmb_models)+1), measurements]])
+            measurements = []
+    return ['DataModel', [schedule_model, cmb_models, []]]
+
+def benchmark_memory(records, records_per_item=1000):
+    """Measure memory used by data model objects built from a synthetic project
+
+        Returns:
+            Dictionary of results
+    """
+    model = make_project_model(records, records_per_item)
+    program_settings = misc.init_global_platform_vars()
+    project_settings = misc.init_project_settings_dict(program_settings)
+    data_model = data.datamodel.DataModel(program_settings=program_settings, project_settings=project_settings)
+
+    tracemalloc.start()
+    start_memory = tracemalloc.get_traced_memory()[0]
+    start = time.perf_counter()
+    data_model.set_model(model)
+    duration = time.perf_counter() - start
+    end_memory, peak_memory = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    # Memory held by objects excluding model lists shared with them
+    used = end_memory - start_memory
+    return {'records': records,
+            'time': duration,
+            'memory': used,
+            'peak': peak_memory - start_memory,
+            'per_record': used/records if records else 0}
+
+class DictRecordCustom:
+    """Record storing its values and column metadata as instance attributes,
+    as used before data.measurement.RecordCustom, for comparison"""
+
+    def __init__(self, items, cust_funcs, total_func, columntypes):
+        self.data_string = items
+        self.data = []
+        for x,columntype in zip(self.data_string,columntypes):
+            if columntype not in [misc.MEAS_DESC, misc.MEAS_CUST]:
+                try:
+                    num = misc.evaluate_expression(x)
+                    self.data.append(num)
+                except:
+                    self.data.append(0)
+            else:
+                self.data.append(0)
+        self.cust_funcs = cust_funcs
+        self.total_func = total_func
+        self.columntypes = columntypes
+        self.total = self.find_total()
+
+    def find_total(self):
+        return self.total_func(self.data)
+
+def benchmark_records(records, record_class, plugin='_1_NLBH'):
+    """Measure memory used by records of a synthetic project alone
+
+        Arguments:
+            records: Number of measurement records
+            record_class: Record class created as data.measurement.RecordCustom
+            plugin: Template of custom measurement items
+        Returns:
+            Dictionary of results
+    """
+    model = make_project_model(records, plugin=plugin)
+    record_models = [record_model for cmb in model[1][1] for measurement in cmb[1][1]
+                     for item in measurement[1][1] for record_model in item[1][1]]
+    item = data.measurement.MeasurementItemCustom(None, plugin)
+
+    tracemalloc.start()
+    start_memory = tracemalloc.get_traced_memory()[0]
+    start = time.perf_counter()
+    record_list = [record_class(record_model, item.cust_funcs, item.total_func_item, item.columntypes)
+                   for record_model in record_models]
+    duration = time.perf_counter() - start
+    used = tracemalloc.get_traced_memory()[0] - start_memory
+    tracemalloc.stop()
+    return {'records': len(record_list),
+            'time': duration,
+            'memory': used,
+            'per_record': used/len(record_list) if record_list else 0}
+
+class NestedLockState:
+    """Lock state stored as nested lists of flags, as used before
+    data.datamodel.LockState, for comparison"""
+
+    def __init__(self, mitems = None):
+        self.flags = []
+        if mitems != None:
+            for mitem in mitems:
+                self.__setitem__(mitem, True)
+
+    def resize(self, path):
+        flag_part = self.flags
+        for index in path[:-1]:
+            if len(flag_part) <= index:
+                for i in range(index - len(flag_part) + 1):
+                    flag_part.append([])
+            flag_part = flag_part[index]
+        if len(flag_part) <= path[-1]:
+            flag_part.extend([False]*(path[-1] - len(flag_part) + 1))
+
+    def get_paths(self, paths=None, flags = None, level=None):
+        if level is None:
+            level = []
+        if paths == None:
+            paths = []
+            flags = self.flags
+        for index, flag_part in enumerate(flags):
+            if isinstance(flag_part, list):
+                self.get_paths(paths, flag_part, level + [index])
+            elif flag_part == True:
+                paths.append(level + [index])
+        return paths
+
+    def __setitem__(self, path, value):
+        self.resize(path)
+        flag_part = self.flags
+        if value in [True, False]:
+            for index in path[:-1]:
+                flag_part = flag_part[index]
+            flag_part[path[-1]] = value
+
+    def __getitem__(self, path):
+        flag_part = self.flags
+        for index in path[:-1]:
+            if len(flag_part) > index:
+                flag_part = flag_part[index]
+            else:
+                return None
+        if len(flag_part) > path[-1]:
+            return flag_part[path[-1]]
+        else:
+            return None
+
+    def __add__(self, other):
+        new_lock = copy.deepcopy(self)
+        for path in other.get_paths():
+            new_lock.resize(path)
+            new_lock[path] = True
+        return new_lock
+
+    def __sub__(self, other):
+        new_lock = copy.deepcopy(self)
+        for path in other.get_paths():
+            new_lock.resize(path)
+            new_lock[path] = False
+        return new_lock
+
+def benchmark_locks(paths, bills, lock_class, seed=1):
+    """Time lock state operations on synthetic paths
+
+        Lock states of bills are accumulated with += as done by DataModel.update
+        before lock states were built in one pass.
+
+        Arguments:
+            paths: Number of measurement item paths
+            bills: Number of bills the paths are split into
+            lock_class: Lock state class benchmarked
+        Returns:
+            Dictionary of times taken for each operation
+    """
+    rand = random.Random(seed)
+    all_paths = [[cmb, meas, item] for cmb in range(max(1, paths//1000))
+                 for meas in range(10) for item in range(100)][:paths]
+    rand.shuffle(all_paths)
+    size = max(1, len(all_paths)//bills)
+    bill_paths = [all_paths[i:i+size] for i in range(0, len(all_paths), size)]
+    results = dict()
+
+    start = time.perf_counter()
+    lock_state = lock_class()
+    for part in bill_paths:
+        lock_state += lock_class(part)
+    results['accumulate'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for path in all_paths:
+        lock_state[path]
+    results['lookup'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for part in bill_paths[:10]:
+        lock_state - lock_class(part)
+    results['subtract'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    lock_state.get_paths()
+    results['get_paths'] = time.perf_counter() - start
+    return results
+
+def main(argv=None):
+    """Command line entry point, returns exit status"""
+    parser = argparse.ArgumentParser(prog='cmbautomiser.benchmark',
+                                     description='Benchmark data model operations on synthetic projects')
+    subparsers = parser.add_subparsers(dest='benchmark')
+    parser_memory = subparsers.add_parser('memory', help='Memory used by measurement records')
+    parser_memory.add_argument('-r', '--records', type=int, default=500000,
+                               help='Number of records (default: %(default)s)')
+    parser_memory.add_argument('-i', '--records-per-item', type=int, default=1000,
+                               help='Number of records in each measurement item (default: %(default)s)')
+    parser_locks = subparsers.add_parser('locks', help='Lock state operations')
+    parser_locks.add_argument('-p', '--paths', type=int, default=100000,
+                              help='Number of measurement item paths (default: %(default)s)')
+    parser_locks.add_argument('-b', '--bills', type=int, default=200,
+                              help='Number of bills (default: %(default)s)')
+    args = parser.parse_args(argv)
+
+    if args.benchmark == 'memory':
+        result = benchmark_memory(args.records, args.records_per_item)
+        print('{} records loaded in {:.1f}s'.format(result['records'], result['time']))
+        print('Memory used {:.1f} MB, peak {:.1f} MB, {:.0f} bytes per record'.format(
+              result['memory']/2**20, result['peak']/2**20, result['per_record']))
+        print()
+        print('{:<16} {:>12} {:>12} {:>16}'.format('Record', 'time', 'memory', 'bytes per record'))
+        for name, record_class in (('dict attributes', DictRecordCustom), ('slots', data.measurement.RecordCustom)):
+            result = benchmark_records(args.records, record_class)
+            print('{:<16} {:>11.1f}s {:>9.1f} MB {:>16.0f}'.format(name, result['time'],
+                  result['memory']/2**20, result['per_record']))
+    elif args.benchmark == 'locks':
+        print('{:<16} {:>12} {:>12} {:>12} {:>12}'.format('Implementation', 'accumulate', 'lookup', 'subtract', 'get_paths'))
+        for name, lock_class in (('nested lists', NestedLockState), ('path set', data.datamodel.LockState)):
+            result = benchmark_locks(args.paths, args.bills, lock_class)
+            print('{:<16} {:>11.3f}s {:>11.3f}s {:>11.3f}s {:>11.3f}s'.format(name, result['accumulate'],
+                  result['lookup'], result['subtract'], result['get_paths']))
+    else:
+        parser.print_help()
+        return 2
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
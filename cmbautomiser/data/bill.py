@@ -22,8 +22,7 @@
 #
 #
 
-from gi.repository import Gtk, Gdk, GLib
-import copy, math, logging, hashlib
+import copy, math, logging, hashlib, itertools
 
 from decimal import Decimal, ROUND_HALF_UP
 def Currency(x):
@@ -52,7 +51,7 @@ class BillData:
         self.title = ''
         self.bill_date = ''
         self.starting_page = 1
-        self.mitems = []  # for storing paths to billed measurement items [cmb][measurement][Meas Item]
+        self.mitems = []  # for storing ids of billed measurement items
         self.item_part_percentage = dict()  # part rate for exess rate items
         self.item_excess_part_percentage = dict()  # part rate for exess rate items
         self.item_excess_rates = dict()  # list of excess rates above excess_percentage
@@ -109,6 +108,9 @@ class BillData:
 class Bill:
     """Class for storing bill of work"""
     
+    # Source of versions of bill updates, unique across bills
+    versions = itertools.count()
+    
     def __init__(self, model=None):
         self.data = BillData()
         if model is not None:
@@ -131,6 +133,10 @@ class Bill:
         self.bill_nettotal_amount = 0 # net amount of work done uptodate after plusminus
         self.bill_since_prev_amount = 0  # since previous amount of work done
         self.bill_netpayable_amount = 0  # Net payable amount after outside work adjustments
+        
+        self.paths = []  # Paths of billed items on last update
+        self.update_key = None  # Key of inputs used for last update
+        self.update_version = None  # Version of last update
 
     def clear(self, clear_all = False):
         """Clear bill data
@@ -170,16 +176,54 @@ class Bill:
         self.data.set_model(model)
     
     def get_billed_items(self):
-        """Return paths to billed items"""
+        """Return ids of billed items"""
         return self.data.mitems
 
-    def update(self, schedule, cmbs, bills, percentage=0):
-        """Update bill data structures from other objects"""
+    def get_update_key(self, schedule_key, cmbs, bills, paths, percentage):
+        """Return key identifying inputs to update
+        
+            Key is made of schedule key, tender percentage, bill data object,
+            paths and versions of billed measurement items and version of
+            previous bill. Bill data is replaced on every edit and item
+            versions are renewed on every modification, so no values need
+            to be compared.
+        """
+        key_items = [schedule_key, percentage, self.data, [tuple(path) for path in paths]]
+        if self.data.bill_type in (misc.BILL_NORMAL, misc.BILL_FINAL):
+            if self.data.prev_bill is not None:
+                key_items.append(bills[self.data.prev_bill].update_version)
+            for mitem in paths:
+                item = cmbs[mitem[0]][mitem[1]][mitem[2]]
+                if not isinstance(item, measurement.MeasurementItemHeading):
+                    key_items.append(item.get_version())
+        return key_items
+
+    def update(self, schedule, cmbs, bills, paths, percentage=0, schedule_key=None):
+        """Update bill data structures from other objects
+        
+            Arguments:
+                paths: Paths of billed items, located from ids in mitems
+                schedule_key: Key identifying state of schedule. If not None,
+                              update is skipped if inputs are unchanged since
+                              last update.
+            Returns:
+                True if bill updated, False if skipped
+        """
+        
+        # Skip update if inputs unchanged
+        if schedule_key is not None:
+            update_key = self.get_update_key(schedule_key, cmbs, bills, paths, percentage)
+            if update_key == self.update_key:
+                if self.data.prev_bill is not None:
+                    self.prev_bill = bills[self.data.prev_bill]
+                log.debug('Bill - update - inputs unchanged, update skipped')
+                return False
         
         # Get required datas
         itemnos = schedule.get_itemnos()
         # Clear all derived structures
         self.clear()
+        self.paths = paths
         
         # If bill is a normal bill
         if self.data.bill_type in (misc.BILL_NORMAL, misc.BILL_FINAL):
@@ -208,7 +252,7 @@ class Bill:
                             self.item_paths[itemno].append([self.data.prev_bill, itemno])
                             self.item_qty[itemno].append(item_qty)  # add total qty from previous bill
             # Fill in values from measurement items
-            for mitem in self.data.mitems:
+            for mitem in paths:
                 item = cmbs[mitem[0]][mitem[1]][mitem[2]]
                 if not isinstance(item, measurement.MeasurementItemHeading):
                     for count, (itemno, item_qty) in enumerate(zip(item.itemnos, item.get_total())):
@@ -282,6 +326,14 @@ class Bill:
             
             self.bill_since_prev_amount = self.bill_nettotal_amount
             self.bill_netpayable_amount = self.bill_since_prev_amount
+        
+        # Save key of inputs evaluated
+        if schedule_key is not None:
+            self.update_key = update_key
+        else:
+            self.update_key = None
+        self.update_version = next(Bill.versions)
+        return True
 
     def get_latex_buffer(self, thisbillpath, schedule, project_settings_dict):
         """Return abstract latex buffer"""
@@ -405,7 +457,7 @@ class Bill:
                 item_local_vars['$cmbabslabel$'] = 'ref:abs:abs:' + str(thisbillpath + [hashval])
 
                 item_local_vars_vanilla['$cmbexcessflag$'] = excess_flag
-                item_local_vars_vanilla['$cmbrecords$'] = latex_records.latex_buffer
+                item_local_vars_vanilla['$cmbrecords$'] = latex_records
 
                 # Write entries
                 latex_buffer.add_suffix_from_file(misc.abs_path('latex', 'abstractitem.tex')) # Read item template
@@ -22,8 +22,7 @@
 #  
 #  
 
-from gi.repository import Gtk, Gdk, GLib
-import os.path, copy, logging
+import os.path, sys, copy, logging, hashlib, bisect, contextlib
 
 # local files import
 from .. import misc, undo
@@ -47,6 +46,21 @@ class DataModel:
         # Derived data
         self.lock_state = LockState()  # Billed/Abstracted states of measurement items
         self.cmb_ref = []  # Array of sets corresponding to cmbs refered to by particular cmb
+        self.item_index = ItemIndex(self.cmbs)  # Index of cmbs, measurements and items by id
+        self.locks_version = None  # Version of item index at last update of lock states
+        self.paths_cache = dict()  # Paths of measurement items for tuples of ids
+        self.paths_cache_version = None  # Version of item index paths cached for
+        self.parts_cache = dict()  # Serialised CMBs and bills unmodified since serialised, by id of object
+        # Dirty state for incremental update
+        self.dirty_all = True  # Update all derived data
+        self.dirty_paths = set()  # Paths of cmbs/measurements/items modified (as tuples)
+        self.dirty_bills = set()  # Rows of bills modified
+        self.dirty_locks = False  # Update lock states
+        self.batch_depth = 0  # Updates deferred while batch of operations is open
+        self.loading = False  # Updates deferred while parts of project are loaded
+        self.schedule_state = None  # Schedule values at last update
+        self.schedule_key = None  # Hash of schedule values at last update
+        self.percentage = None  # Tender percentage at last update
         
         if data is not None:
             self.schedule.set_model(data[0])
@@ -71,6 +85,24 @@ class DataModel:
         for bill in self.bills:
             bill_models.append(bill.get_model())
         return ['DataModel', [schedule_model, cmb_models, bill_models]]
+        
+    def get_model_parts(self):
+        """Return data model with schedule, CMBs and bills as misc.ProjectPart objects
+        
+            CMBs and bills not marked by mark_dirty() and mark_bill_dirty()
+            since the last call are not serialised again.
+        """
+        cache = dict()
+        def get_part(obj):
+            entry = self.parts_cache.get(id(obj))
+            if entry is None or entry[0] is not obj:
+                entry = (obj, misc.ProjectPart(obj.get_model()))
+            cache[id(obj)] = entry
+            return entry[1]
+        cmb_parts = [get_part(cmb) for cmb in self.cmbs]
+        bill_parts = [get_part(bill_item) for bill_item in self.bills]
+        self.parts_cache = cache
+        return ['DataModel', [misc.ProjectPart(self.schedule.get_model()), cmb_parts, bill_parts]]
     
     def set_model(self, model):
         """Set data model"""
@@ -87,54 +119,346 @@ class DataModel:
                 bill_item.set_model(bill_model)
                 self.bills.append(bill_item)
             # Update values
+            self.item_index.clear()
+            self.mark_dirty()
             self.update()
+            
+    def load_parts(self, schedule_model, cmb_models, bill_models, fraction):
+        """Set data model incrementally from models of its parts
+        
+            CMBs and bills are appended as they are read, so that loaded
+            CMBs can be displayed while the rest of the file is read. Items
+            are indexed, references by path migrated and derived values
+            calculated on the first call to update() after all parts are
+            loaded, since references and ids may refer to CMBs not yet read.
+            
+            Arguments:
+                schedule_model: Model of schedule
+                cmb_models: Iterable of CMB models
+                bill_models: Iterable of bill models, iterated after cmb_models
+                fraction: Function returning fraction of file read
+            Yields:
+                Fraction of file read after each CMB and bill loaded
+        """
+        self.schedule.set_model(schedule_model)
+        self.cmbs.clear()
+        self.bills.clear()
+        self.item_index.clear()
+        self.lock_state = LockState()
+        self.mark_dirty()
+        self.loading = True
+        try:
+            for cmb_model in cmb_models:
+                cmb = measurement.Cmb()
+                cmb.set_model(cmb_model)
+                self.cmbs.append(cmb)
+                yield fraction()
+            for bill_model in bill_models:
+                bill_item = bill.Bill()
+                bill_item.set_model(bill_model)
+                self.bills.append(bill_item)
+                yield fraction()
+        finally:
+            self.loading = False
+        log.info('DataModel - load_parts - ' + str(len(self.cmbs)) + ' CMBs and ' + str(len(self.bills)) + ' bills loaded')
+        
+    def load_model(self, reader):
+        """Set data model incrementally from project file
+        
+            Arguments:
+                reader: misc.ProjectReader with data model as next value
+            Yields:
+                Fraction of file read after each CMB and bill loaded
+        """
+        reader.next_array()
+        if reader.next_value() != 'DataModel':
+            raise ValueError('DataModel - load_model - Wrong model type')
+        reader.next_array()
+        schedule_model = reader.next_value()
+        yield from self.load_parts(schedule_model, reader.iter_array(), reader.iter_array(), reader.fraction)
+        reader.end_array()
+        reader.end_array()
+        
+    def load_archive(self, archive):
+        """Set data model incrementally from project archive
+        
+            Arguments:
+                archive: misc.ProjectArchive with index read
+            Yields:
+                Fraction of entries read after each CMB and bill loaded
+        """
+        yield from self.load_parts(archive.read_schedule(), archive.iter_cmbs(), archive.iter_bills(), archive.fraction)
+        
+    def load_file(self, filename):
+        """Set data model incrementally from project file or project archive
+        
+            Yields:
+                Fraction of file read after each CMB and bill loaded
+            Returns:
+                Project settings dictionary read from file
+            Raises:
+                ValueError: If file is not a compatible project file
+        """
+        if misc.ProjectArchive.is_archive(filename):
+            archive = misc.ProjectArchive(filename)
+            if archive.read_index() not in misc.PROJECT_FILE_VERS_COMPATIBLE:
+                raise ValueError('Wrong file type - ' + filename)
+            yield from self.load_archive(archive)
+            return archive.get_settings()
+        else:
+            with open(filename, 'r') as fileobj:
+                reader = misc.ProjectReader(fileobj)
+                reader.begin_array()
+                if reader.next_value() not in misc.PROJECT_FILE_VERS_COMPATIBLE:
+                    raise ValueError('Wrong file type - ' + filename)
+                yield from self.load_model(reader)
+                return reader.next_value()
+                
+    def save_file(self, filename, project_settings):
+        """Save data model to file
+        
+            Files with extension misc.PROJECT_ARCHIVE_EXT are saved as project
+            archive, rewriting only modified parts, others as JSON.
+            See misc.write_project.
+        """
+        misc.write_project(filename, [misc.PROJECT_FILE_VER, self.get_model_parts(), project_settings])
+        
+    def mark_dirty(self, path=None):
+        """Mark measurement data for recalculation on next update
+        
+            Arguments:
+                path: Path to Cmb/Measurement/MeasurementItem modified.
+                      All data is marked if None.
+        """
+        if path is None:
+            self.dirty_all = True
+            self.parts_cache.clear()
+        else:
+            if path[0] < len(self.cmbs):
+                self.parts_cache.pop(id(self.cmbs[path[0]]), None)
+            self.dirty_paths.add(tuple(path))
+            
+    def mark_bill_dirty(self, row=None):
+        """Mark bill for recalculation on next update
+        
+            Arguments:
+                row: Row of bill modified. All bills are marked if None.
+        """
+        if row is None:
+            self.dirty_bills.update(range(len(self.bills)))
+            for bill_item in self.bills:
+                self.parts_cache.pop(id(bill_item), None)
+        else:
+            self.dirty_bills.add(row)
+            if row < len(self.bills):
+                self.parts_cache.pop(id(self.bills[row]), None)
+        self.dirty_locks = True
+            
+    def is_dirty(self, path):
+        """Returns True if path lies under a modified Cmb/Measurement/MeasurementItem"""
+        for level in range(1, len(path)+1):
+            if tuple(path[0:level]) in self.dirty_paths:
+                return True
+        return False
     
     def update(self):
-        """Update derived data values"""
+        """Update derived data values
+        
+            Only abstracts and bills depending on data marked by mark_dirty()
+            and mark_bill_dirty() are recalculated. Any change in schedule or
+            tender percentage results in all data being recalculated.
+        """
+        
+        if self.batch_depth:
+            log.info('DataModel - update deferred till end of batch')
+            return
+        if self.loading:
+            log.info('DataModel - update deferred till project is loaded')
+            return
         
         log.info('DataModel - update called')
-
-        # Calculate extended descriptions
-        self.schedule.update_values()
         
-        # Update all bills
-        for bill in self.bills:
-            percentage = misc.float_from_str(self.project_settings['$cmbtenderpercentage$'])
-            bill.update(self.schedule, self.cmbs, self.bills, percentage)
+        # Check for changes in schedule and project settings
+        schedule_state = [list(item) for item in self.schedule.get_model()]
+        if schedule_state != self.schedule_state:
+            # Calculate extended descriptions
+            self.schedule.update_values()
+            self.schedule_state = schedule_state
+            self.schedule_key = hashlib.sha1(repr(schedule_state).encode('utf-8')).hexdigest()
+            self.dirty_all = True
+        percentage = misc.float_from_str(self.project_settings['$cmbtenderpercentage$'])
+        if percentage != self.percentage:
+            self.percentage = percentage
+            self.dirty_all = True
+        
+        self.update_index()
+        if not (self.dirty_all or self.dirty_paths or self.dirty_locks
+                or self.item_index.version != self.locks_version):
+            log.info('DataModel - update - no changes')
+            return
+        # Paths of locked items change with structure of cmbs
+        update_locks = self.dirty_all or self.dirty_locks or self.item_index.version != self.locks_version
+        
+        # Update 1) measurement abstracts 2) dependency tree of cmbs.
+        abstracted_items = []
+        self.cmb_ref = [set() for cmb in self.cmbs]
+        abstracts = sorted((self.item_index.get_path(abs_id), abs_id) for abs_id in self.item_index.abstracts)
+        for path, abs_id in abstracts:
+            cmb_no = path[0]
+            meas_item = self.item_index.get_object(abs_id)
+            paths = self.get_item_paths(meas_item.get_abstracted_items())
+            # Update MeasurementItemAbstract if abstract or abstracted items modified or moved
+            if self.dirty_all or paths != meas_item.paths or self.is_dirty(path) or \
+                    any(self.is_dirty(mitem) for mitem in paths):
+                meas_item.update(self.cmbs, paths)
+                self.dirty_paths.add(tuple(path))
+                update_locks = True
+            abstracted_items += paths
+            # Update Dependency
+            for mitem in paths:
+                if mitem[0] != cmb_no:
+                    # Update cmb with abstract
+                    self.cmb_ref[cmb_no] |= set([mitem[0]])
+                    # Update cmb with item abstracted
+                    self.cmb_ref[mitem[0]] |= set([cmb_no])
+        
+        # Update bills refering modified or moved items and bills following
+        # them. Bills with unchanged inputs are skipped by Bill.update
+        bill_paths = [self.get_item_paths(bill.get_billed_items()) for bill in self.bills]
+        updated_bills = set()
+        for row, bill in enumerate(self.bills):
+            paths = bill_paths[row]
+            if self.dirty_all or row in self.dirty_bills or bill.data.prev_bill in updated_bills \
+                    or paths != bill.paths or any(self.is_dirty(mitem) for mitem in paths):
+                if bill.update(self.schedule, self.cmbs, self.bills, paths, percentage, self.schedule_key):
+                    updated_bills.add(row)
+                    # Part rates of new items are set in bill data on update
+                    self.parts_cache.pop(id(bill), None)
+        log.info('DataModel - update - bills updated - ' + str(sorted(updated_bills)))
         
         # Update locks
-        self.lock_state = LockState()
-        for bill in self.bills:
-            self.lock_state += LockState(bill.get_billed_items())
-        for cmb in self.cmbs:
-            for meas in cmb:
-                if isinstance(meas, measurement.Measurement):
-                    for measitem in meas:
-                        if isinstance(measitem, measurement.MeasurementItemAbstract):
-                            self.lock_state += LockState(measitem.get_abstracted_items())
-        
-        # Update 1) dependency tree of cmbs. 2) measurement abstracts
-        self.cmb_ref = [set()]*len(self.cmbs)
-        for cmb_no, cmb in enumerate(self.cmbs):
-            for meas_no, meas in enumerate(cmb.items):
-                if isinstance(meas, measurement.Measurement):
-                    for meas_item_nos, meas_item in enumerate(meas.items):
-                        if isinstance(meas_item, measurement.MeasurementItemAbstract):
-                            # Update MeasurementItemAbstract
-                            meas_item.update(self.cmbs)
-                            # Update Dependency
-                            for mitem in meas_item.mitems:
-                                if mitem[0] != cmb_no:
-                                    # Update cmb with abstract
-                                    self.cmb_ref[cmb_no] |= set([mitem[0]])
-                                    # Update cmb with item abstracted
-                                    self.cmb_ref[mitem[0]] |= set([cmb_no])
+        if update_locks:
+            billed_items = []
+            for paths in bill_paths:
+                billed_items += paths
+            self.lock_state = LockState(billed_items + abstracted_items)
+            self.locks_version = self.item_index.version
+        
+        log.info('DataModel - update - total cache [hits, misses] - ' 
+                 + str(measurement.MeasurementItemCustom.get_total_cache_stats(reset=True)))
+        
+        # Clear dirty state
+        self.dirty_all = False
+        self.dirty_paths = set()
+        self.dirty_bills = set()
+        self.dirty_locks = False
             
     def get_lock_states(self):
         """Return underlying LockState object for App"""
         self.update()
         return self.lock_state
         
+    @contextlib.contextmanager
+    def batch(self, desc):
+        """Return context manager combining undoable operations into a batch
+        
+            Operations in batch are done and undone as a single undo action
+            and update() is deferred till the batch is closed, so that
+            derived data is recalculated once for the batch. Nested batches
+            are merged with the outermost batch. If an operation fails, the
+            operations done in the batch are undone.
+            
+            Arguments:
+                desc: Description of batch displayed in undo stack
+        """
+        if self.batch_depth:
+            yield
+            return
+        batch_group = undo.group(desc)
+        completed = False
+        try:
+            with batch_group:
+                self.begin_batch()
+                yield
+                self.end_batch()
+            completed = True
+        finally:
+            if not completed:
+                # Operation failed, operations done are undone with any
+                # operations called while undoing them kept out of undo stack
+                log.warning('DataModel - batch - batch aborted - ' + desc)
+                try:
+                    batch_group.undo()
+                except Exception:
+                    log.error('DataModel - batch - undo of aborted batch failed - ' + desc)
+                    undo.stack().clear()
+                    raise
+                finally:
+                    undo.stack().resetreceiver()
+                    self.batch_depth = 0
+                    self.update()
+        
+    @undoable
+    def begin_batch(self):
+        """Undoable function for opening a batch of operations"""
+        self.batch_depth += 1
+        
+        yield "Begin batch"
+        # Undo action, run after undoing operations in batch
+        self.batch_depth -= 1
+        self.update()
+        
+    @undoable
+    def end_batch(self):
+        """Undoable function for closing a batch of operations"""
+        self.batch_depth -= 1
+        self.update()
+        
+        yield "End batch"
+        # Undo action, run before undoing operations in batch
+        self.batch_depth += 1
+    
+    def get_undo_size(self, action):
+        """Return estimate of memory in bytes held by an undo action
+        
+            Objects of the data model refered to by the action are not
+            counted, so that only data held for undoing or redoing the
+            action is included. Used as sizefunc of undo.Stack, called once
+            when the action is done.
+        """
+        self.update_index()
+        live = set(map(id, self.bills))
+        live.update(id(bill_item.data) for bill_item in self.bills)
+        live.update(id(item) for item in self.schedule.items)
+        live.update((id(self), id(self.cmbs), id(self.bills), id(self.schedule)))
+        data_modules = (measurement.__name__, bill.__name__, schedule.__name__)
+        seen = set()
+        size = 0
+        objs = action.references()
+        while objs:
+            obj = objs.pop()
+            if id(obj) in seen or id(obj) in live:
+                continue
+            seen.add(id(obj))
+            if isinstance(obj, (measurement.Cmb, measurement.Measurement, measurement.Completion,
+                                measurement.MeasurementItem)) and self.item_index.get_object(obj.id) is obj:
+                continue
+            size += sys.getsizeof(obj)
+            if isinstance(obj, (list, tuple, set, frozenset)):
+                objs.extend(obj)
+            elif isinstance(obj, dict):
+                objs.extend(obj.keys())
+                objs.extend(obj.values())
+            elif type(obj).__module__ in data_modules:
+                # Objects of other types are counted without their contents
+                if hasattr(obj, '__dict__'):
+                    size += sys.getsizeof(obj.__dict__)
+                    objs.extend(obj.__dict__.values())
+                for slot in getattr(type(obj), '__slots__', ()):
+                    if hasattr(obj, slot):
+                        objs.append(getattr(obj, slot))
+        return size
+    
     # Measurement Methods
     
     def get_custom_item_template(self, module):
@@ -149,131 +473,69 @@ class DataModel:
     def get_custmod_from_schmod(self, schmod, custmodel, itemtype):
         """Get custom item template for ScheduleDialog and others"""
         if custmodel is not None:
-            return ['MeasurementItemCustom', schmod + custmodel[1][4:6]]
+            return ['MeasurementItemCustom', schmod + custmodel[1][4:]]
         else:
             item = measurement.MeasurementItemCustom(None, itemtype)
             nullmodel = item.get_model()
             return ['MeasurementItemCustom', schmod + nullmodel[1][4:6]]
     
-    def update_static_paths(self, path, add_flag = True):
-        """Updates static paths in bills and AbstractMeasurement on change in measurements model
+    def update_index(self):
+        """Rebuild index of items if cleared
         
-            Arguments:
-                path: Path to item being added/deleted
-                add_flag: True for additions, False for deletions
+            Bills and abstracts of project files refering to items by path
+            are migrated to refer to items by id. Index is not rebuilt while
+            parts of project are loaded.
         """
-        log.info('DataModel - update_static_paths - ' + str([path, add_flag]))
-        # Initialise replacement dictionary
-        mod_dict = dict()
-        # Paths to be deleted
-        del_path = []
-        # Saved values for reversal
-        bill_mitems_old = []
-        bill_paths_old = []
-        abs_mitems_old = []
-        abs_paths_old = []
-        # Increment path by 1 for add and decrement by 1 for remove
-        increment = 1 if add_flag else -1
-        
-        # CMB added/removed
-        if len(path) == 1:
-            for p1, cmb in enumerate(self.cmbs[path[0]:], path[0]):
-                for p2, meas in enumerate(self.cmbs[p1].items):
-                    if isinstance(self.cmbs[p1][p2], measurement.Measurement):
-                        for p3, meas_item in enumerate(self.cmbs[p1][p2].items):
-                            # Update items to be deleted
-                            if [p1] == path and not add_flag:
-                                del_path.append([p1,p2,p3])
-                            # Update items to be changed
-                            else:
-                                mod_dict[(p1,p2,p3)] = (p1+increment,p2,p3)
-                    mod_dict[(p1,p2)] = (p1+increment,p2)
-                mod_dict[tuple([p1])] = tuple([p1+increment])
-        # Measurement added/removed
-        elif len(path) == 2:
-            p1 = path[0]
-            for p2, meas in enumerate(self.cmbs[p1].items[path[1]:], path[1]):
-                if isinstance(self.cmbs[p1][p2], measurement.Measurement):
-                    for p3, meas_item in enumerate(self.cmbs[p1][p2].items):
-                        # Update items to be deleted
-                        if [p1,p2] == path and not add_flag:
-                            del_path.append([p1,p2,p3])
-                        # Update items to be changed
-                        else:
-                            mod_dict[(p1,p2,p3)] = (p1,p2+increment,p3)
-                mod_dict[(p1,p2)] = (p1,p2+increment)
-        # Measurement item added/removed
-        elif len(path) == 3:
-            p1 = path[0]
-            p2 = path[1]
-            for p3, meas_item in enumerate(self.cmbs[p1][p2].items[path[2]:], path[2]):
-                # Update items to be deleted
-                if [p1,p2,p3] == path  and not add_flag:
-                    del_path.append([p1,p2,p3])
-                # Update items to be changed
-                else:
-                    mod_dict[(p1,p2,p3)] = (p1,p2,p3+increment)
-        
-        # Make replacements in bill
-        for row, bill in enumerate(self.bills):
-            changed = False
-            mitem_copy = copy.deepcopy(bill.data.mitems)
-            # If remove flag, remove path from bill 
-            if not add_flag:
-                for mitem in mitem_copy:
-                    if mitem in del_path:
-                        bill.data.mitems.remove(mitem)
-                        changed = True
-            for index, item in enumerate(bill.data.mitems):
-                if tuple(item) in mod_dict:
-                    bill.data.mitems[index] = list(mod_dict[tuple(item)])
-                    changed = True
-
-            # If bill changed
-            if changed:
-                bill_mitems_old.append(mitem_copy)
-                bill_paths_old.append(row)
-                
-        # Make replacements in abstract measurements
-        for p1, cmb in enumerate(self.cmbs):
-            for p2, meas in enumerate(self.cmbs[p1].items):
-                if isinstance(self.cmbs[p1][p2], measurement.Measurement):
-                    for p3, meas_item in enumerate(self.cmbs[p1][p2].items):
-                        if isinstance(meas_item, measurement.MeasurementItemAbstract):
-                            changed = False
-                            mitem_copy = copy.deepcopy(meas_item.mitems)
-                            # If remove flag, remove path from bill 
-                            if not add_flag: 
-                                for mitem in mitem_copy:
-                                    if mitem in del_path:
-                                        meas_item.mitems.remove(mitem)
-                                        changed = True
-                            for index, item in enumerate(meas_item.mitems):
-                                if tuple(item) in mod_dict:
-                                    meas_item.mitems[index] = list(mod_dict[tuple(item)])
-                                    changed = True
-                            # If abstract changed
-                            if changed:
-                                abs_mitems_old.append(mitem_copy)
-                                abs_paths_old.append([p1,p2,p3])
-        return [bill_paths_old, bill_mitems_old, abs_paths_old, abs_mitems_old]
-        
-    def replace_static_paths(self, data=None):
-        """Function reverses effect of update_static_paths"""
-        log.info('DataModel - replace_static_paths')
-        log.debug('DataModel - replace_static_paths - \n' + str(data))
-        if data is not None:
-            bill_paths_old = data[0]
-            bill_mitems_old = data[1]
-            abs_paths_old = data[2]
-            abs_mitems_old = data[3]
+        if self.item_index.valid or self.loading:
+            return
+        references = []
+        for bill in self.bills:
+            references += bill.data.mitems
+        self.item_index.rebuild(references)
+        # Ids are assigned and references migrated in serialised parts
+        self.parts_cache.clear()
+        # Migrate references by path
+        referrers = [bill.data for bill in self.bills]
+        referrers += [self.item_index.get_object(abs_id) for abs_id in self.item_index.abstracts]
+        migrated = 0
+        for referrer in referrers:
+            if any(isinstance(mitem, list) for mitem in referrer.mitems):
+                referrer.mitems = self.get_item_ids([mitem for mitem in referrer.mitems if isinstance(mitem, list)])
+                migrated += 1
+        if migrated:
+            log.info('DataModel - update_index - references by path migrated - ' + str(migrated))
+        log.info('DataModel - update_index - index rebuilt')
             
-            # Make replacements in bill
-            for billno, mitems in zip(bill_paths_old, bill_mitems_old):
-                self.bills[billno].data.mitems = mitems
-            # Make replacements in abstract
-            for abspath, mitems in zip(abs_paths_old, abs_mitems_old):
-                self.cmbs[abspath[0]][abspath[1]][abspath[2]].mitems = mitems
+    def get_item_paths(self, ids):
+        """Return paths of measurement items from ids, skipping items not found
+        
+            Paths resolved are cached until the structure of cmbs changes.
+        """
+        self.update_index()
+        if self.paths_cache_version != self.item_index.version:
+            self.paths_cache.clear()
+            self.paths_cache_version = self.item_index.version
+        key = tuple(ids)
+        paths = self.paths_cache.get(key)
+        if paths is None:
+            paths = []
+            for item_id in ids:
+                path = self.item_index.get_path(item_id)
+                if path is not None:
+                    paths.append(tuple(path))
+            self.paths_cache[key] = paths
+        return [list(path) for path in paths]
+        
+    def get_item_ids(self, paths):
+        """Return ids of measurement items from paths"""
+        self.update_index()
+        ids = []
+        for path in paths:
+            try:
+                ids.append(self.cmbs[path[0]][path[1]][path[2]].id)
+            except (IndexError, TypeError):
+                log.warning('DataModel - get_item_ids - item not found - ' + str(path))
+        return ids
     
     @undoable
     def add_cmb_at_node(self, cmb_model, row):
@@ -283,14 +545,13 @@ class DataModel:
         if cmb_model[0] == 'CMB':
             cmb = measurement.Cmb(cmb_model[1])
             if row != None:
-                # Update static paths
-                self.update_static_paths([row])
-                
                 self.cmbs.insert(row,cmb)
                 row_delete = row
             else:
                 self.cmbs.append(cmb)
                 row_delete = len(self.cmbs) - 1
+            self.item_index.add(cmb, None)
+            self.mark_dirty()
             self.update()
         else:
             log.warning('add_cmb_at_node - Wrong model loaded')
@@ -315,18 +576,20 @@ class DataModel:
         delete_path = None
         if path != None:
             if len(path) > 1: # If a measurement selected
-                # Update static paths
-                self.update_static_paths(path)
-                
                 self.cmbs[path[0]].insert_item(path[1],meas)
                 delete_path = [path[0],path[1]]
+                self.mark_dirty(path[0:1])
             else: # Append to selected Cmb
                 self.cmbs[path[0]].append_item(meas)
                 delete_path = [path[0],self.cmbs[path[0]].length()-1]
+                self.mark_dirty(delete_path)
         else: # If no selection append at end
             if len(self.cmbs) != 0:
                 self.cmbs[-1].append_item(meas)
                 delete_path = [len(self.cmbs)-1,self.cmbs[-1].length()-1]
+                self.mark_dirty(delete_path)
+        if delete_path is not None:
+            self.item_index.add(meas, self.cmbs[delete_path[0]].id)
         self.update()
 
         yield "Add Measurement at '{}'".format(path)
@@ -351,27 +614,30 @@ class DataModel:
             
         if path != None:
             if len(path) > 2: # if a measurement item selected
-                # Update static paths
-                self.update_static_paths(path)
-                
                 self.cmbs[path[0]][path[1]].insert_item(path[2],item)
                 delete_path = [path[0],path[1],path[2]]
+                self.mark_dirty(path[0:2])
             elif len(path) > 1: # if measurement group selected
                 if isinstance(self.cmbs[path[0]][path[1]], measurement.Measurement): # check if meas item
                     self.cmbs[path[0]][path[1]].append_item(item)
                     delete_path = [path[0],path[1],self.cmbs[path[0]][path[1]].length()-1]
+                    self.mark_dirty(delete_path)
             elif len(path) == 1: # if cmb selected
                 index_meas = self.cmbs[path[0]].length()-1
                 if isinstance(self.cmbs[path[0]][index_meas], measurement.Measurement): # check if meas item
                     self.cmbs[path[0]][index_meas].append_item(item)
                     index_item = self.cmbs[path[0]][index_meas].length()-1
                     delete_path = [path[0],index_meas,index_item]
+                    self.mark_dirty(delete_path)
         else: # if path is None append at end
             if len(self.cmbs) != 0:
                 if self.cmbs[-1].length() > 0:
                     if isinstance(self.cmbs[-1][-1], measurement.Measurement):
                         self.cmbs[-1][-1].append_item(item)
                         delete_path = [len(self.cmbs)-1,self.cmbs[-1].length()-1,self.cmbs[-1][-1].length()-1]
+                        self.mark_dirty(delete_path)
+        if delete_path is not None:
+            self.item_index.add(item, self.cmbs[delete_path[0]][delete_path[1]].id)
         self.update()
         
         yield "Add Measurement item at '{}'".format(path)
@@ -396,6 +662,7 @@ class DataModel:
                     item.set_remark(newval)
                 else:
                     item.set_model(newval)
+            self.mark_dirty(path)
             self.update()
         
         yield "Edit measurement items at '{}'".format(path)
@@ -413,6 +680,7 @@ class DataModel:
                     item.set_remark(oldval)
                 else:
                     item.set_model(oldval)
+            self.mark_dirty(path)
             self.update()
         
     @undoable
@@ -420,18 +688,27 @@ class DataModel:
         """Undoable function for deleting a measurement item from model"""
         log.info('DataModel - delete_row_meas - ' + str(path))
         item = None
-        # Update static paths
-        static_paths_old = self.update_static_paths(path, False)
-
+        # References to items deleted are kept for restoring them on undo,
+        # items not found being skipped on update
         if len(path) == 1:
-            item = self.cmbs[path[0]].get_model()
+            obj = self.cmbs[path[0]]
+            item = obj.get_model()
             del self.cmbs[path[0]]
         elif len(path) == 2:
-            item = self.cmbs[path[0]][path[1]].get_model()
+            obj = self.cmbs[path[0]][path[1]]
+            item = obj.get_model()
             self.cmbs[path[0]].remove_item(path[1])
         elif len(path) == 3:
-            item = self.cmbs[path[0]][path[1]][path[2]].get_model()
+            obj = self.cmbs[path[0]][path[1]][path[2]]
+            item = obj.get_model()
             self.cmbs[path[0]][path[1]].remove_item(path[2])
+        self.item_index.remove(obj)
+        del obj  # Only model of object deleted is held for undo
+        # Mark items following deleted item for update
+        if len(path) == 1:
+            self.mark_dirty()
+        else:
+            self.mark_dirty(path[:-1])
         self.update()
         
         yield "Delete measurement items at '{}'".format(path)
@@ -442,124 +719,108 @@ class DataModel:
             self.add_measurement_at_node(item,path)
         elif len(path) == 3:
             self.add_measurement_item_at_node(item,path)
-        # Replace static paths lost on delete
-        self.replace_static_paths(static_paths_old)
         
         self.update()
         
-    def render_cmb(self, folder, replacement_dict, path, recursive = True, progress=None):
-        """Render CMB
+    def write_cmb_latex(self, folder, replacement_dict, path):
+        """Write latex file of CMB to folder
             
             Arguments:
                 folder: Output folder
                 replacement_dict: Replacement dictionary for global values
-                path: Path of CMB to be rendered
-                recursive: Flag to select rendering of dependent items
+                path: Path of CMB
+            Returns:
+                Filename of latex file written
         """
-        log.info('DataModel - render_cmb - ' + str([path, recursive]))
-        # Build all data structures
-        self.update()
-        
-        # Fill in latex buffer
-        latex_buffer = self.cmbs[path[0]].get_latex_buffer([path[0]], self.schedule)
-
-        # Make global variables replacements
-        latex_buffer.replace_and_clean(replacement_dict)
-        
         # Include linked cmbs and bills
         replacement_dict_external_docs = {}
         external_docs = ''
         # Include cmbs
         for count,cmb in enumerate(self.cmbs):
             if path[0] in self.cmb_ref[count]:
-                external_docs += '\externaldocument{cmb_' + str(count+1) + '}\n'
+                external_docs += '\\externaldocument{cmb_' + str(count+1) + '}\n'
         # Include bills
         for count,bill in enumerate(self.bills):
             if path[0] in bill.cmb_ref:
-                external_docs += '\externaldocument{abs_' + str(count+1) + '}\n'
+                external_docs += '\\externaldocument{abs_' + str(count+1) + '}\n'
         replacement_dict_external_docs['$cmbexternaldocs$'] = external_docs
-        latex_buffer.replace(replacement_dict_external_docs)
 
-        # Write output
+        # Write output while generating latex, making global variables replacements
         filename = misc.posix_path(folder,'cmb_' + str(path[0]+1) + '.tex')
-        latex_buffer.write(filename)
-
-        # Run latex on files and dependencies
+        replacements = [(replacement_dict, True), (replacement_dict_external_docs, False)]
+        self.cmbs[path[0]].write_latex(filename, [path[0]], self.schedule, replacements)
+        return filename
         
-        # Setup progress window
-        if progress is not None:
-            billno = 0
-            cmbno = 0
-            for bill in self.bills:
-                if path[0] in bill.cmb_ref:
-                    billno += 1
-            for cmb_count, cmb in enumerate(self.cmbs):
-                if path[0] in self.cmb_ref[cmb_count]:
-                    cmbno += 1
-            progress.set_pulse_step(1/((cmbno+billno)*2 + 2))
+    def write_cmb_spreadsheet(self, folder, path):
+        """Write spreadsheet of CMB to folder"""
+        spreadsheet = self.cmbs[path[0]].get_spreadsheet_buffer([path[0]], self.schedule)
+        filename = misc.posix_path(folder,'cmb_' + str(path[0]+1) + '.xlsx')
+        spreadsheet.save(filename)
         
-        # Run on all cmbs refered by cmb
-        if recursive: # if recursive call
+    def get_cmb_jobs(self, path, filename, caption='Rendering'):
+        """Return latex jobs for rendering CMB for use with misc.run_latex_jobs"""
+        cmb = self.cmbs[path[0]]
+        return [(filename, caption + ' CMB No.' + cmb.name, 'Rendering of CMB No.' + cmb.get_name() + ' failed')]
+        
+    def render_cmb(self, folder, replacement_dict, path, recursive = True, progress=None, max_jobs=None):
+        """Render CMB
+            
+            Items depending on the CMB are rendered in parallel before and after 
+            the CMB to resolve cross references between documents.
+            
+            Arguments:
+                folder: Output folder
+                replacement_dict: Replacement dictionary for global values
+                path: Path of CMB to be rendered
+                recursive: Flag to select rendering of dependent items
+                progress: ProgressWindow object for reporting progress
+                max_jobs: Maximum number of latex processes run in parallel,
+                          defaults to misc.LATEX_MAX_JOBS
+        """
+        log.info('DataModel - render_cmb - ' + str([path, recursive]))
+        # Build all data structures
+        self.update()
+        
+        # Write latex files of cmb and dependencies
+        filename = self.write_cmb_latex(folder, replacement_dict, path)
+        jobs = self.get_cmb_jobs(path, filename)
+        dep_cmbs = []
+        dep_jobs = []
+        rebuild_jobs = []
+        if recursive:
+            # All cmbs refered by cmb
             for cmb_count, cmb in enumerate(self.cmbs):
                 if path[0] in self.cmb_ref[cmb_count]:
-                    if progress is not None:
-                        progress.add_message('Rendering CMB No.' + cmb.name)
-                    code = self.render_cmb(folder, replacement_dict, [cmb_count],False)
-                    if progress is not None:
-                        progress.pulse()
-                    if code[0] == misc.CMB_ERROR:
-                        return code
-        # Run on all bills refering cmb
-        if recursive: # if recursive call
-            for bill_count,bill in enumerate(self.bills):
+                    dep_filename = self.write_cmb_latex(folder, replacement_dict, [cmb_count])
+                    dep_jobs += self.get_cmb_jobs([cmb_count], dep_filename)
+                    rebuild_jobs += self.get_cmb_jobs([cmb_count], dep_filename, 'Rebuilding index for')
+                    dep_cmbs.append(cmb_count)
+            # All bills refering cmb
+            for bill_count, bill in enumerate(self.bills):
                 if path[0] in bill.cmb_ref:
-                    if progress is not None:
-                        progress.add_message('Rendering Bill No.' + bill.data.cmb_name)
-                    code = self.render_bill(folder, replacement_dict, [bill_count], False)
-                    if progress is not None:
-                        progress.pulse()
-                    if code[0] == misc.CMB_ERROR:
-                        return code
-                        
-        # Run latex on file
-        if progress is not None:
-            progress.add_message('Rendering CMB No.' + self.cmbs[path[0]].name)
-        code = misc.run_latex(misc.posix_path(folder), filename)
+                    dep_filenames = self.write_bill_latex(folder, replacement_dict, [bill_count])
+                    if dep_filenames is not None:
+                        dep_jobs += self.get_bill_jobs([bill_count], dep_filenames)
+                        rebuild_jobs += self.get_bill_jobs([bill_count], dep_filenames, 'Rebuilding index for')
+            stages = [dep_jobs, jobs, rebuild_jobs]
+        else:
+            stages = [jobs]
+        
+        # Setup progress window
         if progress is not None:
-            progress.pulse()
-        if code == misc.CMB_ERROR:
-            return (misc.CMB_ERROR,'Rendering of CMB No.' + self.cmbs[path[0]].get_name() + ' failed')
-
-        # Run on all cmbs and bills refering cmb again to rebuild indexes on recursive run
-        # Run on all cmbs refered by cmb
-        if recursive: # if recursive call
-            for cmb_count, cmb in enumerate(self.cmbs):
-                if path[0] in self.cmb_ref[cmb_count]:
-                    if progress is not None:
-                        progress.add_message('Rebuilding index for CMB No.' + cmb.name)
-                    code = self.render_cmb(folder, replacement_dict, [cmb_count],False)
-                    if progress is not None:
-                        progress.pulse()
-                    if code[0] == misc.CMB_ERROR:
-                        return code
-        # Run on all bills refering cmb
-        if recursive: # if recursive call
-            for bill_count,bill in enumerate(self.bills):
-                if path[0] in bill.cmb_ref:
-                    if progress is not None:
-                        progress.add_message('Rebuilding index for Bill No.' + bill.data.cmb_name)
-                    code = self.render_bill(folder, replacement_dict, [bill_count], False)
-                    if progress is not None:
-                        progress.pulse()
-                    if code[0] == misc.CMB_ERROR:
-                        return code
+            progress.set_pulse_step(1/(len(dep_jobs) + len(rebuild_jobs) + len(jobs) + 1))
+            
+        # Run latex on cmb and dependencies
+        code = misc.run_latex_jobs(misc.posix_path(folder), stages, max_jobs, progress)
+        if code[0] == misc.CMB_ERROR:
+            return code
         
         # Get spreadsheet buffer
         if progress is not None:
             progress.add_message('Rendering CMB No.' + self.cmbs[path[0]].name + ' to .xlsx')
-        spreadsheet = self.cmbs[path[0]].get_spreadsheet_buffer([path[0]], self.schedule)
-        filename = misc.posix_path(folder,'cmb_' + str(path[0]+1) + '.xlsx')
-        spreadsheet.save(filename)
+        for cmb_count in dep_cmbs:
+            self.write_cmb_spreadsheet(folder, [cmb_count])
+        self.write_cmb_spreadsheet(folder, path)
         if progress is not None:
             progress.add_message('<b>Rendering Finished</b>', markup=True)
             progress.pulse(end=True)
@@ -579,6 +840,7 @@ class DataModel:
         else:
             self.bills.append(item)
             new_row = len(self.bills) - 1
+        self.mark_bill_dirty()
         self.update()
 
         yield "Insert data items to bill at row '{}'".format(new_row)
@@ -591,37 +853,109 @@ class DataModel:
         """Undoable function for editing a bill in model"""
         log.info('DataModel - edit_bill_at_row - ' + str(row))
         if row is not None:
-            old_data = copy.deepcopy(self.bills[row].get_model())
+            # Bill data is replaced, old data being kept for undo
+            old_data = self.bills[row].data
+            self.bills[row].data = bill.BillData()
             self.bills[row].set_model(data_model)
+            self.mark_bill_dirty(row)
         self.update()
 
         yield "Edit bill item at row '{}'".format(row)
         # Undo action
         if row is not None:
-            self.bills[row].set_model(old_data)
+            self.bills[row].data = old_data
+            self.mark_bill_dirty(row)
         self.update()
     
     @undoable
     def delete_bill(self, row):
         """Undoable function for deleting a bill from model"""
         log.info('DataModel - delete_bill - ' + str(row))
-        data_model = self.bills[row].get_model()
+        # Bill data is kept for undo in place of a copy of its model
+        bill_data = self.bills[row].data
         del self.bills[row]
+        self.mark_bill_dirty()
         self.update()
 
         yield "Delete data items from bill at row '{}'".format(row)
         # Undo action
-        self.insert_bill_at_row(data_model, row)
+        bill_item = bill.Bill()
+        bill_item.data = bill_data
+        self.bills.insert(row, bill_item)
+        self.mark_bill_dirty()
         self.update()
         
-    def render_bill(self, folder, replacement_dict, path, recursive=True, progress=None):
+    def get_bill_cmb_refs(self, path):
+        """Return set of cmbs refered by bill including cmbs with abstracted items"""
+        bill = self.bills[path[0]]
+        cmb_refs = bill.cmb_ref.copy()
+        # Add all cmbs depending on cmbs billed to include abstracted items
+        for count in bill.cmb_ref:
+            if count != -1:  # if not prev bill
+                cmb_refs |= self.cmb_ref[count]
+        return cmb_refs
+        
+    def write_bill_latex(self, folder, replacement_dict, path):
+        """Write latex files of bill abstract and bill schedule to folder
+            
+            Arguments:
+                folder: Output folder
+                replacement_dict: Replacement dictionary for global values
+                path: Path of Bill
+            Returns:
+                Filenames of latex files written, None for custom bills
+        """
+        bill = self.bills[path[0]]
+        if bill.data.bill_type not in (misc.BILL_NORMAL, misc.BILL_FINAL):
+            return None
+            
+        # Fill in latex buffer
+        latex_buffer = bill.get_latex_buffer([path[0]], self.schedule, self.project_settings)
+        latex_buffer_bill = bill.get_latex_buffer_bill(self.schedule, self.project_settings)
+        # Make global variables replacements
+        latex_buffer.replace_and_clean(replacement_dict)
+        latex_buffer_bill.replace_and_clean(replacement_dict)
+        
+        # Include linked cmbs
+        replacement_dict_cmbs = {}
+        external_docs = ''
+        for cmbpath in self.get_bill_cmb_refs(path):
+            if cmbpath != -1:
+                external_docs += '\\externaldocument{cmb_' + str(cmbpath + 1) + '}\n'
+            elif bill.data.prev_bill is not None: # prev abstract
+                external_docs += '\\externaldocument{abs_' + str(bill.data.prev_bill + 1) + '}\n'
+        replacement_dict_cmbs['$cmbexternaldocs$'] = external_docs
+        latex_buffer.replace(replacement_dict_cmbs)
+
+        # Write output
+        filename = misc.posix_path(folder, 'abs_' + str(path[0] + 1) + '.tex')
+        latex_buffer.write(filename)
+        filename_bill = misc.posix_path(folder, 'bill_' + str(path[0] + 1) + '.tex')
+        latex_buffer_bill.write(filename_bill)
+        return [filename, filename_bill]
+        
+    def get_bill_jobs(self, path, filenames, caption='Rendering'):
+        """Return latex jobs for rendering bill for use with misc.run_latex_jobs"""
+        bill = self.bills[path[0]]
+        return [(filenames[0], caption + ' Bill No.' + bill.data.cmb_name + ' Abstract',
+                 'Rendering of Bill: ' + bill.data.title + ' failed'),
+                (filenames[1], caption + ' Bill No.' + bill.data.cmb_name + ' Schedule',
+                 'Rendering of Bill Schedule: ' + bill.data.title + ' failed')]
+        
+    def render_bill(self, folder, replacement_dict, path, recursive=True, progress=None, max_jobs=None):
         """Render bill to file
             
+            CMBs refered by the bill are rendered in parallel before and after
+            the bill to resolve cross references between documents.
+            
             Arguments:
                 folder: Output folder
                 replacement_dict: Replacement dictionary for global values
                 path: Path of Bill to be rendered
                 recursive: Flag to select rendering of dependent items
+                progress: ProgressWindow object for reporting progress
+                max_jobs: Maximum number of latex processes run in parallel,
+                          defaults to misc.LATEX_MAX_JOBS
         """
         log.info('DataModel - render_bill - ' + str([path, recursive]))
                 
@@ -636,93 +970,40 @@ class DataModel:
             if progress:
                 progress.show()
             
-            # Fill in latex buffer
-            latex_buffer = bill.get_latex_buffer([path[0]], self.schedule, self.project_settings)
-            latex_buffer_bill = bill.get_latex_buffer_bill(self.schedule, self.project_settings)
-            # Make global variables replacements
-            latex_buffer.replace_and_clean(replacement_dict)
-            latex_buffer_bill.replace_and_clean(replacement_dict)
-            
-            # Include linked cmbs
-            cmb_refs = bill.cmb_ref.copy()
-            replacement_dict_cmbs = {}
-            external_docs = ''
-            # Add all cmbs depending on cmbs billed to include abstracted items
-            for count in bill.cmb_ref:
-                cmb_refs |= self.cmb_ref[count]
-            for cmbpath in cmb_refs:
-                if cmbpath != -1:
-                    external_docs += '\externaldocument{cmb_' + str(cmbpath + 1) + '}\n'
-                elif bill.data.prev_bill is not None: # prev abstract
-                    external_docs += '\externaldocument{abs_' + str(bill.data.prev_bill + 1) + '}\n'
-            replacement_dict_cmbs['$cmbexternaldocs$'] = external_docs
-            latex_buffer.replace(replacement_dict_cmbs)
-            
+            # Write latex files of bill and dependencies
+            filenames = self.write_bill_latex(folder, replacement_dict, path)
+            jobs = self.get_bill_jobs(path, filenames)
+            dep_jobs = []
+            rebuild_jobs = []
+            if recursive:
+                # All cmbs depending on the bill
+                dep_cmbs = sorted(self.get_bill_cmb_refs(path) - set([-1]))
+                for cmb_ref in dep_cmbs:
+                    dep_filename = self.write_cmb_latex(folder, replacement_dict, [cmb_ref])
+                    dep_jobs += self.get_cmb_jobs([cmb_ref], dep_filename)
+                    rebuild_jobs += self.get_cmb_jobs([cmb_ref], dep_filename, 'Rebuilding index for')
+                # Prev bill
+                if bill.prev_bill is not None and bill.prev_bill.data.bill_type in (misc.BILL_NORMAL, misc.BILL_FINAL):
+                    prev_path = [bill.data.prev_bill]
+                    dep_jobs += self.get_bill_jobs(prev_path, self.write_bill_latex(folder, replacement_dict, prev_path))
+                stages = [dep_jobs, jobs, rebuild_jobs]
+            else:
+                dep_cmbs = []
+                stages = [jobs]
+                
             # Setup progress window
             if progress is not None:
-                billno = 0
-                cmbno = len(cmb_refs)
-                if -1 in cmb_refs:
-                    cmbno -= 1
-                if bill.prev_bill is not None and bill.prev_bill.data.bill_type in (misc.BILL_NORMAL, misc.BILL_FINAL):
-                    billno = 1
-                progress.set_pulse_step(1/(cmbno*2+billno+3))
+                progress.set_pulse_step(1/(len(dep_jobs) + len(rebuild_jobs) + len(jobs) + 1))
 
-            # Write output
-            filename = misc.posix_path(folder, 'abs_' + str(path[0] + 1) + '.tex')
-            latex_buffer.write(filename)
-            filename_bill = misc.posix_path(folder, 'bill_' + str(path[0] + 1) + '.tex')
-            latex_buffer_bill.write(filename_bill)
+            # Run latex on bill and dependencies
+            code = misc.run_latex_jobs(misc.posix_path(folder), stages, max_jobs, progress)
+            if code[0] == misc.CMB_ERROR:
+                return code
 
-            # run latex on file and dependencies
             if recursive:  # if recursive call
-                # Render all cmbs depending on the bill
-                for cmb_ref in cmb_refs:
-                    if cmb_ref != -1:  # if not prev bill
-                        if progress is not None:
-                            progress.add_message('Rendering CMB No.' + self.cmbs[cmb_ref].name)
-                        code = self.render_cmb(folder, replacement_dict, [cmb_ref], False)
-                        if progress is not None:
-                            progress.pulse()
-                        if code[0] == misc.CMB_ERROR:
-                            return code
-                # Render prev bill
-                if bill.prev_bill is not None and bill.prev_bill.data.bill_type in (misc.BILL_NORMAL, misc.BILL_FINAL):
-                    if progress is not None:
-                        progress.add_message('Rendering Bill No.' + bill.prev_bill.data.cmb_name)
-                    code = self.render_bill(folder, replacement_dict, [bill.data.prev_bill], False)
-                    if progress is not None:
-                        progress.pulse()
-                    if code[0] == misc.CMB_ERROR:
-                        return code
-
-            # Render this bill
-            if progress is not None:
-                progress.add_message('Rendering Bill No.' + bill.data.cmb_name + ' Abstract')
-            code = misc.run_latex(misc.posix_path(folder), filename)
-            if progress is not None:
-                progress.pulse()
-            if code == misc.CMB_ERROR:
-                return (misc.CMB_ERROR, 'Rendering of Bill: ' + bill.data.title + ' failed')
-            if progress is not None:
-                progress.add_message('Rendering Bill No.' + bill.data.cmb_name + ' Schedule')
-            code_bill = misc.run_latex(misc.posix_path(folder), filename_bill)
-            if progress is not None:
-                progress.pulse()
-            if code_bill == misc.CMB_ERROR:
-                return (misc.CMB_ERROR, 'Rendering of Bill Schedule: ' + bill.data.title + ' failed')
-
-            # Render all cmbs again to rebuild indexes on recursive run
-            if recursive:  # if recursive call
-                for cmb_ref in cmb_refs:
-                    if cmb_ref != -1:  # if not prev bill
-                        if progress is not None:
-                            progress.add_message('Rebuilding index for CMB No.' + self.cmbs[cmb_ref].name)
-                        code = self.render_cmb(folder, replacement_dict, [cmb_ref], False)
-                        if progress is not None:
-                            progress.pulse()
-                        if code[0] == misc.CMB_ERROR:
-                            return code
+                # Write spreadsheet outputs of cmbs
+                for cmb_ref in dep_cmbs:
+                    self.write_cmb_spreadsheet(folder, [cmb_ref])
                 # Write spreadsheet output
                 filename_bill_spreadsheet = misc.posix_path(folder, 'bill_' + str(path[0] + 1) + '.xlsx')
                 if progress is not None:
@@ -740,90 +1021,210 @@ class DataModel:
 
         
 class LockState:
-    """Implements variable for storing N-D array of bools for tracking variable lock states"""
+    """Implements a set of paths for tracking variable lock states
+    
+        Paths are held as tuples in a set. A sorted list of paths is built
+        when required for enumerating paths in order or under a prefix.
+    """
     
     def __init__(self, mitems = None):
         """Initialises class with list of path indices"""
-        self.flags = []
+        self.paths = set()
+        self.sorted_paths = None  # Sorted list of paths, None if modified
         if mitems != None:
-            for mitem in mitems:
-                self.__setitem__(mitem, True)
-                
-    def resize(self, path):
-        """Resize array to path"""
-        flag_part = self.flags
-        for index in path[:-1]:
-            if len(flag_part) <= index:
-                # Expand array
-                for i in range(index - len(flag_part) + 1):
-                    flag_part.append([])
-            flag_part = flag_part[index]
-        if len(flag_part) <= path[-1]:
-            flag_part.extend([False]*(path[-1] - len(flag_part) + 1))
+            self.paths.update(tuple(mitem) for mitem in mitems)
             
-    def get_paths(self, paths=None, flags = None, level=None):
-        """Returns a list of paths from model"""
-        if level is None:
-            level = []
-        if paths == None:
-            paths = []
-            flags = self.flags
-        for index, flag_part in enumerate(flags):
-            if isinstance(flag_part, list):
-                self.get_paths(paths, flag_part, level + [index])
-            # If at terminal node, append path
-            elif flag_part == True:
-                paths.append(level + [index])
+    def get_sorted(self):
+        """Return sorted list of paths"""
+        if self.sorted_paths is None:
+            self.sorted_paths = sorted(self.paths)
+        return self.sorted_paths
+            
+    def get_paths(self, prefix=None):
+        """Returns a list of paths in order
+        
+            Arguments:
+                prefix: (Optional) Return only paths starting with prefix
+        """
+        sorted_paths = self.get_sorted()
+        if not prefix:
+            return [list(path) for path in sorted_paths]
+        prefix = tuple(prefix)
+        length = len(prefix)
+        paths = []
+        for index in range(bisect.bisect_left(sorted_paths, prefix), len(sorted_paths)):
+            path = sorted_paths[index]
+            if path[:length] != prefix:
+                break
+            paths.append(list(path))
         return paths
                         
     def __setitem__(self, path, value):
         """Set path"""
-        # Resize array to path
-        self.resize(path)
-        flag_part = self.flags
-        if value in [True, False]:
-            for index in path[:-1]:
-                flag_part = flag_part[index]
-            flag_part[path[-1]] = value
+        if value is True:
+            self.paths.add(tuple(path))
+            self.sorted_paths = None
+        elif value is False:
+            self.paths.discard(tuple(path))
+            self.sorted_paths = None
             
     def __getitem__(self, path):
         """Get path
             
             Returns:
-                True/False: if path exist
-                None: If path does not exist
+                True/False: if path is set or not
         """
-        # Resize array to path
-        flag_part = self.flags
-        for index in path[:-1]:
-            if len(flag_part) > index:
-                flag_part = flag_part[index]
-            else:
-                return None
-        if len(flag_part) > path[-1]:
-            return flag_part[path[-1]]
-        else:
-            return None
+        return tuple(path) in self.paths
+        
+    def __contains__(self, path):
+        return tuple(path) in self.paths
+        
+    def __len__(self):
+        return len(self.paths)
+        
+    def copy(self):
+        """Return copy of lock state"""
+        new_lock = LockState()
+        new_lock.paths = set(self.paths)
+        return new_lock
                 
     def __add__(self, other):
         """Add items"""
-        # Copy current array
-        new_lock = copy.deepcopy(self)
-        # Resize array to size of other and set item
-        paths = other.get_paths()
-        for path in paths:
-            new_lock.resize(path)
-            new_lock[path] = True
+        new_lock = self.copy()
+        new_lock += other
         return new_lock
                 
     def __sub__(self, other):
-        """Add items"""
-        # Copy current array
-        new_lock = copy.deepcopy(self)
-        # Resize array to size of other and set item
-        paths = other.get_paths()
-        for path in paths:
-            new_lock.resize(path)
-            new_lock[path] = False
+        """Remove items"""
+        new_lock = self.copy()
+        new_lock -= other
         return new_lock
         
+    def __iadd__(self, other):
+        """Add items in place"""
+        self.paths |= other.paths
+        self.sorted_paths = None
+        return self
+        
+    def __isub__(self, other):
+        """Remove items in place"""
+        self.paths -= other.paths
+        self.sorted_paths = None
+        return self
+        
+        
+
+class ItemIndex:
+    """Implements an index of Cmbs, Measurements and MeasurementItems by id
+    
+        Positions of children are cached for each parent and rebuilt only
+        when the parent is modified, so that items are located without
+        renumbering references on inserts and deletes.
+    """
+    
+    def __init__(self, cmbs):
+        """Initialises class with list of Cmb objects indexed"""
+        self.cmbs = cmbs
+        self.objects = dict()  # Object and id of parent for each id
+        self.positions = dict()  # Positions of children for each parent id, None for cmbs
+        self.abstracts = set()  # Ids of MeasurementItemAbstract items
+        self.next_id = 1  # Id assigned to next object added
+        self.version = 0  # Incremented on every change in structure
+        self.valid = False  # Index to be rebuilt if False
+        
+    def clear(self):
+        """Clear index and mark it for rebuilding"""
+        self.objects.clear()
+        self.positions.clear()
+        self.abstracts.clear()
+        self.next_id = 1
+        self.version += 1
+        self.valid = False
+        
+    def rebuild(self, references):
+        """Rebuild index from Cmb objects, assigning ids to objects without one
+        
+            Arguments:
+                references: Ids refered to outside of cmbs, not reassigned
+        """
+        self.clear()
+        # Ids are never reused, including ids of deleted items still refered
+        used_ids = [item_id for item_id in references if isinstance(item_id, int)]
+        for cmb in self.cmbs:
+            used_ids += self.get_ids(cmb)
+        self.next_id = max(used_ids, default=0) + 1
+        self.valid = True
+        for cmb in self.cmbs:
+            self.add(cmb, None)
+        
+    def get_ids(self, obj):
+        """Return ids of object, its children and items refered by abstracts"""
+        ids = []
+        if isinstance(obj.id, int):
+            ids.append(obj.id)
+        if isinstance(obj, measurement.MeasurementItemAbstract):
+            ids += [item_id for item_id in obj.mitems if isinstance(item_id, int)]
+        elif isinstance(obj, (measurement.Cmb, measurement.Measurement)):
+            for child in obj.items:
+                ids += self.get_ids(child)
+        return ids
+        
+    def add(self, obj, parent_id):
+        """Add object and its children to index
+        
+            New ids are assigned to objects without an id or with an id
+            already in use, as for copies of items. Objects are added on
+            rebuilding if index is not valid.
+            
+            Arguments:
+                obj: Cmb/Measurement/Completion/MeasurementItem object
+                parent_id: Id of parent object, None for Cmb
+        """
+        if not self.valid:
+            return
+        if not isinstance(obj.id, int) or obj.id in self.objects:
+            obj.id = self.next_id
+        self.next_id = max(self.next_id, obj.id + 1)
+        self.objects[obj.id] = (obj, parent_id)
+        self.positions.pop(parent_id, None)
+        if isinstance(obj, measurement.MeasurementItemAbstract):
+            self.abstracts.add(obj.id)
+        elif isinstance(obj, (measurement.Cmb, measurement.Measurement)):
+            for child in obj.items:
+                self.add(child, obj.id)
+        self.version += 1
+            
+    def remove(self, obj):
+        """Remove object and its children from index"""
+        if obj.id not in self.objects:
+            return
+        if isinstance(obj, (measurement.Cmb, measurement.Measurement)):
+            for child in obj.items:
+                self.remove(child)
+        parent_id = self.objects.pop(obj.id)[1]
+        self.positions.pop(parent_id, None)
+        self.positions.pop(obj.id, None)
+        self.abstracts.discard(obj.id)
+        self.version += 1
+        
+    def get_object(self, item_id):
+        """Return object with id, None if not found"""
+        entry = self.objects.get(item_id)
+        return entry[0] if entry is not None else None
+        
+    def get_path(self, item_id):
+        """Return path of object with id, None if not found"""
+        path = []
+        while item_id is not None:
+            entry = self.objects.get(item_id)
+            if entry is None:
+                return None
+            parent_id = entry[1]
+            positions = self.positions.get(parent_id)
+            if positions is None:
+                children = self.cmbs if parent_id is None else self.objects[parent_id][0].items
+                positions = {child.id: index for index, child in enumerate(children)}
+                self.positions[parent_id] = positions
+            path.insert(0, positions[item_id])
+            item_id = parent_id
+        return path
@@ -22,8 +22,8 @@
 #  
 #  
 
-from gi.repository import Gtk, Gdk, GLib
-import copy, logging
+import copy, logging, itertools
+from array import array
 
 # local files import
 from .. import misc
@@ -31,11 +31,29 @@ from .. import misc
 # Setup logger object
 log = logging.getLogger(__name__)
 
+# Maximum number of shared record metadata objects
+RECORD_META_CACHE_SIZE = 256
+
+def add_model_id(data, item_id, clean=False):
+    """Append id of item to its model data
+    
+        Ids are left out of clean models, so that copies of items are
+        assigned new ids by the data model.
+    """
+    if item_id is not None and not clean:
+        data.append(item_id)
+    return data
+
 class Cmb:
     """Stores a CMB data instance"""
+    
+    id = None  # Unique id, assigned by data model
+    
     def __init__(self, model=None):
         if model is not None:
             self.name = model[0]
+            if len(model) > 2:
+                self.id = model[2]
             self.items = []
             for item_model in model[1]:
                 if item_model[0] in ['Measurement','Completion']:
@@ -80,7 +98,7 @@ class Cmb:
         items_model = []
         for item in self.items:
             items_model.append(item.get_model(clean))
-        return ['CMB', [self.name, items_model]]
+        return ['CMB', add_model_id([self.name, items_model], self.id, clean)]
     
     def set_model(self, model):
         """Set data model"""
@@ -90,8 +108,12 @@ class Cmb:
     def clear(self):
         self.items = []
         
-    def get_latex_buffer(self, path, schedule):
-        latex_buffer = misc.LatexFile()
+    def get_latex_parts(self, path, schedule):
+        """Yield latex code of CMB as LatexFile parts
+        
+            Parts are generated as they are consumed and joined by newlines
+            form the CMB document.
+        """
         cmb_local_vars = {}
         cmb_local_vars_vanila = {}
         cmb_local_vars['$cmbbookno$'] = self.name
@@ -105,26 +127,64 @@ class Cmb:
         else:
             cmb_local_vars_vanila['$completionaloneflag$'] = '\iftrue'
         
+        latex_buffer = misc.LatexFile()
         latex_buffer.add_preffix_from_file(misc.abs_path('latex','preamble.tex'))
         latex_buffer.replace_and_clean(cmb_local_vars)
+        latex_buffer.replace(cmb_local_vars_vanila)
+        yield latex_buffer
         for count,item in enumerate(self.items):
             newpath = list(path) + [count]
-            latex_buffer += item.get_latex_buffer(newpath, schedule)
-        latex_buffer.add_suffix_from_file(misc.abs_path('latex','end.tex'))
+            for latex_part in item.get_latex_parts(newpath, schedule):
+                latex_part.replace(cmb_local_vars_vanila)
+                yield latex_part
+        latex_buffer = misc.LatexFile.from_file(misc.abs_path('latex','end.tex'))
         latex_buffer.replace(cmb_local_vars_vanila)
+        yield latex_buffer
+        
+    def get_latex_buffer(self, path, schedule):
+        latex_parts = self.get_latex_parts(path, schedule)
+        latex_buffer = next(latex_parts)
+        for latex_part in latex_parts:
+            latex_buffer += latex_part
         return latex_buffer
+        
+    def write_latex(self, sink, path, schedule, replacements=None):
+        """Write latex code of CMB while it is generated
+        
+            Arguments:
+                sink: Filename, or open text file or io.TextIOBase to write to
+                path: Path of CMB
+                schedule: Schedule of project
+                replacements: List of (dictionary, clean) pairs of replacements for
+                              the whole document, as in misc.LatexWriter
+        """
+        with misc.LatexWriter(sink, replacements) as writer:
+            for latex_part in self.get_latex_parts(path, schedule):
+                writer.write(latex_part)
     
-    def get_spreadsheet_buffer(self, path, schedule):
-        spreadsheet = misc.Spreadsheet()
+    def get_spreadsheet_buffer(self, path, schedule, spreadsheet=None):
+        """Return spreadsheet of CMB
+        
+            Arguments:
+                path: Path of CMB
+                schedule: Schedule of project
+                spreadsheet: SpreadsheetBuffer to which rows are added, a
+                             new SpreadsheetBuffer is used if None
+            Returns:
+                SpreadsheetBuffer with rows of CMB added
+        """
+        if spreadsheet is None:
+            spreadsheet = misc.SpreadsheetBuffer()
+        # Set sheet properties
+        spreadsheet.set_title('CMB')
+        spreadsheet.set_column_widths([10, 50, 15] + [10]*15)
         # Set datas
         spreadsheet.add_merged_cell(value='DETAILS OF MEASUREMENT FOR ' + self.name + '  (ref:' + str(path) + ')', bold=True, width=6, horizontal='center')
         spreadsheet.append_data([[None]])
-        # Set datas of children
+        # Set datas of children, each after a blank row
         for slno, item in enumerate(self.items):
-            spreadsheet.append(item.get_spreadsheet_buffer(path + [slno], schedule))
-        # Set sheet properties
-        spreadsheet.set_title('CMB')
-        spreadsheet.set_column_widths([10, 50, 15] + [10]*15)
+            spreadsheet.append_data([[None]])
+            item.get_spreadsheet_buffer(path + [slno], schedule, spreadsheet)
         
         return spreadsheet
         
@@ -141,9 +201,14 @@ class Cmb:
         
 class Measurement:
     """Stores a Measurement groups"""
+    
+    id = None  # Unique id, assigned by data model
+    
     def __init__(self, model = None):
         if model is not None:
             self.date = model[0]
+            if len(model) > 2:
+                self.id = model[2]
             self.items = []
             class_list = ['MeasurementItemHeading',
                         'MeasurementItemCustom',
@@ -191,34 +256,44 @@ class Measurement:
         items_model = []
         for item in self.items:
             items_model.append(item.get_model(clean))
-        return ['Measurement', [self.date, items_model]]
+        return ['Measurement', add_model_id([self.date, items_model], self.id, clean)]
     
     def set_model(self, model):
         """Set data model"""
         if model[0] == 'Measurement':
             self.__init__(model[1])
         
-    def get_latex_buffer(self, path, schedule):
+    def get_latex_parts(self, path, schedule):
+        """Yield latex code of measurement as LatexFile parts"""
         latex_buffer = misc.LatexFile()
         latex_buffer.add_preffix_from_file(misc.abs_path('latex', 'measgroup.tex'))
         # Replace local variables
         measgroup_local_vars = {}
         measgroup_local_vars['$cmbmeasurementdate$'] = self.date
         latex_buffer.replace_and_clean(measgroup_local_vars)
+        yield latex_buffer
         
         for count,item in enumerate(self.items):
             newpath = list(path) + [count]
-            latex_buffer += item.get_latex_buffer(newpath, schedule)
+            yield item.get_latex_buffer(newpath, schedule)
+        
+    def get_latex_buffer(self, path, schedule):
+        latex_parts = self.get_latex_parts(path, schedule)
+        latex_buffer = next(latex_parts)
+        for latex_part in latex_parts:
+            latex_buffer += latex_part
         return latex_buffer
             
-    def get_spreadsheet_buffer(self, path, schedule):
-        spreadsheet = misc.Spreadsheet()
+    def get_spreadsheet_buffer(self, path, schedule, spreadsheet=None):
+        if spreadsheet is None:
+            spreadsheet = misc.SpreadsheetBuffer()
         # Set datas
         rows = [[str(path), 'Date of measurement:', self.date], [None]]
         spreadsheet.append_data(rows, bold=True, wrap_text=False)
-        # Set datas of children
+        # Set datas of children, each after a blank row
         for slno, item in enumerate(self.items):
-            spreadsheet.append(item.get_spreadsheet_buffer(path + [slno], schedule))
+            spreadsheet.append_data([[None]])
+            item.get_spreadsheet_buffer(path + [slno], schedule, spreadsheet)
             
         return spreadsheet
         
@@ -238,6 +313,9 @@ class Measurement:
         
 class MeasurementItem:
     """Base class for storing Measurement items"""
+    
+    id = None  # Unique id, assigned by data model
+    
     def __init__(self, itemnos=None, records=None, remark="", item_remarks=None):
         if itemnos is None:
             itemnos = []
@@ -292,6 +370,8 @@ class MeasurementItemHeading(MeasurementItem):
     def __init__(self, model=None):
         if model is not None:
             MeasurementItem.__init__(self,remark=model[0])
+            if len(model) > 1:
+                self.id = model[1]
         else:
             MeasurementItem.__init__(self)
     
@@ -299,9 +379,9 @@ class MeasurementItemHeading(MeasurementItem):
         """Get data model
             
             Arguments:
-                clean: Dummy variable
+                clean: Removes id if True
         """
-        model = ['MeasurementItemHeading', [self.remark]]
+        model = ['MeasurementItemHeading', add_model_id([self.remark], self.id, clean)]
         return model
     
     def set_model(self, model):
@@ -322,8 +402,9 @@ class MeasurementItemHeading(MeasurementItem):
         latex_buffer.replace_and_clean(measheading_local_vars)
         return latex_buffer
     
-    def get_spreadsheet_buffer(self, path, schedule):
-        spreadsheet = misc.Spreadsheet()
+    def get_spreadsheet_buffer(self, path, schedule, spreadsheet=None):
+        if spreadsheet is None:
+            spreadsheet = misc.SpreadsheetBuffer()
         spreadsheet.append_data([[str(path), self.remark], [None]], bold=True, wrap_text=True)
         return spreadsheet
         
@@ -337,26 +418,72 @@ class MeasurementItemHeading(MeasurementItem):
     def print_item(self):
         print("    " + self.remark)
 
+class RecordMeta:
+    """Column metadata shared by records of a MeasurementItemCustom"""
+    __slots__ = ('cust_funcs', 'total_func', 'columntypes', 'numeric')
+    
+    # Shared instances, keyed by identity of metadata objects
+    instances = dict()
+    
+    def __init__(self, cust_funcs, total_func, columntypes):
+        self.cust_funcs = cust_funcs
+        self.total_func = total_func
+        self.columntypes = columntypes
+        # Flags for columns evaluated as numbers
+        self.numeric = tuple(columntype not in [misc.MEAS_DESC, misc.MEAS_CUST] for columntype in columntypes)
+        
+    @classmethod
+    def get(cls, cust_funcs, total_func, columntypes):
+        """Return shared metadata object for the passed metadata"""
+        key = (id(cust_funcs), id(total_func), id(columntypes))
+        meta = cls.instances.get(key)
+        if meta is None or meta.cust_funcs is not cust_funcs or meta.total_func is not total_func \
+                or meta.columntypes is not columntypes:
+            meta = cls(cust_funcs, total_func, columntypes)
+            # Reset on plugin reloads leaving stale entries
+            if len(cls.instances) > RECORD_META_CACHE_SIZE:
+                cls.instances.clear()
+            cls.instances[key] = meta
+        return meta
+
+
 class RecordCustom:
-    """An individual record of a MeasurementItemCustom"""
+    """An individual record of a MeasurementItemCustom
+    
+        Records hold only their data and total, column metadata is shared through
+        RecordMeta objects.
+    """
+    __slots__ = ('data_string', 'data', 'meta', 'total')
+    
     def __init__(self, items, cust_funcs, total_func, columntypes):
         self.data_string = items
+        self.meta = RecordMeta.get(cust_funcs, total_func, columntypes)
         self.data = []
         # Populate Data
-        for x,columntype in zip(self.data_string,columntypes):
-            if columntype not in [misc.MEAS_DESC, misc.MEAS_CUST]:
+        for x,numeric in zip(self.data_string,self.meta.numeric):
+            if numeric:
                 try:
-                    num = eval(x)
+                    num = misc.evaluate_expression(x)
                     self.data.append(num)
                 except:
                     self.data.append(0)
             else:
                 self.data.append(0)
-        self.cust_funcs = cust_funcs
-        self.total_func = total_func
-        self.columntypes = columntypes
+        # Total evaluated once for values set
         self.total = self.find_total()
-
+                
+    @property
+    def cust_funcs(self):
+        return self.meta.cust_funcs
+        
+    @property
+    def total_func(self):
+        return self.meta.total_func
+        
+    @property
+    def columntypes(self):
+        return self.meta.columntypes
+        
     def get_model(self):
         """Get data model"""
         return self.data_string
@@ -365,7 +492,7 @@ class RecordCustom:
         """Get data model with results of custom functions included for rendering"""
         item = self.get_model()
         rendered_item = []
-        for item_elem, columntype, render_func in zip(item, self.columntypes, self.cust_funcs):
+        for item_elem, item_value, columntype, render_func in zip(item, self.data, self.columntypes, self.cust_funcs):
             try:
                 if item_elem != "" or columntype == misc.MEAS_CUST:
                     if columntype == misc.MEAS_CUST:
@@ -379,10 +506,11 @@ class RecordCustom:
                     if columntype == misc.MEAS_DESC:
                         rendered_item.append(item_elem)
                     elif columntype == misc.MEAS_NO:
-                        value = int(eval(item_elem)) if item_elem not in ['0','0.0'] else 0
+                        # Use values evaluated on initialisation
+                        value = int(item_value)
                         rendered_item.append(value)
                     elif columntype == misc.MEAS_L:
-                        value = round(eval(item_elem),3) if item_elem not in ['0','0.0'] else 0
+                        value = round(item_value,3)
                         rendered_item.append(value)
                 else:
                     rendered_item.append(None)
@@ -403,10 +531,84 @@ class RecordCustom:
 
     def print_item(self):
         print("      " + str([self.data_string,self.total]))
+        
+        
+class RecordColumns:
+    """Columnar store of evaluated values of records of a MeasurementItemCustom
+    
+        Values of each column are held in an array of doubles, allowing totals
+        to be evaluated as column expressions in a single pass over records.
+    """
+    def __init__(self, records, width):
+        self.records = records  # Source list of records
+        self.length = len(records)
+        self.columns = []
+        for index in range(width):
+            column = array('d')
+            for record in records:
+                try:
+                    column.append(record.data[index])
+                except (TypeError, IndexError):
+                    column.append(0)
+            self.columns.append(column)
+            
+    def is_valid(self, records):
+        """Check if store corresponds to list of records"""
+        return self.records is records and self.length == len(records)
+        
+    def __getitem__(self, index):
+        return self.columns[index]
+        
+    def __len__(self):
+        return self.length
+        
+    def rows(self, indices):
+        """Return iterator over tuples of values of columns for each record"""
+        return zip(*[self.columns[index] for index in indices])
+        
+    def product(self, indices, skip_zero=False, digits=None):
+        """Return list of products of columns for each record
+        
+            Arguments:
+                indices: Indices of columns
+                skip_zero: Skip zero values from product, with all zero values
+                           resulting in zero.
+                digits: Digits to round results to, None for no rounding
+        """
+        results = []
+        for values in self.rows(indices):
+            total = 1
+            nonzero = False
+            for value in values:
+                if value != 0 or not skip_zero:
+                    total *= value
+                    nonzero = True
+            if not nonzero:
+                total = 0
+            results.append(total if digits is None else round(total, digits))
+        return results
+        
+    def sum(self, indices, digits=None):
+        """Return list of sums of columns for each record"""
+        if digits is None:
+            return [sum(values) for values in self.rows(indices)]
+        else:
+            return [round(sum(values), digits) for values in self.rows(indices)]
+        
+    def round(self, index, digits):
+        """Return list of values of column rounded for each record"""
+        return [round(value, digits) for value in self.columns[index]]
 
 
 class MeasurementItemCustom(MeasurementItem):
     """Stores a custom record set [As per plugin loaded]"""
+    
+    # Usage counters of total cache
+    total_cache_hits = 0
+    total_cache_misses = 0
+    # Source of record versions, unique across items
+    versions = itertools.count()
+    
     def __init__(self, data = None, plugin=None):
         self.name = ''
         self.itemtype = None
@@ -416,6 +618,11 @@ class MeasurementItemCustom(MeasurementItem):
         self.cust_funcs = []
         self.total_func_item = None
         self.total_func = None
+        self.total_func_columns = None
+        self.columns = None  # RecordColumns cache
+        self.total_cache = None  # Cached result of get_total
+        self.total_cache_state = None  # State of records and user data for cached total
+        self.records_version = next(MeasurementItemCustom.versions)  # Renewed on every modification of records
         self.latex_item = ''
         self.latex_record = ''
         # For user data support
@@ -438,13 +645,15 @@ class MeasurementItemCustom(MeasurementItem):
                 self.cust_funcs = self.custom_object.cust_funcs
                 self.total_func_item = self.custom_object.total_func_item
                 self.total_func = self.custom_object.total_func
+                # Optional column expression for totals
+                self.total_func_columns = getattr(self.custom_object, 'total_func_columns', None)
                 self.latex_item = self.custom_object.latex_item
                 self.latex_record = self.custom_object.latex_record
                 # For user data support
                 self.captions_udata = self.custom_object.captions_udata
                 self.columntypes_udata = self.custom_object.columntypes_udata
                 self.latex_postproc_func = self.custom_object.latex_postproc_func
-                self.user_data = self.custom_object.user_data_default
+                self.user_data = copy.copy(self.custom_object.user_data_default)
                 self.export_abstract = self.custom_object.export_abstract
                 self.dimensions = self.custom_object.dimensions
             except ImportError:
@@ -460,6 +669,8 @@ class MeasurementItemCustom(MeasurementItem):
                 remark = data[2]
                 item_remarks = data[3]
                 self.user_data = data[4]
+                if len(data) > 6:
+                    self.id = data[6]
                 MeasurementItem.__init__(self, itemnos, records, remark, item_remarks)
             else:
                 MeasurementItem.__init__(self, [None]*self.item_width(), [],
@@ -479,14 +690,14 @@ class MeasurementItemCustom(MeasurementItem):
         """Get data model
             
             Arguments:
-                clean: Dummy variable
+                clean: Removes id if True
         """
         item_schedule = []
         for item in self.records:
             item_schedule.append(item.get_model())
         data = [self.itemnos, item_schedule, self.remark, self.item_remarks,
                 self.user_data, self.itemtype]
-        return ['MeasurementItemCustom', data]
+        return ['MeasurementItemCustom', add_model_id(data, self.id, clean)]
 
     def set_model(self, model):
         """Set data model"""
@@ -544,7 +755,7 @@ class MeasurementItemCustom(MeasurementItem):
             else:
                 meascustom_rec_vars['$slno$'] = ''
             
-            latex_record = misc.LatexFile(self.latex_record)
+            latex_record = misc.LatexFile.from_template((self.itemtype, 'latex_record'), self.latex_record)
             latex_record.replace(meascustom_rec_vars_van)
             latex_record.replace_and_clean(meascustom_rec_vars)
             latex_records += latex_record
@@ -573,17 +784,18 @@ class MeasurementItemCustom(MeasurementItem):
         else:
             meascustom_local_vars_vannilla['$cmbasbstractitem$'] = '\\iffalse'
         # fill in records - vanilla used since latex_records contains latex code
-        meascustom_local_vars_vannilla['$cmbrecords$'] = latex_records.get_buffer()
+        meascustom_local_vars_vannilla['$cmbrecords$'] = latex_records
             
-        latex_buffer = misc.LatexFile(self.latex_item)
+        latex_buffer = misc.LatexFile.from_template((self.itemtype, 'latex_item'), self.latex_item)
         latex_buffer.replace_and_clean(meascustom_local_vars)
         latex_buffer.replace(meascustom_local_vars_vannilla)
         
         latex_post = self.latex_postproc_func(self.records, self.user_data, latex_buffer, isabstract)
         return latex_post
         
-    def get_spreadsheet_buffer(self, path, schedule):
-        spreadsheet = misc.Spreadsheet()
+    def get_spreadsheet_buffer(self, path, schedule, spreadsheet=None):
+        if spreadsheet is None:
+            spreadsheet = misc.SpreadsheetBuffer()
         # Item no and description
         for slno, itemno in enumerate(self.itemnos):
             if itemno is not None and schedule[itemno] is not None:
@@ -611,11 +823,71 @@ class MeasurementItemCustom(MeasurementItem):
             self[i].print_item()
         print("    " + "Total: " + str(self.get_total()))
 
+    def clear_cache(self):
+        """Clear cached values derived from records"""
+        self.records_version = next(MeasurementItemCustom.versions)
+        self.columns = None
+        self.total_cache = None
+        self.total_cache_state = None
+        
+    def append_record(self, record):
+        self.clear_cache()
+        MeasurementItem.append_record(self, record)
+                
+    def insert_record(self, index, record):
+        self.clear_cache()
+        MeasurementItem.insert_record(self, index, record)
+        
+    def remove_record(self, index):
+        self.clear_cache()
+        MeasurementItem.remove_record(self, index)
+        
+    def __setitem__(self, index, value):
+        self.clear_cache()
+        MeasurementItem.__setitem__(self, index, value)
+        
+    def get_columns(self):
+        """Return RecordColumns store of records, rebuilding it if records changed"""
+        if self.columns is None or not self.columns.is_valid(self.records):
+            self.columns = RecordColumns(self.records, self.model_width())
+        return self.columns
+
     def get_total(self):
-        if self.total_func is not None:
-            return self.total_func(self.records,self.user_data)
+        """Return totals of item, cached till records or user data are modified"""
+        # Cached total valid only for same record list, version and user data
+        state = [self.records, self.records_version, copy.copy(self.user_data)]
+        if self.total_cache is not None and state[0] is self.total_cache_state[0] \
+                and state[1:] == self.total_cache_state[1:]:
+            MeasurementItemCustom.total_cache_hits += 1
+            return list(self.total_cache)
+        MeasurementItemCustom.total_cache_misses += 1
+        
+        if self.total_func_columns is not None:
+            total = self.total_func_columns(self.get_columns(), self.user_data)
+        elif self.total_func is not None:
+            total = self.total_func(self.records,self.user_data)
         else:
-            return []
+            total = []
+        self.total_cache = list(total)
+        self.total_cache_state = state
+        return total
+        
+    def get_version(self):
+        """Return version of records, unique across items"""
+        return self.records_version
+        
+    @classmethod
+    def get_total_cache_stats(cls, reset=False):
+        """Return [hits, misses] of total cache
+        
+            Arguments:
+                reset: Reset counters after reading
+        """
+        stats = [cls.total_cache_hits, cls.total_cache_misses]
+        if reset:
+            cls.total_cache_hits = 0
+            cls.total_cache_misses = 0
+        return stats
 
     def get_text(self):
         total = self.get_total()
@@ -633,13 +905,16 @@ class MeasurementItemAbstract(MeasurementItem):
     """Stores an abstract of measurements"""
     def __init__(self, data = None):
         self.int_mitem = None  # MeasurementItemCustom for storing abstract
-        self.mitems = []  # Paths to items to be abstracted
+        self.mitems = []  # Ids of items to be abstracted
+        self.paths = []  # Paths of items abstracted on last update
         MeasurementItem.__init__(self, itemnos=[], records=[], 
                 remark='', item_remarks = [])
 
         if data is not None:
             self.mitems = data[0]
             self.remark = data[1]
+            if len(data) > 2:
+                self.id = data[2]
 
     def get_model(self, clean=False):
         """Get data model
@@ -651,7 +926,7 @@ class MeasurementItemAbstract(MeasurementItem):
             data = [[], self.remark]
         else:
             data = [self.mitems, self.remark]
-        return ['MeasurementItemAbstract', data]
+        return ['MeasurementItemAbstract', add_model_id(data, self.id, clean)]
 
     def set_model(self, model):
         """Set data model"""
@@ -659,17 +934,23 @@ class MeasurementItemAbstract(MeasurementItem):
             self.clear()
             self.__init__(model[1])
             
-    def update(self, cmbs):
-        """Update values from static itemlist"""
-        if self.mitems:
-            p = self.mitems[0]
+    def update(self, cmbs, paths):
+        """Update values from static itemlist
+        
+            Arguments:
+                cmbs: List of Cmb objects
+                paths: Paths of items abstracted, located from ids in mitems
+        """
+        self.paths = paths
+        if paths:
+            p = paths[0]
             item_int = cmbs[p[0]][p[1]][p[2]]
             type_ = item_int.itemtype
             if self.int_mitem is None:
                 self.int_mitem = MeasurementItemCustom(item_int.get_model()[1], type_)
             # Populate values
             self.int_mitem.records = []
-            for path in self.mitems:
+            for path in paths:
                 item = cmbs[path[0]][path[1]][path[2]]
                 values = item.export_abstract(item.records, item.user_data)
                 # Save abstracted item path to record for reference
@@ -683,22 +964,27 @@ class MeasurementItemAbstract(MeasurementItem):
                 item_remarks = self.int_mitem.item_remarks)
         else:
             self.int_mitem = None
+            MeasurementItem.__init__(self, itemnos=[], records=[], 
+                remark=self.remark, item_remarks = [])
             
     def get_abstracted_items(self):
-        """Returns a list of static paths to abstracted items"""
+        """Returns a list of ids of abstracted items"""
         return self.mitems
 
     def get_latex_buffer(self, path, schedule):
-        if self.mitems:
+        # Ids of deleted items are retained in mitems for undo
+        if self.int_mitem is not None:
             return self.int_mitem.get_latex_buffer(path, schedule, True)
         else:
             return misc.LatexFile()
             
-    def get_spreadsheet_buffer(self, path, schedule):
-        if self.mitems:
-            return self.int_mitem.get_spreadsheet_buffer(path, schedule)
+    def get_spreadsheet_buffer(self, path, schedule, spreadsheet=None):
+        if self.int_mitem is not None:
+            return self.int_mitem.get_spreadsheet_buffer(path, schedule, spreadsheet)
+        elif spreadsheet is None:
+            return misc.SpreadsheetBuffer()
         else:
-            return misc.Spreadsheet()
+            return spreadsheet
 
     def print_item(self):
         print('    Abstract Item')
@@ -710,6 +996,13 @@ class MeasurementItemAbstract(MeasurementItem):
             return self.int_mitem.get_total()
         else:
             return []
+            
+    def get_version(self):
+        """Return version of abstracted records"""
+        if self.int_mitem is not None:
+            return self.int_mitem.get_version()
+        else:
+            return None
 
     def get_text(self):
         if self.int_mitem is not None:
@@ -725,9 +1018,14 @@ class MeasurementItemAbstract(MeasurementItem):
 
 class Completion:
     """Class storing Completion date"""
+    
+    id = None  # Unique id, assigned by data model
+    
     def __init__(self, model=None):
         if model is not None:
             self.date = model[0]
+            if len(model) > 1:
+                self.id = model[1]
         else:
             self.date = ''
         MeasurementItem.__init__(self)
@@ -740,7 +1038,7 @@ class Completion:
         
     def get_model(self, clean=False):
         """Get data model"""
-        return ['Completion',[self.date]]
+        return ['Completion', add_model_id([self.date], self.id, clean)]
     
     def set_model(self, model):
         """Set data model"""
@@ -756,8 +1054,13 @@ class Completion:
         latex_buffer.replace_and_clean(measgroup_local_vars)
         return latex_buffer
         
-    def get_spreadsheet_buffer(self, path, schedule):
-        spreadsheet = misc.Spreadsheet()
+    def get_latex_parts(self, path, schedule):
+        """Yield latex code of completion as LatexFile parts"""
+        yield self.get_latex_buffer(path, schedule)
+        
+    def get_spreadsheet_buffer(self, path, schedule, spreadsheet=None):
+        if spreadsheet is None:
+            spreadsheet = misc.SpreadsheetBuffer()
         spreadsheet.append_data([[None], [str(path), 'DATE OF COMPLETION', self.date], [None]], bold=True, wrap_text=False)
         return spreadsheet
 
@@ -62,31 +62,34 @@ class ScheduleItemGeneric:
 class ScheduleItem(ScheduleItemGeneric):
     """Class stores a row in the schedule of rates"""
     
+    # Incremented on every edit of itemno of an item, invalidating indexes of schedules
+    itemno_version = 0
+    
     def __init__(self, itemno='', description='', unit='', rate='0', qty='0', reference='', excess_rate_percent='100', percentage='True'):
         self.itemno = itemno
         self.description = description
         self.unit = unit
         try:
-            self.rate = round(eval(rate), 2)
+            self.rate = round(misc.evaluate_expression(rate), 2)
         except:
             log.warning('ScheduleItem - Wrong value loaded in model - rate - ' + rate)
             rate = '0'
             self.rate = 0
         try:
-            self.qty = eval(qty)
+            self.qty = misc.evaluate_expression(qty)
         except:
             log.warning('ScheduleItem - Wrong value loaded in model - qty - ' + qty)
             qty = '0'
             self.qty = 0
         self.reference = reference
         try:
-            self.excess_rate_percent = eval(excess_rate_percent)
+            self.excess_rate_percent = misc.evaluate_expression(excess_rate_percent)
         except:
             log.warning('ScheduleItem - Wrong value loaded in model - excess_rate_percent - ' + excess_rate_percent)
             excess_rate_percent = '100'
             self.excess_rate_percent = 100
         try:
-            self.percentage = eval(percentage)
+            self.percentage = misc.evaluate_expression(percentage)
         except:
             log.warning('ScheduleItem - Wrong value loaded in model - percentage - ' + percentage)
             percentage = 'True'
@@ -103,20 +106,21 @@ class ScheduleItem(ScheduleItemGeneric):
         
         if index == 0:
             self.itemno = value
+            ScheduleItem.itemno_version += 1
         elif index == 1:
             self.description = value
         elif index == 2:
             self.unit = value
         elif index == 3:
             try:
-                self.rate = round(float(eval(value)), 2)
+                self.rate = round(float(misc.evaluate_expression(value)), 2)
             except:
                 log.warning('ScheduleItem - Wrong value loaded in model - rate - ' + value)
                 self.rate = 0
                 value = '0'
         elif index == 4:
             try:
-                self.qty = float(eval(value))
+                self.qty = float(misc.evaluate_expression(value))
             except:
                 log.warning('ScheduleItem - Wrong value loaded in model - qty - ' + value)
                 self.qty = 0
@@ -125,14 +129,14 @@ class ScheduleItem(ScheduleItemGeneric):
             self.reference = value
         elif index == 6:
             try:
-                self.excess_rate_percent = float(eval(value))
+                self.excess_rate_percent = float(misc.evaluate_expression(value))
             except:
                 log.warning('ScheduleItem - Wrong value loaded in model - excess_rate_percent - ' + value)
                 self.excess_rate_percent = 100
                 value = '100'
         elif index == 7:
             try:
-                self.percentage = bool(eval(value))
+                self.percentage = bool(misc.evaluate_expression(value))
             except:
                 log.warning('ScheduleItem - Wrong value loaded in model - percentage - ' + value)
                 self.percentage = True
@@ -200,10 +204,56 @@ class Schedule(ScheduleGeneric):
     """Class stores the schedule of rates for work"""
     
     def __init__(self, items=None):
+        self.itemno_index = dict()  # itemno -> ScheduleItem lookup for string indexing
+        self.index_version = None  # ScheduleItem.itemno_version at last rebuild of index
         #Initialise base class
         super(Schedule,self).__init__(items)
         self.update_values()
         
+    def update_index(self):
+        """Rebuild itemno index from schedule items
+        
+            First occurence of an itemno is indexed, same as a linear search.
+        """
+        self.itemno_index = dict()
+        self.index_version = ScheduleItem.itemno_version
+        for item in self.items:
+            if item.itemno not in self.itemno_index:
+                self.itemno_index[item.itemno] = item
+                
+    def get_item_by_itemno(self, itemno):
+        """Return item corresponding to itemno using index
+        
+            Items may be edited in place (ex. ScheduleView cell edits), so the
+            index is rebuilt if an itemno was edited since it was built.
+        """
+        if self.index_version != ScheduleItem.itemno_version:
+            self.update_index()
+        return self.itemno_index.get(itemno)
+        
+    def append_item(self, item):
+        """Append item at end of schedule"""
+        self.items.append(item)
+        if item.itemno not in self.itemno_index:
+            self.itemno_index[item.itemno] = item
+            
+    def set_item_at_index(self, index, item):
+        self.items[index] = item
+        self.update_index()
+
+    def insert_item_at_index(self, index, item):
+        # List insertion is linear anyway, so rebuild to keep first occurences
+        self.items.insert(index, item)
+        self.update_index()
+
+    def remove_item_at_index(self, index):
+        del (self.items[index])
+        self.update_index()
+        
+    def clear(self):
+        del self.items[:]
+        self.itemno_index = dict()
+        
     def update_values(self):
         """Populate ScheduleItem.extended_description (Used for final billing)"""
         iter = 0
@@ -238,15 +288,18 @@ class Schedule(ScheduleGeneric):
             else:
                 item.extended_description_limited = item.extended_description
             iter += 1
+        # Refresh index since items might have been edited in place
+        self.update_index()
             
     def __setitem__(self, index, value):
         if isinstance(index, int):
             self.items[index] = value
+            self.update_index()
         elif isinstance(index, str):
-            for item in self.items:
-                if item.itemno == index:
-                    self.items[index] = value
-                    break
+            item = self.get_item_by_itemno(index)
+            if item is not None:
+                self.items[self.items.index(item)] = value
+                self.update_index()
             else:
                 log.warning("Schedule - Itemno not found while assigning value")
 
@@ -254,10 +307,7 @@ class Schedule(ScheduleGeneric):
         if isinstance(index, int):
             return self.items[index]
         elif isinstance(index, str):
-            for item in self.items:
-                if item.itemno == index:
-                    return item
-            return None
+            return self.get_item_by_itemno(index)
     
     def set_model(self,items):
         """Set data model"""
@@ -273,4 +323,3 @@ class Schedule(ScheduleGeneric):
             if item.itemno != '' and item.qty != 0:
                 itemnos.append(item.itemno)
         return itemnos
-
@@ -22,9 +22,16 @@
 #  
 #  
 
-import subprocess, threading, os, sys, posixpath, platform, logging, importlib.util
+import subprocess, threading, os, sys, posixpath, platform, logging, importlib.util, json, hashlib, re, ast, operator, time, zipfile, queue, shutil
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 
-from gi.repository import Gtk, Gdk, GLib, Pango
+try:
+    import gi
+    gi.require_version('Gtk', '3.0')
+    from gi.repository import Gtk, Gdk, GLib, Pango
+except (ImportError, ValueError):
+    # Allow project files to be loaded and rendered without display, as by batch
+    Gtk = Gdk = GLib = Pango = None
 from urllib.parse import urlparse
 from urllib.request import url2pathname
 import openpyxl
@@ -64,11 +71,19 @@ MEAS_COLOR_NORMAL = '#FFFFFF'
 MEAS_COLOR_SELECTED = '#729FCF'
 # Timeout for killing Latex subprocess
 LATEX_TIMEOUT = 300 # 5 minutes
+# Maximum number of Latex subprocesses run in parallel
+LATEX_MAX_JOBS = os.cpu_count() or 1
+# File for storing inputs of latex runs in output folder
+LATEX_RENDER_CACHE = 'cmbautomiser_render_cache.json'
 # Item description wrap-width for screen purpose
 CMB_DESCRIPTION_WIDTH = 60
 CMB_DESCRIPTION_MAX_LENGTH = 1000
 # Deviation statement
 DEV_LIMIT_STATEMENT = 10
+# Maximum number of evaluated expressions cached
+EXPRESSION_CACHE_SIZE = 100000
+# Maximum number of latex parts queued for writing
+LATEX_WRITE_QUEUE_SIZE = 64
              
 def is_unit_item(unit):
     # List of units which will be considered as integer values
@@ -89,8 +104,28 @@ def is_unit_item(unit):
         return False
         
 # String used for checking file version
-PROJECT_FILE_VER = 'CMBAUTOMISER_FILE_REFERENCE_VER_3.1'
-PROJECT_FILE_VERS_COMPATIBLE = ['CMBAUTOMISER_FILE_REFERENCE_VER_3', PROJECT_FILE_VER]
+PROJECT_FILE_VER = 'CMBAUTOMISER_FILE_REFERENCE_VER_4'
+# Versions before 4 refer to items by path and are migrated on loading
+PROJECT_FILE_VERS_COMPATIBLE = ['CMBAUTOMISER_FILE_REFERENCE_VER_3', 'CMBAUTOMISER_FILE_REFERENCE_VER_3.1',
+                                PROJECT_FILE_VER]
+# Size of chunks read by ProjectReader
+PROJECT_READ_CHUNK = 1 << 20
+# Time in seconds spent loading project per idle callback
+PROJECT_LOAD_STEP_TIME = 0.1
+# Minimum time in seconds between checks for modified template plugins
+PLUGIN_CHECK_INTERVAL = 2
+# Extension of project archive files
+PROJECT_ARCHIVE_EXT = '.cmbz'
+# Size in bytes of stale entries retained in project archive without rewriting
+PROJECT_ARCHIVE_MIN_STALE = 1 << 20
+# Maximum number of saves listed by indexes in project archive without rewriting
+PROJECT_ARCHIVE_MAX_INDEXES = 50
+# Seconds after a change before an autosave journal is written
+AUTOSAVE_DELAY = 30
+# Number of rotating autosave journals kept for each project
+AUTOSAVE_JOURNALS = 3
+# Memory in bytes held by undo history before oldest actions are dropped
+UNDO_MEMORY_LIMIT = 256 << 20
 # Item codes for project global variables
 global_vars = ['$cmbnameofwork$',
                '$cmbagency$',
@@ -455,14 +490,39 @@ class SpreadsheetDialog:
 
             
 class Spreadsheet:
-    """Manage input and output of spreadsheets"""
+    """Manage input and output of spreadsheets
     
-    def __init__(self, filename=None):
+        Spreadsheets created with write_only set stream rows to a write
+        only worksheet for export, using write_rows and write_row only.
+        Column widths have to be set before adding rows.
+    """
+    
+    # Font and alignment of cells keyed by (bold, wrap_text, horizontal)
+    styles = dict()
+    
+    def __init__(self, filename=None, write_only=False):
         if filename is not None:
             self.spreadsheet = openpyxl.load_workbook(filename)
+            self.sheet = self.spreadsheet.active
+        elif write_only:
+            self.spreadsheet = openpyxl.Workbook(write_only=True)
+            self.sheet = self.spreadsheet.create_sheet()
+            self.rowcount = 0
+            self.cell_styles = dict()
         else:
             self.spreadsheet = openpyxl.Workbook()
-        self.sheet = self.spreadsheet.active
+            self.sheet = self.spreadsheet.active
+            
+    @classmethod
+    def get_style(cls, bold=False, wrap_text=True, horizontal='general'):
+        """Return shared font and alignment of cells with style"""
+        key = (bold, wrap_text, horizontal)
+        style = cls.styles.get(key)
+        if style is None:
+            style = (openpyxl.styles.Font(bold=bold),
+                     openpyxl.styles.Alignment(wrap_text=wrap_text, horizontal=horizontal))
+            cls.styles[key] = style
+        return style
     
     def save(self, filename):
         """Save worksheet to file"""
@@ -473,6 +533,7 @@ class Spreadsheet:
     def new_sheet(self):
         """Create a new sheet to spreadsheet and set as active"""
         self.sheet = self.spreadsheet.create_sheet()  
+        self.rowcount = 0
             
     def sheets(self):
         """Returns a list of sheetnames"""
@@ -508,8 +569,7 @@ class Spreadsheet:
     
     def set_style(self, row, col, bold=False, wrap_text=True, horizontal='general'):
         """Set style of individual cell"""
-        font = openpyxl.styles.Font(bold=bold)
-        alignment = openpyxl.styles.Alignment(wrap_text=wrap_text, horizontal=horizontal)
+        font, alignment = self.get_style(bold, wrap_text, horizontal)
         self.sheet.cell(row=row, column=col).font = font
         self.sheet.cell(row=row, column=col).alignment = alignment
         
@@ -532,8 +592,7 @@ class Spreadsheet:
     def insert_data(self, data, start_row=1, start_col=1, bold=False, wrap_text=True, horizontal='general'):
         """Insert data to current sheet"""
         # Setup styles
-        font = openpyxl.styles.Font(bold=bold)
-        alignment = openpyxl.styles.Alignment(wrap_text=wrap_text, horizontal=horizontal)
+        font, alignment = self.get_style(bold, wrap_text, horizontal)
         # Apply data and styles
         for row_no, row in enumerate(data, start_row):
             for col_no, value in enumerate(row, start_col):
@@ -550,6 +609,49 @@ class Spreadsheet:
         self.sheet.merge_cells(start_row=rowstart,start_column=1,end_row=rowstart,end_column=width)
         self.__setitem__([rowstart,1], value)
         self.set_style(rowstart, 1, bold, wrap_text, horizontal)
+        
+    def write_rows(self, rows, merged_cells=None):
+        """Stream rows to write only sheet below last row
+        
+            Arguments:
+                rows: List of [values, style] as in write_row
+                merged_cells: List of (row, width) of merged cells, rows
+                              numbered from first row written
+        """
+        if merged_cells:
+            for row, width in merged_cells:
+                self.sheet.merged_cells.add(openpyxl.worksheet.cell_range.CellRange(
+                    min_col=1, min_row=row+self.rowcount, max_col=width, max_row=row+self.rowcount))
+        for values, style in rows:
+            self.write_row(values, style)
+        
+    def write_row(self, values, style=None):
+        """Stream row to write only sheet
+        
+            Arguments:
+                values: List of cell values
+                style: Style of cells with values as (bold, wrap_text, horizontal)
+        """
+        if style is None:
+            self.sheet.append(values)
+        else:
+            # Style indices in workbook are looked up once for each style
+            style_array = self.cell_styles.get(style)
+            if style_array is None:
+                cell = openpyxl.cell.WriteOnlyCell(self.sheet)
+                cell.font, cell.alignment = self.get_style(*style)
+                style_array = cell._style
+                self.cell_styles[style] = style_array
+            row = []
+            for value in values:
+                if value is None:
+                    row.append(None)
+                else:
+                    cell = openpyxl.cell.WriteOnlyCell(self.sheet, value)
+                    cell._style = openpyxl.styles.cell_style.StyleArray(style_array)
+                    row.append(cell)
+            self.sheet.append(row)
+        self.rowcount += 1
     
     def __setitem__(self, index, value):
         """Set an individual cell"""
@@ -591,7 +693,7 @@ class Spreadsheet:
                                     formula = cell[1:]
                                 else:
                                     formula = cell
-                                evaluated = str(float(eval(formula)))
+                                evaluated = str(float(evaluate_expression(formula)))
                                 cell_formated = formula
                             else:
                                 cell_formated = str(float(cell))
@@ -607,7 +709,7 @@ class Spreadsheet:
                                     formula = cell[1:]
                                 else:
                                     formula = cell
-                                evaluated = str(int(eval(formula)))
+                                evaluated = str(int(evaluate_expression(formula)))
                                 cell_formated = formula
                             else:
                                 cell_formated = str(int(cell))
@@ -623,63 +725,359 @@ class Spreadsheet:
         return items
 
 
+class SpreadsheetBuffer:
+    """Rows of a spreadsheet held in memory till saved
+    
+        Rows are held as [values, style] with the style of cells with
+        values as (bold, wrap_text, horizontal), and are written to a write
+        only Spreadsheet in one pass on saving. Rows can only be added below
+        the last row.
+    """
+    
+    def __init__(self):
+        self.rows = []
+        self.merged_cells = []
+        self.title = None
+        self.column_widths = []
+        
+    def save(self, filename):
+        """Write rows to spreadsheet file"""
+        spreadsheet = Spreadsheet(write_only=True)
+        if self.title is not None:
+            spreadsheet.set_title(self.title)
+        spreadsheet.set_column_widths(self.column_widths)
+        spreadsheet.write_rows(self.rows, self.merged_cells)
+        spreadsheet.save(filename)
+        
+    def length(self):
+        """Get number of rows in sheet, an empty sheet having a blank row"""
+        return max(len(self.rows), 1)
+        
+    def set_title(self, title):
+        """Set title of sheet"""
+        self.title = title
+        
+    def set_column_widths(self, widths):
+        """Set column widths of sheet"""
+        self.column_widths = widths
+        
+    # Data addition functions
+        
+    def append(self, ss_obj):
+        """Append rows of a SpreadsheetBuffer"""
+        rowcount = self.length()
+        self.pad_rows(rowcount)
+        self.rows += ss_obj.rows
+        self.merged_cells += [(row+rowcount, width) for row, width in ss_obj.merged_cells]
+        
+    def append_data(self, data, bold=False, wrap_text=True, horizontal='general'):
+        """Append data to sheet"""
+        self.insert_data(data, self.length()+1, 1, bold, wrap_text, horizontal)
+        
+    def insert_data(self, data, start_row=1, start_col=1, bold=False, wrap_text=True, horizontal='general'):
+        """Insert data to sheet below last row"""
+        if start_row <= len(self.rows):
+            raise ValueError('Rows can only be added below last row of spreadsheet buffer')
+        self.pad_rows(start_row-1)
+        style = (bold, wrap_text, horizontal)
+        for row in data:
+            self.rows.append([[None]*(start_col-1) + list(row), style])
+        
+    def add_merged_cell(self, value, row=None, width=2, bold=False, wrap_text=True, horizontal='general'):
+        """Add a merged cell of prescrbed width"""
+        if row is None:
+            rowstart = self.length() + 1
+        else:
+            rowstart = row
+        self.insert_data([[value]], rowstart, 1, bold, wrap_text, horizontal)
+        self.merged_cells.append((rowstart, width))
+        
+    def pad_rows(self, rowcount):
+        """Add blank rows till sheet has rowcount rows"""
+        for row_no in range(len(self.rows), rowcount):
+            self.rows.append([[], None])
+
+
 class LatexFile:
-    """Class for formating and rendering of latex code"""
+    """Class for formating and rendering of latex code
     
-    def __init__(self, latex_buffer = ""):
-        self.latex_buffer = latex_buffer
+        Latex code is held as a list of pieces, with nested lists for code
+        added, and the positions of $placeholder$ slots in pieces indexed
+        by placeholder. Replacements are made at the slots of the keys
+        replaced without scanning the buffer. Template files and static
+        templates of plugins are parsed once and cached.
+    """
     
+    # Placeholders indexed for replacement
+    slot_pattern = re.compile(r'\$[A-Za-z0-9_]+\$')
+    # Latex commands for special charachters
+    clean_table = str.maketrans({'\\': '\\textbackslash ', '#': '\\# ', '$': '\\$ ', '%': '\\% ',
+                                 '^': '\\textasciicircum ', '&': '\\& ', '_': '\\_ ', '{': '\\{ ',
+                                 '}': '\\} ', '~': '\\textasciitilde ', '\n': '\\newline '})
+    # Text and parsed static templates keyed by source
+    templates = dict()
+    # Parsed template and modification time of template files keyed by filename
+    template_files = dict()
+    
+    def __init__(self, latex_buffer = ""):
+        """Initialise from latex text"""
+        self.set_template(self.parse(latex_buffer))
+        
     # Inbuilt methods
-
+    
+    @classmethod
+    def parse(cls, text):
+        """Parse text into [pieces, positions of slots for each placeholder]"""
+        pieces = []
+        positions = dict()
+        start = 0
+        for match in cls.slot_pattern.finditer(text):
+            if match.start() > start:
+                pieces.append(text[start:match.start()])
+            positions.setdefault(match.group(), []).append(len(pieces))
+            pieces.append(match.group())
+            start = match.end()
+        if start < len(text):
+            pieces.append(text[start:])
+        return [tuple(pieces), positions]
+        
+    @classmethod
+    def from_text(cls, text):
+        """Return LatexFile of text"""
+        return cls(text)
+        
+    @classmethod
+    def from_template(cls, source, text):
+        """Return LatexFile of static template text, parsed once for source
+        
+            Arguments:
+                source: Key identifying origin of template, like plugin and attribute name
+                text: Template text, parsed again only if a different object is passed
+        """
+        cached = cls.templates.get(source)
+        if cached is None or cached[0] is not text:
+            cached = [text, cls.parse(text)]
+            cls.templates[source] = cached
+        latex_file = cls.__new__(cls)
+        latex_file.set_template(cached[1])
+        return latex_file
+        
+    @classmethod
+    def from_file(cls, filename):
+        """Return LatexFile of template file, read again only if modified"""
+        mtime = os.stat(filename).st_mtime
+        cached = cls.template_files.get(filename)
+        if cached is None or cached[1] != mtime:
+            with open(filename, 'r', encoding="utf8") as latex_file:
+                cached = [cls.parse(latex_file.read()), mtime]
+            cls.template_files[filename] = cached
+        latex_file = cls.__new__(cls)
+        latex_file.set_template(cached[0])
+        return latex_file
+        
+    def set_template(self, template):
+        """Set pieces and slots from parsed template"""
+        self.pieces = list(template[0])
+        self.slots = {key: [(self.pieces, index) for index in indices] for key, indices in template[1].items()}
+        
     def clean_latex(self, text):
-        """Replace special charchters with latex commands"""
-        for splchar, replspelchar in zip(['\\', '#', '$', '%', '^', '&', '_', '{', '}', '~', '\n'],
-                                         ['\\textbackslash ', '\# ', '\$ ', '\% ', '\\textasciicircum ', '\& ', '\_ ',
-                                          '\{ ', '\} ', '\\textasciitilde ', '\\newline ']):
-            text = text.replace(splchar, replspelchar)
-        return text
+        """Replace special charachters with latex commands"""
+        return text.translate(self.clean_table)
+        
+    def substitute(self, key, value):
+        """Replace slots of key with text or LatexFile"""
+        refs = self.slots.pop(key, None)
+        if refs is None:
+            if not self.slot_pattern.fullmatch(key):
+                # Keys other than placeholders are replaced in text
+                text = value.get_buffer() if isinstance(value, LatexFile) else value
+                self.set_template(self.parse(self.get_buffer().replace(key, text)))
+            return
+        for pieces, index in refs:
+            if isinstance(value, LatexFile):
+                # Copied since slots of value refer to its own pieces
+                fragment = value.copy()
+                pieces[index] = fragment.pieces
+                self.add_slots(fragment)
+            else:
+                pieces[index] = value
+                
+    def add_slots(self, other):
+        """Add slots of LatexFile whose pieces are added"""
+        for key, refs in other.slots.items():
+            if key in self.slots:
+                self.slots[key].extend(refs)
+            else:
+                self.slots[key] = list(refs)
         
     # Operator overloading
     
     def __add__(self,other):
-        return LatexFile(self.latex_buffer + '\n' + other.latex_buffer)
+        latex_file = self.copy()
+        latex_file += other
+        return latex_file
+        
+    def __iadd__(self, other):
+        """Append copy of LatexFile"""
+        other = other.copy()
+        self.pieces.append('\n')
+        self.pieces.append(other.pieces)
+        self.add_slots(other)
+        return self
         
     # Public members
     
+    @property
+    def latex_buffer(self):
+        return self.get_buffer()
+        
+    @latex_buffer.setter
+    def latex_buffer(self, text):
+        self.set_template(self.parse(text))
+    
+    def copy(self):
+        """Return copy of LatexFile, with nested pieces and slots copied"""
+        copies = dict()  # Copies of lists of pieces keyed by id of original
+        
+        def copy_pieces(pieces):
+            copied = [copy_pieces(piece) if type(piece) is list else piece for piece in pieces]
+            copies[id(pieces)] = copied
+            return copied
+            
+        latex_file = LatexFile.__new__(LatexFile)
+        latex_file.pieces = copy_pieces(self.pieces)
+        latex_file.slots = {key: [(copies[id(pieces)], index) for pieces, index in refs]
+                            for key, refs in self.slots.items()}
+        return latex_file
+    
+    def get_pieces(self):
+        """Yield strings making up latex code in order"""
+        iterators = [iter(self.pieces)]
+        while iterators:
+            for piece in iterators[-1]:
+                if isinstance(piece, list):
+                    iterators.append(iter(piece))
+                    break
+                yield piece
+            else:
+                iterators.pop()
+    
     def get_buffer(self):
         """Get underlying latex buffer"""
-        return self.latex_buffer
+        return ''.join(self.get_pieces())
             
     def add_preffix_from_file(self,filename):
         """Add a latex file as preffix"""
-        latex_file = open(filename,'r', encoding="utf8")
-        self.latex_buffer = latex_file.read() + '\n' + self.latex_buffer
-        latex_file.close()
+        latex_file = LatexFile.from_file(filename)
+        latex_file.pieces.append('\n')
+        latex_file.pieces.append(self.pieces)
+        latex_file.add_slots(self)
+        self.pieces = latex_file.pieces
+        self.slots = latex_file.slots
         
     def add_suffix_from_file(self,filename):
         """Add a latex file as suffix"""
-        latex_file = open(filename,'r', encoding="utf8")
-        self.latex_buffer = self.latex_buffer + '\n' + latex_file.read()
-        latex_file.close()
+        self += LatexFile.from_file(filename)
         
     def replace_and_clean(self, dic):
         """Replace items as per dictionary after cleaning special charachters"""
         for i, j in dic.items():
-            j = self.clean_latex(j)
-            self.latex_buffer = self.latex_buffer.replace(i, j)
+            self.substitute(i, self.clean_latex(j))
 
     def replace(self, dic):
-        """Replace items as per dictionary"""
+        """Replace items as per dictionary, values being text or LatexFile
+        
+            Placeholders in values are replaced by later replacements.
+        """
         for i, j in dic.items():
-            self.latex_buffer = self.latex_buffer.replace(i, j)
+            if isinstance(j, LatexFile) or not self.slot_pattern.search(j):
+                self.substitute(i, j)
+            else:
+                self.substitute(i, LatexFile.from_text(j))
             
     def write(self, filename):
         """Write latex file to disk"""
         file_latex = open(filename,'w', encoding="utf8")
-        file_latex.write(self.latex_buffer)
+        file_latex.writelines(self.get_pieces())
         file_latex.close()
         
         
+class LatexWriter:
+    """Class for writing latex code to a file while it is being generated
+    
+        Parts of a document are passed in order as they are generated.
+        Replacements for the whole document are made on each part and the
+        parts are queued to be written by a worker thread. The queue is
+        bounded, so only a few parts are held in memory at a time.
+    """
+    
+    def __init__(self, sink, replacements=None, queue_size=LATEX_WRITE_QUEUE_SIZE):
+        """Initialise LatexWriter
+        
+            Arguments:
+                sink: Filename, or open text file or io.TextIOBase to write to
+                replacements: List of (dictionary, clean) pairs of replacements made on
+                              each part in order, cleaning special charachters if clean
+                queue_size: Maximum number of parts queued for writing
+        """
+        if isinstance(sink, str):
+            self.file = open(sink, 'w', encoding="utf8")
+            self.close_file = True
+        else:
+            self.file = sink
+            self.close_file = False
+        self.replacements = replacements if replacements else []
+        self.separator = ''
+        self.error = None
+        self.queue = queue.Queue(queue_size)
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+        
+    def __enter__(self):
+        return self
+        
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        
+    def run(self):
+        """Worker thread loop writing queued parts"""
+        while True:
+            chunk = self.queue.get()
+            if chunk is None:
+                break
+            if self.error is None:
+                try:
+                    self.file.write(chunk)
+                except Exception as e:
+                    log.error('LatexWriter - run - Error writing latex - ' + str(e))
+                    self.error = e
+        
+    def write(self, latex_file):
+        """Make replacements on LatexFile and queue it for writing
+        
+            Parts are separated by newlines as when added to a LatexFile.
+        """
+        for dic, clean in self.replacements:
+            if clean:
+                latex_file.replace_and_clean(dic)
+            else:
+                latex_file.replace(dic)
+        self.queue.put(self.separator + latex_file.get_buffer())
+        self.separator = '\n'
+        
+    def close(self):
+        """Wait for queued parts to be written and close file
+        
+            Raises exception raised while writing if any.
+        """
+        self.queue.put(None)
+        self.thread.join()
+        if self.close_file:
+            self.file.close()
+        if self.error is not None:
+            raise self.error
+        
+        
 class ProgressWindow:
     """Class for handling display of long running proccess"""
     
@@ -783,24 +1181,541 @@ class Command(object):
     def run(self, timeout):
         """Run set command with selected timeout"""
         def target():
-            if platform.system() == 'Linux':
-                self.process = subprocess.Popen(self.cmd)
-            elif platform.system() == 'Windows':
-                startupinfo = subprocess.STARTUPINFO()
-                startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW
-                self.process = subprocess.Popen(self.cmd, startupinfo=startupinfo)
+            try:
+                if platform.system() == 'Linux':
+                    self.process = subprocess.Popen(self.cmd)
+                elif platform.system() == 'Windows':
+                    startupinfo = subprocess.STARTUPINFO()
+                    startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW
+                    self.process = subprocess.Popen(self.cmd, startupinfo=startupinfo)
+            except OSError as e:
+                log.error('Sub-process could not be spawned - ' + str(self.cmd[0]) + ' - ' + str(e))
+                return
             log.info('Sub-process spawned - ' + str(self.process.pid))
             self.process.communicate()
+        self.process = None
         thread = threading.Thread(target=target)
         thread.start()
 
         thread.join(timeout)
+        if self.process is None:
+            return -1
         if thread.is_alive():
             log.error('Terminating sub-process exceeding timeout - ' + str(self.process.pid))
             self.process.terminate()
             thread.join()
             return -1
         return 0
+        
+        
+class ProjectReader:
+    """Class for reading a project file one value at a time
+    
+        Arrays are entered with begin_array() and their elements read with
+        next_value() or iter_array(), so that only the element being decoded
+        is held in memory.
+    """
+    
+    def __init__(self, fileobj, chunk_size=PROJECT_READ_CHUNK):
+        self.fileobj = fileobj
+        self.chunk_size = chunk_size
+        self.decoder = json.JSONDecoder()
+        self.buffer = ''
+        self.pos = 0
+        self.consumed = 0  # Characters discarded from buffer
+        self.eof = False
+        self.arrays = []  # First element flags of open arrays
+        try:
+            self.size = os.fstat(fileobj.fileno()).st_size
+        except (AttributeError, OSError, ValueError):
+            self.size = 0
+        
+    def fill(self, size=None):
+        """Read next chunk of file into buffer, returns False at end of file"""
+        if self.eof:
+            return False
+        # Discard consumed data
+        if self.pos:
+            self.consumed += self.pos
+            self.buffer = self.buffer[self.pos:]
+            self.pos = 0
+        chunk = self.fileobj.read(size if size else self.chunk_size)
+        if chunk:
+            self.buffer += chunk
+            return True
+        else:
+            self.eof = True
+            return False
+        
+    def peek(self):
+        """Return next non whitespace character, empty string at end of file"""
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in ' \t\n\r':
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            elif not self.fill():
+                return ''
+                
+    def expect(self, char):
+        """Consume expected character"""
+        if self.peek() != char:
+            raise ValueError('ProjectReader - expected ' + char + ' at position ' + str(self.tell()))
+        self.pos += 1
+    
+    def read_value(self):
+        """Decode and return next value"""
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+                # A number at end of buffer may be incomplete
+                if end < len(self.buffer) or self.eof:
+                    self.pos = end
+                    return value
+            except ValueError:
+                if self.eof:
+                    raise
+            # Value incomplete, read atleast as much as already buffered
+            self.fill(max(self.chunk_size, len(self.buffer)))
+        
+    def begin_array(self):
+        """Enter array"""
+        self.expect('[')
+        self.arrays.append(True)
+        
+    def has_next(self):
+        """Return True if the current array has another element, else leave the array"""
+        if self.peek() == ']':
+            self.pos += 1
+            self.arrays.pop()
+            return False
+        if self.arrays[-1]:
+            self.arrays[-1] = False
+        else:
+            self.expect(',')
+        return True
+        
+    def next_value(self):
+        """Decode next element of current array"""
+        if not self.has_next():
+            raise ValueError('ProjectReader - unexpected end of array at position ' + str(self.tell()))
+        return self.read_value()
+        
+    def next_array(self):
+        """Enter array that is the next element of current array"""
+        if not self.has_next():
+            raise ValueError('ProjectReader - unexpected end of array at position ' + str(self.tell()))
+        self.begin_array()
+        
+    def end_array(self):
+        """Skip remaining elements of current array"""
+        while self.has_next():
+            self.read_value()
+        
+    def iter_array(self):
+        """Iterate over elements of array that is the next element of current array"""
+        self.next_array()
+        while self.has_next():
+            yield self.read_value()
+            
+    def tell(self):
+        """Return position in file"""
+        return self.consumed + self.pos
+        
+    def fraction(self):
+        """Return fraction of file read"""
+        if self.size:
+            return min(self.tell()/self.size, 1)
+        else:
+            return 0
+
+
+class ProjectPart:
+    """Schedule, CMB or bill of project serialised to JSON
+    
+        Parts are immutable snapshots, taken on the main thread and written
+        by ProjectSaver on its worker thread.
+    """
+    
+    def __init__(self, model):
+        self.content = json.dumps(model)
+        self.digest = None
+        
+    def get_digest(self):
+        """Return hash of contents, used as name of entry in ProjectArchive"""
+        if self.digest is None:
+            self.digest = hashlib.sha1(self.content.encode('utf-8')).hexdigest()
+        return self.digest
+        
+        
+def get_project_parts(project):
+    """Return project with schedule, CMBs and bills serialised
+    
+        Arguments:
+            project: [file version, DataModel model, project settings] with
+                     parts as models or ProjectPart objects
+        Returns:
+            Project with parts as ProjectPart objects, parts passed reused
+    """
+    def get_part(model):
+        return model if isinstance(model, ProjectPart) else ProjectPart(model)
+    version, model, settings = project
+    schedule_model, cmb_models, bill_models = model[1]
+    parts = [get_part(schedule_model), [get_part(cmb_model) for cmb_model in cmb_models],
+             [get_part(bill_model) for bill_model in bill_models]]
+    return [version, [model[0], parts], dict(settings)]
+
+
+class ProjectArchive:
+    """Class for reading and writing projects as a zip archive
+    
+        The schedule, each CMB and each bill are stored as separate compressed
+        entries named by the hash of their contents, listed by an index entry
+        holding the file version and project settings. On saving only entries
+        not already in the archive are appended along with a new index, to a
+        copy of the archive which then replaces the archive. Entries and
+        indexes of earlier saves are retained till their size exceeds that of
+        live entries and PROJECT_ARCHIVE_MIN_STALE, or PROJECT_ARCHIVE_MAX_INDEXES
+        indexes are listed, when the archive is rewritten with live entries.
+    """
+    
+    def __init__(self, filename):
+        self.filename = filename
+        self.index = None
+        self.entries_read = 0
+        
+    @staticmethod
+    def is_archive(filename):
+        """Check if file is a project archive"""
+        return zipfile.is_zipfile(filename)
+        
+    def read_index(self):
+        """Read index of latest save and return file version"""
+        with zipfile.ZipFile(self.filename, 'r') as archive:
+            names = [name for name in archive.namelist() if name.startswith('index/')]
+            if not names:
+                raise ValueError('ProjectArchive - index not found - ' + self.filename)
+            latest = max(names, key=lambda name: int(name[6:-5]))
+            self.index = json.loads(archive.read(latest).decode('utf-8'))
+            self.index['name'] = latest
+        self.entries_read = 0
+        return self.index['version']
+        
+    def read_entry(self, name, archive=None):
+        """Read and decode entry"""
+        self.entries_read += 1
+        if archive is None:
+            with zipfile.ZipFile(self.filename, 'r') as archive:
+                return json.loads(archive.read(name).decode('utf-8'))
+        return json.loads(archive.read(name).decode('utf-8'))
+        
+    def read_schedule(self):
+        """Read schedule model"""
+        return self.read_entry(self.index['schedule'])
+        
+    def iter_entries(self, names):
+        """Iterate over decoded entries keeping archive open"""
+        with zipfile.ZipFile(self.filename, 'r') as archive:
+            for name in names:
+                yield self.read_entry(name, archive)
+        
+    def iter_cmbs(self):
+        """Iterate over CMB models"""
+        return self.iter_entries(self.index['cmbs'])
+        
+    def iter_bills(self):
+        """Iterate over bill models"""
+        return self.iter_entries(self.index['bills'])
+        
+    def get_settings(self):
+        """Return project settings"""
+        return self.index['settings']
+        
+    def fraction(self):
+        """Return fraction of entries read"""
+        count = len(self.index['cmbs']) + len(self.index['bills']) + 1
+        return min(self.entries_read/count, 1)
+        
+    def read_project(self):
+        """Read project as [file version, DataModel model, project settings]"""
+        version = self.read_index()
+        model = ['DataModel', [self.read_schedule(), list(self.iter_cmbs()), list(self.iter_bills())]]
+        return [version, model, self.get_settings()]
+        
+    def write_project(self, project):
+        """Save project passed as [file version, DataModel model, project settings]
+        
+            Parts of model may be passed as ProjectPart objects, see get_project_parts.
+        
+            Returns:
+                Number of entries written
+        """
+        version, model, settings = get_project_parts(project)
+        schedule_part, cmb_parts, bill_parts = model[1]
+        
+        # Name parts by hash of contents
+        entries = dict()
+        def add_entry(folder, part):
+            name = folder + '/' + part.get_digest() + '.json'
+            entries[name] = part.content
+            return name
+        index = {'version': version,
+                 'settings': settings,
+                 'schedule': add_entry('schedule', schedule_part),
+                 'cmbs': [add_entry('cmbs', part) for part in cmb_parts],
+                 'bills': [add_entry('bills', part) for part in bill_parts]}
+        
+        # Existing entries
+        existing = dict()
+        generation = 0
+        indexes = 0
+        if os.path.exists(self.filename) and zipfile.is_zipfile(self.filename):
+            with zipfile.ZipFile(self.filename, 'r') as archive:
+                for info in archive.infolist():
+                    existing[info.filename] = info.compress_size
+                    if info.filename.startswith('index/'):
+                        generation = max(generation, int(info.filename[6:-5]) + 1)
+                        indexes += 1
+        live = sum(size for name, size in existing.items() if name in entries)
+        stale = sum(existing.values()) - live
+        
+        # Archive is written to a temporary file replacing the archive, so
+        # that the archive is left intact on failure. Appending in place would
+        # overwrite the central directory of the archive, leaving it unreadable
+        # if interrupted. Copying takes a fraction of the time of serialising.
+        temp_filename = self.filename + '.tmp'
+        if existing and stale <= max(live, PROJECT_ARCHIVE_MIN_STALE) and indexes < PROJECT_ARCHIVE_MAX_INDEXES:
+            # Append changed entries to copy of archive
+            mode = 'a'
+            new_entries = [name for name in entries if name not in existing]
+            shutil.copyfile(self.filename, temp_filename)
+        else:
+            # Write complete archive
+            mode = 'w'
+            new_entries = list(entries)
+            generation = 0
+        with open(temp_filename, 'r+b' if mode == 'a' else 'wb') as fileobj:
+            with zipfile.ZipFile(fileobj, mode, compression=zipfile.ZIP_DEFLATED) as archive:
+                for name in new_entries:
+                    archive.writestr(name, entries[name])
+                archive.writestr('index/' + str(generation) + '.json', json.dumps(index).encode('utf-8'))
+            fileobj.flush()
+            os.fsync(fileobj.fileno())
+        os.replace(temp_filename, self.filename)
+            
+        index['name'] = 'index/' + str(generation) + '.json'
+        self.index = index
+        log.info('ProjectArchive - write_project - ' + str(len(new_entries)) + ' entries written to ' + self.filename)
+        return len(new_entries)
+
+
+def write_project(filename, project):
+    """Write project to file atomically
+    
+        Files with extension PROJECT_ARCHIVE_EXT are written as project
+        archive, others as JSON. JSON files are written a part at a time to a
+        temporary file which then replaces the file.
+    
+        Arguments:
+            filename: Name of project file
+            project: [file version, DataModel model, project settings], with
+                     parts of model as models or ProjectPart objects
+    """
+    if filename.endswith(PROJECT_ARCHIVE_EXT):
+        ProjectArchive(filename).write_project(project)
+        return
+    version, model, settings = get_project_parts(project)
+    schedule_part, cmb_parts, bill_parts = model[1]
+    temp_filename = filename + '.tmp'
+    with open(temp_filename, 'w') as fileobj:
+        fileobj.write('[' + json.dumps(version) + ', [' + json.dumps(model[0]) + ', [')
+        fileobj.write(schedule_part.content + ', [')
+        for count, part in enumerate(cmb_parts):
+            fileobj.write((', ' if count else '') + part.content)
+        fileobj.write('], [')
+        for count, part in enumerate(bill_parts):
+            fileobj.write((', ' if count else '') + part.content)
+        fileobj.write(']]], ' + json.dumps(settings) + ']')
+        fileobj.flush()
+        os.fsync(fileobj.fileno())
+    os.replace(temp_filename, filename)
+    
+
+class ProjectSaver:
+    """Class for writing project files and autosave journals on a worker thread
+    
+        Snapshots of the project are serialised to JSON on the main thread and
+        queued, to be written and compressed by the worker thread. Journals are written
+        AUTOSAVE_DELAY seconds after a change and the last AUTOSAVE_JOURNALS
+        journals of each project are kept, named by the full path of project.
+    """
+    
+    def __init__(self, folder, snapshot_func, journals=AUTOSAVE_JOURNALS, delay=AUTOSAVE_DELAY):
+        """Initialise ProjectSaver
+        
+            Arguments:
+                folder: Folder to store journals
+                snapshot_func: Function returning [project filename or None, project]
+                journals: Number of journals kept for each project
+                delay: Seconds after change before journal is written
+        """
+        self.folder = folder
+        self.snapshot_func = snapshot_func
+        self.journals = journals
+        self.delay = delay
+        self.timeout_id = None
+        self.queue = queue.Queue()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+        
+    def run(self):
+        """Worker thread loop writing queued snapshots"""
+        while True:
+            filename, project, callback, renames = self.queue.get()
+            try:
+                # Rotate existing files
+                for older, newer in renames:
+                    if os.path.exists(older):
+                        os.replace(older, newer)
+                write_project(filename, project)
+                code = (CMB_INFO, 'Project saved to ' + filename)
+            except Exception as e:
+                log.error('ProjectSaver - run - Error writing file - ' + filename + ' - ' + str(e))
+                code = (CMB_ERROR, 'Project could not be saved to ' + filename)
+            finally:
+                self.queue.task_done()
+            if callback is not None:
+                GLib.idle_add(callback, code)
+            
+    def save(self, filename, project, callback=None, renames=None):
+        """Queue project for writing to file
+        
+            Arguments:
+                filename: Name of project file
+                project: [file version, DataModel model, project settings], with
+                         parts of model as models or ProjectPart objects
+                callback: Function called on main loop with status code on completion
+                renames: List of files renamed before writing as (old name, new name)
+        """
+        # Serialise on main thread since models share lists with live objects
+        project = get_project_parts(project)
+        self.queue.put((filename, project, callback, renames if renames else []))
+        
+    def get_journal_name(self, project_filename, number=0):
+        """Return filename of journal of project"""
+        if project_filename:
+            # Distinguish projects with same name in different folders
+            path = os.path.abspath(project_filename)
+            path_hash = hashlib.sha1(path.encode('utf-8')).hexdigest()[:8]
+            name = os.path.splitext(os.path.basename(path))[0] + '.' + path_hash
+        else:
+            name = 'untitled'
+        return os.path.join(self.folder, name + '.autosave.' + str(number) + '.proj')
+        
+    def get_latest_journal(self, project_filename):
+        """Return filename of latest journal of project if newer than project file, else None"""
+        journal = self.get_journal_name(project_filename)
+        if not os.path.exists(journal):
+            return None
+        if project_filename and os.path.exists(project_filename) \
+                and os.path.getmtime(project_filename) >= os.path.getmtime(journal):
+            return None
+        return journal
+        
+    def changed(self):
+        """Schedule writing of journal, to be called on every change of project"""
+        if self.timeout_id is None:
+            self.timeout_id = GLib.timeout_add_seconds(self.delay, self.write_journal)
+            
+    def write_journal(self):
+        """Take snapshot of project and queue it for writing as latest journal"""
+        self.timeout_id = None
+        project_filename, project = self.snapshot_func()
+        if project is None:
+            return False
+        # Rotate journals
+        os.makedirs(self.folder, exist_ok=True)
+        renames = [(self.get_journal_name(project_filename, number-1), self.get_journal_name(project_filename, number))
+                   for number in range(self.journals-1, 0, -1)]
+        self.save(self.get_journal_name(project_filename), project, renames=renames)
+        log.info('ProjectSaver - write_journal - journal queued for ' + str(project_filename))
+        return False
+        
+    def flush(self):
+        """Wait for queued writes to complete"""
+        self.queue.join()
+
+
+class RenderCache:
+    """Stores hashes of inputs of latex runs in output folder
+    
+        A latex file is rendered again only if its contents, its own .aux/.out
+        files or the .aux files of documents refered by \\externaldocument have
+        changed since its last successful run.
+    """
+    
+    def __init__(self, folder):
+        """Initialises class by reading cache file from folder"""
+        self.folder = folder
+        self.filename = posix_path(folder, LATEX_RENDER_CACHE)
+        self.lock = threading.Lock()
+        try:
+            with open(self.filename) as cache_file:
+                self.entries = json.load(cache_file)
+        except (OSError, ValueError):
+            self.entries = dict()
+            
+    def file_hash(self, filename):
+        """Return hash of file contents or None if file does not exist"""
+        try:
+            with open(filename, 'rb') as hash_file:
+                return hashlib.sha1(hash_file.read()).hexdigest()
+        except OSError:
+            return None
+            
+    def get_outputs(self, filename):
+        """Return hashes of cross reference files written by latex run"""
+        name = os.path.splitext(os.path.basename(filename))[0]
+        return [self.file_hash(posix_path(self.folder, name + ext)) for ext in ('.aux', '.out')]
+    
+    def get_inputs(self, filename):
+        """Return hashes of all inputs of latex run"""
+        with open(filename, 'rb') as latex_file:
+            content = latex_file.read()
+        inputs = dict()
+        inputs['tex'] = hashlib.sha1(content).hexdigest()
+        inputs['self'] = self.get_outputs(filename)
+        for doc in get_latex_references(content):
+            doc_name = doc + '.aux'
+            inputs[doc_name] = self.file_hash(posix_path(self.folder, doc_name))
+        return inputs
+        
+    def is_current(self, filename):
+        """Check if inputs of file are unchanged since last run"""
+        name = os.path.basename(filename)
+        pdf_filename = posix_path(self.folder, os.path.splitext(name)[0] + '.pdf')
+        with self.lock:
+            entry = self.entries.get(name)
+        return entry is not None and os.path.exists(pdf_filename) and entry == self.get_inputs(filename)
+            
+    def record(self, filename, success=True):
+        """Record inputs of file after run"""
+        name = os.path.basename(filename)
+        inputs = self.get_inputs(filename) if success else None
+        with self.lock:
+            if inputs is not None:
+                self.entries[name] = inputs
+            elif name in self.entries:
+                del self.entries[name]
+                
+    def save(self):
+        """Write cache file to folder"""
+        try:
+            with self.lock, open(self.filename, 'w') as cache_file:
+                json.dump(self.entries, cache_file)
+        except OSError:
+            log.warning('RenderCache - save - Error writing cache file ' + self.filename)
 
 
 ## GLOBAL METHODS
@@ -903,13 +1818,61 @@ def posix_path(*args):
         else:
             return path
             
+class PluginRegistry:
+    """Class for importing template plugins once and caching their descriptors
+    
+        A plugin is imported again if the modification time of its file
+        changes, checked atmost once every PLUGIN_CHECK_INTERVAL seconds.
+    """
+    
+    def __init__(self, folder):
+        self.folder = folder
+        self.plugins = dict()  # module name -> [mtime, time of check, CustomItem object]
+        self.imports = 0  # Number of plugin imports
+        self.lock = threading.Lock()
+        
+    def import_plugin(self, module_name):
+        """Import plugin module and return CustomItem object"""
+        spec = importlib.util.spec_from_file_location('templates.' + module_name, os.path.join(self.folder, module_name + '.py'))
+        module = importlib.util.module_from_spec(spec)
+        sys.modules['templates.' + module_name] = module
+        spec.loader.exec_module(module)
+        self.imports += 1
+        log.info('PluginRegistry - import_plugin - ' + module_name)
+        return module.CustomItem()
+        
+    def get(self, module_name):
+        """Return cached CustomItem object of plugin, importing if required"""
+        with self.lock:
+            now = time.monotonic()
+            entry = self.plugins.get(module_name)
+            if entry is not None and now - entry[1] < PLUGIN_CHECK_INTERVAL:
+                return entry[2]
+            try:
+                mtime = os.stat(os.path.join(self.folder, module_name + '.py')).st_mtime
+            except OSError:
+                raise ImportError('Plugin not found - ' + module_name)
+            if entry is None or entry[0] != mtime:
+                entry = [mtime, now, self.import_plugin(module_name)]
+                self.plugins[module_name] = entry
+            else:
+                entry[1] = now
+            return entry[2]
+            
+    def clear(self):
+        """Clear cached plugins"""
+        with self.lock:
+            self.plugins.clear()
+
+# Registry of template plugins
+plugin_registry = PluginRegistry(abs_path('templates'))
+
 def load_plugin(module_name):
-    spec = importlib.util.spec_from_file_location('templates.' + module_name, abs_path('templates', module_name + '.py'))
-    module = importlib.util.module_from_spec(spec)
-    sys.modules['templates.' + module_name] = module
-    spec.loader.exec_module(module)
-    custom_object = module.CustomItem()
-    return custom_object
+    """Return CustomItem object of template plugin
+    
+        The object is shared by all items using the plugin and should not be modified.
+    """
+    return plugin_registry.get(module_name)
             
 def open_file(filename):
     if platform.system() == 'Linux':
@@ -932,24 +1895,137 @@ def get_file_path_from_dnd_dropped_uri(uri):
 
     return path
             
-def run_latex(folder, filename): 
-    """Runs latex on file to folder in two passes"""
-    if platform.system() == 'Linux':
-        latex_path = 'lualatex'
-    elif platform.system() == 'Windows':
-        latex_path = abs_path('miketex\\miktex\\bin\\x64\\lualatex.exe')
+def get_latex_path():
+    """Return path of latex executable for platform"""
+    if platform.system() == 'Windows':
+        return abs_path('miketex\\miktex\\bin\\x64\\lualatex.exe')
+    return 'lualatex'
+    
+def run_latex(folder, filename, cache=None): 
+    """Runs latex on file to folder in two passes
+    
+        If a RenderCache object is passed, run is skipped for unchanged inputs
+        and the second pass is run only if cross references changed.
+    """
+    latex_path = get_latex_path()
     if filename is not None:
+        if cache is not None:
+            if cache.is_current(filename):
+                log.info('run_latex - Inputs unchanged, skipping - ' + filename)
+                return CMB_OK
+            outputs = cache.get_outputs(filename)
         latex_exec = Command([latex_path, '-interaction=batchmode', '-output-directory=' + folder, filename])
         # First Pass
         code = latex_exec.run(timeout=LATEX_TIMEOUT)
         if code == 0:
             # Second Pass
-            code = latex_exec.run(timeout=LATEX_TIMEOUT)
+            if cache is None or cache.get_outputs(filename) != outputs:
+                code = latex_exec.run(timeout=LATEX_TIMEOUT)
+            if cache is not None:
+                cache.record(filename, code == 0)
             if code != 0:
                 return CMB_ERROR
         else:
+            if cache is not None:
+                cache.record(filename, False)
             return CMB_ERROR
     return CMB_OK
+    
+def get_latex_references(content):
+    """Return names of documents refered by \\externaldocument in latex code
+    
+        Arguments:
+            content: Latex code as bytes
+    """
+    return [doc.decode('utf-8') for doc in re.findall(rb'\\externaldocument\{([^}]*)\}', content)]
+    
+def get_latex_job_waits(jobs):
+    """Return jobs to be completed before each latex job is started
+    
+        Latex runs read the .aux files of documents refered while writing
+        their own. Jobs refering to each other are hence run in order, with
+        other jobs run in parallel.
+        
+        Arguments:
+            jobs: List of jobs as tuples (filename, message, error_message)
+        Returns:
+            List of sets of indices of earlier jobs refering to or refered by each job
+    """
+    names = []
+    references = []
+    for job in jobs:
+        names.append(os.path.splitext(os.path.basename(job[0]))[0])
+        try:
+            with open(job[0], 'rb') as latex_file:
+                references.append(set(get_latex_references(latex_file.read())))
+        except (OSError, TypeError):
+            references.append(set())
+    waits = []
+    for index, name in enumerate(names):
+        waits.append({prev for prev in range(index)
+                      if names[prev] in references[index] or name in references[prev]})
+    return waits
+    
+def run_latex_jobs(folder, stages, max_jobs=None, progress=None, use_cache=True):
+    """Runs latex on groups of files with independent files in a group run in parallel
+    
+        Arguments:
+            folder: Output folder
+            stages: List of stages run in order. Each stage is a list of jobs as
+                    tuples (filename, message, error_message). Jobs of a stage
+                    refering to each other by \\externaldocument are run in order.
+            max_jobs: Maximum number of latex subprocesses run simultaneously,
+                      defaults to LATEX_MAX_JOBS
+            progress: ProgressWindow object for reporting progress
+            use_cache: Skip files with inputs unchanged using RenderCache
+        Returns:
+            Status code tuple (code, message)
+    """
+    if max_jobs is None:
+        max_jobs = LATEX_MAX_JOBS
+    cache = RenderCache(folder) if use_cache else None
+    
+    def run_job(job):
+        filename, message, error_message = job
+        if progress is not None:
+            progress.add_message(message)
+        code = run_latex(folder, filename, cache)
+        if progress is not None:
+            progress.pulse()
+        return code
+        
+    with ThreadPoolExecutor(max_workers=max(1, max_jobs)) as executor:
+        for stage in stages:
+            # Remove duplicate files in stage since jobs share output files
+            jobs = []
+            filenames = set()
+            for job in stage:
+                if job[0] not in filenames:
+                    filenames.add(job[0])
+                    jobs.append(job)
+            waits = get_latex_job_waits(jobs)
+            pending = list(range(len(jobs)))
+            running = dict()  # Index of job for each future
+            completed = set()
+            while pending or running:
+                # Start jobs with jobs waited for completed
+                for index in [index for index in pending if waits[index] <= completed]:
+                    pending.remove(index)
+                    running[executor.submit(run_job, jobs[index])] = index
+                finished = wait(running, return_when=FIRST_COMPLETED)[0]
+                for future in finished:
+                    index = running.pop(future)
+                    if future.result() == CMB_ERROR:
+                        # Wait for running jobs, jobs not started being dropped
+                        wait(running)
+                        if cache is not None:
+                            cache.save()
+                        log.error('run_latex_jobs - ' + jobs[index][2])
+                        return (CMB_ERROR, jobs[index][2])
+                    completed.add(index)
+    if cache is not None:
+        cache.save()
+    return (CMB_OK, '')
 
 def clean_markup(text):
     """Clear markup text of special characters"""
@@ -957,10 +2033,67 @@ def clean_markup(text):
         text = text.replace(splchar, replspelchar)
     return text
     
+# Operators supported in expressions
+expression_binary_operators = {ast.Add: operator.add,
+                               ast.Sub: operator.sub,
+                               ast.Mult: operator.mul,
+                               ast.Div: operator.truediv,
+                               ast.FloorDiv: operator.floordiv,
+                               ast.Mod: operator.mod,
+                               ast.Pow: operator.pow}
+expression_unary_operators = {ast.UAdd: operator.pos,
+                              ast.USub: operator.neg}
+# Cache of expression values (or errors) keyed by expression string
+expression_cache = dict()
+
+def evaluate_expression_node(node):
+    """Evaluate node of parsed arithmetic expression"""
+    if type(node) is ast.BinOp and type(node.op) in expression_binary_operators:
+        left = evaluate_expression_node(node.left)
+        right = evaluate_expression_node(node.right)
+        # Limit size of powers evaluated
+        if type(node.op) is ast.Pow and abs(right) > 100:
+            raise ValueError('Exponent too large')
+        return expression_binary_operators[type(node.op)](left, right)
+    elif type(node) is ast.UnaryOp and type(node.op) in expression_unary_operators:
+        return expression_unary_operators[type(node.op)](evaluate_expression_node(node.operand))
+    elif type(node).__name__ in ('Constant', 'Num', 'NameConstant'):
+        value = getattr(node, 'value', getattr(node, 'n', None))
+        if type(value) in (int, float, bool):
+            return value
+    raise ValueError('Unsupported element in expression')
+
+def evaluate_expression(text):
+    """Evaluate arithmetic expression in string without use of eval
+    
+        Numbers, True/False, parenthesis and operators + - * / // % ** are
+        supported. Values are cached by string so that each distinct string
+        is parsed only once.
+        
+        Raises:
+            ValueError: If text is not a valid expression
+    """
+    try:
+        value = expression_cache[text]
+    except KeyError:
+        try:
+            value = evaluate_expression_node(ast.parse(text.strip(), mode='eval').body)
+        except (SyntaxError, ValueError, TypeError, ZeroDivisionError, OverflowError, RecursionError, AttributeError):
+            value = None  # Invalid expression
+        if len(expression_cache) >= EXPRESSION_CACHE_SIZE:
+            expression_cache.clear()
+        expression_cache[text] = value
+    except TypeError:
+        value = None
+    # A new exception is raised each time since a raised exception holds its traceback
+    if value is None:
+        raise ValueError('Invalid expression - ' + str(text))
+    return value
+    
 def float_from_str(text):
     """Get formatted float from str with undefined values treated as zero"""
     try:
-        value = float(eval(text))
+        value = float(evaluate_expression(text))
     except:
         value = 0.0
     return value
@@ -968,7 +2101,7 @@ def float_from_str(text):
 def int_from_str(text):
     """Get formatted int from str with undefined values treated as zero"""
     try:
-        value = int(eval(text))
+        value = int(evaluate_expression(text))
     except:
         value = 0
     return value
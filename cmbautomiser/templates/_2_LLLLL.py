@@ -98,6 +98,9 @@ class CustomItem:
                 total[i] = round(total[i],3)
             return total
         
+        def total_func_columns(columns, userdata=None):
+            return [round(sum(columns.round(i,3)),3) for i in range(2,7)]
+        
         def total_func_item(values):
             return [round(x,3) for x in values[2:7]]
                 
@@ -119,6 +122,7 @@ class CustomItem:
         self.cust_funcs = [None, callback_breakup, None, None, None, None, None]
         self.total_func = total_func
         self.total_func_item = total_func_item
+        self.total_func_columns = total_func_columns
         self.latex_postproc_func = latex_postproc_func
         self.export_abstract = None
         self.dimensions = [[200,150,80,80,80,80,80], [True,False,False,False,False,False,False]]
@@ -99,6 +99,9 @@ class CustomItem:
                 total[i] = round(total[i],3)
             return total
         
+        def total_func_columns(columns, userdata=None):
+            return [round(sum(columns.round(i,3)),3) for i in range(1,9)]
+        
         def total_func_item(values):
             return [round(x,3) for x in values[1:9]]
                 
@@ -120,6 +123,7 @@ class CustomItem:
         self.cust_funcs = [None, None, None, None, None, None, None, None, None]
         self.total_func = total_func
         self.total_func_item = total_func_item
+        self.total_func_columns = total_func_columns
         self.latex_postproc_func = latex_postproc_func
         self.export_abstract = None
         self.dimensions = [[200,80,80,80,80,80,80,80,80], [True,False,False,False,False,False,False,False,False]]
@@ -22,6 +22,8 @@
 #
 #
 
+from cmbautomiser.misc import evaluate_expression
+
 # Standard conviniance functions * DONT CHANGE *
 
 def replace_all(text, dic):
@@ -92,7 +94,7 @@ class CustomItem:
                     l = ''
                     for value in values[3:9]:
                         if value not in ['','0','0.0']:
-                            l += str(eval(value)) + ','
+                            l += str(evaluate_expression(value)) + ','
                     l = l[:-1]
             except:
                 l = ''
@@ -100,9 +102,9 @@ class CustomItem:
 
         def c_1(values,row=None):
             try:
-                n1 = eval(values[1])
-                n2 = eval(values[2])
-                l = eval(values[3])
+                n1 = evaluate_expression(values[1])
+                n2 = evaluate_expression(values[2])
+                l = evaluate_expression(values[3])
                 total = round(n1*n2*l,2)
             except:
                 total = 0
@@ -110,9 +112,9 @@ class CustomItem:
 
         def c_2(values,row=None):
             try:
-                n1 = eval(values[1])
-                n2 = eval(values[2])
-                l = eval(values[4])
+                n1 = evaluate_expression(values[1])
+                n2 = evaluate_expression(values[2])
+                l = evaluate_expression(values[4])
                 total = round(n1*n2*l,2)
             except:
                 total = 0
@@ -120,9 +122,9 @@ class CustomItem:
 
         def c_3(values,row=None):
             try:
-                n1 = eval(values[1])
-                n2 = eval(values[2])
-                l = eval(values[5])
+                n1 = evaluate_expression(values[1])
+                n2 = evaluate_expression(values[2])
+                l = evaluate_expression(values[5])
                 total = round(n1*n2*l,2)
             except:
                 total = 0
@@ -130,9 +132,9 @@ class CustomItem:
 
         def c_4(values,row=None):
             try:
-                n1 = eval(values[1])
-                n2 = eval(values[2])
-                l = eval(values[6])
+                n1 = evaluate_expression(values[1])
+                n2 = evaluate_expression(values[2])
+                l = evaluate_expression(values[6])
                 total = round(n1*n2*l,2)
             except:
                 total = 0
@@ -140,9 +142,9 @@ class CustomItem:
 
         def c_5(values,row=None):
             try:
-                n1 = eval(values[1])
-                n2 = eval(values[2])
-                l = eval(values[7])
+                n1 = evaluate_expression(values[1])
+                n2 = evaluate_expression(values[2])
+                l = evaluate_expression(values[7])
                 total = round(n1*n2*l,2)
             except:
                 total = 0
@@ -150,9 +152,9 @@ class CustomItem:
 
         def c_6(values,row=None):
             try:
-                n1 = eval(values[1])
-                n2 = eval(values[2])
-                l = eval(values[8])
+                n1 = evaluate_expression(values[1])
+                n2 = evaluate_expression(values[2])
+                l = evaluate_expression(values[8])
                 total = round(n1*n2*l,2)
             except:
                 total = 0
@@ -175,6 +177,16 @@ class CustomItem:
                     pass
             return [round(grandtotal,3)]
         
+        def total_func_columns(columns, userdata):
+            # Total lengths of each diameter weighted by user data
+            grandtotal = 0
+            for i in range(6):
+                try:
+                    grandtotal += sum(columns.product([1,2,3+i], digits=2))*float(userdata[6+i])
+                except:
+                    pass
+            return [round(grandtotal,3)]
+        
         def total_func_item(values):
             # Populate data values
             n = values[1]*values[2]
@@ -231,6 +243,7 @@ class CustomItem:
         self.cust_funcs = [None, None, None, None, None, None, None, None, None, c_def,c_1,c_2,c_3,c_4,c_5,c_6]
         self.total_func = total_func
         self.total_func_item = total_func_item
+        self.total_func_columns = total_func_columns
         self.latex_postproc_func = latex_postproc_func
         self.export_abstract = None
         self.dimensions = [[200,40,40,50,50,50,50,50,50,100,50,50,50,50,50,50], [True,False,False,False,False,False,False,False,False,False,False,False,False,False,False,False]]
@@ -22,6 +22,8 @@
 #
 #
 
+from cmbautomiser.misc import evaluate_expression
+
 # Item codes for schedule dialog * DONT CHANGE *
 MEAS_NO = 1
 MEAS_L = 2
@@ -61,7 +63,7 @@ class CustomItem:
             data = []
             for x in data_str:
                 try:
-                    num = eval(x)
+                    num = evaluate_expression(x)
                     data.append(num)
                 except:
                     data.append(0)
@@ -77,6 +79,10 @@ class CustomItem:
             total[0] = round(total[0],3)
             return total
         
+        def total_func_columns(columns, userdata=None):
+            totals = [round((d0+d1+d2+d3)*(d4+d5)/2000000.0,3) for d0,d1,d2,d3,d4,d5 in columns.rows(range(1,7))]
+            return [round(sum(totals),3)]
+        
         def total_func_item(values):
             # Populate data values
             data = values[1:7]
@@ -103,6 +109,7 @@ class CustomItem:
         self.cust_funcs = [None, None, None, None, None, None, None, callback_total_item]
         self.total_func = total_func
         self.total_func_item = total_func_item
+        self.total_func_columns = total_func_columns
         self.latex_postproc_func = latex_postproc_func
         self.export_abstract = None
         self.dimensions = [[300,80,80,80,80,80,80,100], [True,False,False,False,False,False,False,False]]
@@ -42,6 +42,7 @@ class _Action:
         self.args = args
         self.kwargs = kwargs
         self._text = ''
+        self.size = 0
 
     def do(self):
         'Do or redo the action'
@@ -70,6 +71,14 @@ class _Action:
         'Return the descriptive text of the action'
         return self._text
 
+    def references(self):
+        'Return objects held by the action for doing and undoing it'
+        refs = list(self.args) + list(self.kwargs.values())
+        runner = getattr(self, '_runner', None)
+        if runner is not None and runner.gi_frame is not None:
+            refs += list(runner.gi_frame.f_locals.values())
+        return refs
+
 
 def undoable(generator):
     ''' Decorator which creates a new undoable action type. 
@@ -103,6 +112,7 @@ class _Group:
     def __init__(self, desc):
         self._desc = desc
         self._stack = []
+        self.size = 0
 
     def __enter__(self):
         stack().setreceiver(self._stack)
@@ -124,6 +134,12 @@ class _Group:
     def text(self):
         return self._desc.format(count=len(self._stack))
 
+    def references(self):
+        refs = []
+        for undoable in self._stack:
+            refs += undoable.references()
+        return refs
+
 
 def group(desc):
     ''' Return a context manager for grouping undoable actions. 
@@ -196,15 +212,32 @@ class Stack:
     >>> action()
     >>> stack().haschanged()
     True
+    
+    Memory held by the stack can be limited by setting *limit* along with
+    *sizefunc*, a function returning the size of an action, called once
+    when the action is added to the stack. The oldest actions are dropped
+    when the total size of actions exceeds *limit*, the last action done
+    always being kept.
+    
+    >>> stack().sizefunc = lambda action: 1
+    >>> stack().limit = 2
+    >>> for n in range(3):
+    ...     action()
+    >>> stack().undocount()
+    2
+    >>> stack().limit = stack().sizefunc = None
     '''
 
-    def __init__(self):
+    def __init__(self, limit=None, sizefunc=None):
         self._undos = deque()
         self._redos = deque()
         self._receiver = self._undos
         self._savepoint = None
+        self._size = 0
         self.undocallback = lambda: None
         self.docallback = lambda: None
+        self.limit = limit
+        self.sizefunc = sizefunc
 
     def canundo(self):
         ''' Return *True* if undos are available '''
@@ -230,6 +263,7 @@ class Stack:
                     raise
                 else:
                     self._undos.append(undoable)
+            self._evict()
             self.docallback()
 
     def undo(self):
@@ -252,6 +286,11 @@ class Stack:
         self._redos.clear()
         self._savepoint = None
         self._receiver = self._undos
+        self._size = 0
+
+    def size(self):
+        ''' Return the total size of actions held. '''
+        return self._size
 
     def undocount(self):
         ''' Return the number of undos available. '''
@@ -296,9 +335,33 @@ class Stack:
         if self._receiver is not None:
             self._receiver.append(action)
         if self._receiver is self._undos:
+            for undoable in self._redos:
+                self._size -= undoable.size
             self._redos.clear()
+            self._setsize(action)
+            self._evict()
             self.docallback()
 
+    def _setsize(self, action):
+        ''' Set the size of an action when it is added to the stack. 
+        
+        The size is computed once and kept as the action is undone and redone.
+        '''
+        if self.sizefunc is not None:
+            action.size = self.sizefunc(action)
+            self._size += action.size
+
+    def _evict(self):
+        ''' Drop the oldest actions while the size of the stack exceeds the limit. '''
+        while self.limit is not None and self._size > self.limit and len(self._undos) > 1:
+            undoable = self._undos.popleft()
+            self._size -= undoable.size
+            if self._savepoint is not None:
+                self._savepoint -= 1
+                if self._savepoint < 0:
+                    # Savepoint can no longer be reached once it is dropped
+                    self._savepoint = None
+
     def savepoint(self):
         ''' Set the savepoint. '''
         self._savepoint = self.undocount()
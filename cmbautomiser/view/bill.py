@@ -152,7 +152,8 @@ class BillView:
                                 # create duplicate bill
                                 bill = data.bill.Bill()
                                 bill.set_model(model.get_model())
-                                bill.update(self.schedule, self.cmbs, self.bills)
+                                bill.update(self.schedule, self.cmbs, self.bills,
+                                            self.data.get_item_paths(bill.data.mitems))
                                 # Fill in values for custom bill from duplicate bill
                                 model.item_normal_amount = {x:float(bill.item_normal_amount[x]) for x in bill.item_normal_amount}
                                 model.item_excess_amount = {x:float(bill.item_excess_amount[x]) for x in bill.item_excess_amount}
@@ -329,7 +330,7 @@ class BillDialog:
         if self.billdata.bill_type in (misc.BILL_NORMAL, misc.BILL_FINAL):
             # Evaluate a bill with current selected items for determining EXCEEDED flag
             bill = data.bill.Bill(self.billdata.get_model())
-            bill.update(self.schedule, self.cmbs, self.bills)
+            bill.update(self.schedule, self.cmbs, self.bills, self.data.get_item_paths(bill.data.mitems))
             
             # Update model variables to include itemnos
             for itemno in itemnos:
@@ -414,13 +415,13 @@ class BillDialog:
             records = model[1]
             for count, item in enumerate(populated_items):
                 if self.billdata.bill_type in (misc.BILL_NORMAL, misc.BILL_FINAL):
-                    self.billdata.item_excess_rates[item[0]] = float(eval(records[count][4]))
-                    self.billdata.item_part_percentage[item[0]] = float(eval(records[count][5]))
-                    self.billdata.item_excess_part_percentage[item[0]] = float(eval(records[count][6]))
+                    self.billdata.item_excess_rates[item[0]] = float(misc.evaluate_expression(records[count][4]))
+                    self.billdata.item_part_percentage[item[0]] = float(misc.evaluate_expression(records[count][5]))
+                    self.billdata.item_excess_part_percentage[item[0]] = float(misc.evaluate_expression(records[count][6]))
                 elif self.billdata.bill_type == misc.BILL_CUSTOM:
-                    self.billdata.item_qty[item[0]][0] = float(eval(records[count][4]))
-                    self.billdata.item_normal_amount[item[0]] = float(eval(records[count][5]))
-                    self.billdata.item_excess_amount[item[0]] = float(eval(records[count][6]))
+                    self.billdata.item_qty[item[0]][0] = float(misc.evaluate_expression(records[count][4]))
+                    self.billdata.item_normal_amount[item[0]] = float(misc.evaluate_expression(records[count][5]))
+                    self.billdata.item_excess_amount[item[0]] = float(misc.evaluate_expression(records[count][6]))
     
     def onButtonAdjustmentsPressed(self, button):
         """Create a bill adjustments dialog window"""
@@ -561,7 +562,7 @@ class BillDialog:
         self.billdata.bill_text = self.textview_bill_text.get_buffer().get_text(text_start, text_end, True)
         
         # Update mitems
-        self.billdata.mitems = self.selected.get_paths()
+        self.billdata.mitems = self.data.get_item_ids(self.selected.get_paths())
 
     def __init__(self, parent, data_object, bill_data, this_bill=None):
         """Initialises bill dialog
@@ -584,7 +585,7 @@ class BillDialog:
         self.schedule = self.data.schedule
         self.bills = self.data.bills
         self.cmbs = self.data.cmbs
-        self.selected = data.datamodel.LockState(self.billdata.mitems)
+        self.selected = data.datamodel.LockState(self.data.get_item_paths(self.billdata.mitems))
         self.locked = self.data.get_lock_states() - self.selected
                 
         # Setup dialog window
@@ -24,7 +24,7 @@
 
 import pickle, codecs, os.path, copy, logging
 
-from gi.repository import Gtk, Gdk, GLib
+from gi.repository import Gtk, Gdk, GLib, GObject
 
 # local files import
 from .. import misc, data, undo
@@ -35,6 +35,200 @@ from .scheduledialog import ScheduleDialog
 log = logging.getLogger(__name__)
 
 
+class MeasurementsModel(GObject.Object, Gtk.TreeModel):
+    """Tree model of MeasurementsView with row values computed on demand
+    
+        The model holds the structure of the displayed tree as rows of
+        [object, child rows or None, cached values or None, colour or None].
+        Values of a row are computed by value_func only when requested by the
+        treeview, normally for visible rows, and cached till clear_cache().
+        Iters hold the indices of a row offset by one in their user data fields.
+    """
+    
+    column_types = (str, bool, str, str)
+    
+    def __init__(self, value_func):
+        """Initialise model
+        
+            Arguments:
+                value_func: Function returning [text, flag, tooltip] of object at path
+        """
+        GObject.Object.__init__(self)
+        self.value_func = value_func
+        self.rows = []
+        self.cached = []  # Rows with cached values
+        self.coloured = []  # Rows with colour set
+        
+    def get_row(self, indices):
+        """Return row at indices, None if not existing"""
+        rows = self.rows
+        row = None
+        for index in indices:
+            if rows is None or not (0 <= index < len(rows)):
+                return None
+            row = rows[index]
+            rows = row[1]
+        return row
+        
+    def get_children(self, indices):
+        """Return list of child rows of row at indices"""
+        if not indices:
+            return self.rows
+        row = self.get_row(indices)
+        return row[1] if row is not None else None
+        
+    def make_iter(self, indices):
+        """Return iter for row at indices"""
+        tree_iter = Gtk.TreeIter()
+        tree_iter.user_data = indices[0] + 1
+        tree_iter.user_data2 = indices[1] + 1 if len(indices) > 1 else 0
+        tree_iter.user_data3 = indices[2] + 1 if len(indices) > 2 else 0
+        return tree_iter
+        
+    def get_indices(self, tree_iter):
+        """Return indices of row of iter"""
+        indices = []
+        for value in (tree_iter.user_data, tree_iter.user_data2, tree_iter.user_data3):
+            if not value:
+                break
+            indices.append(value - 1)
+        return indices
+        
+    def clear_cache(self):
+        """Clear cached row values and colours"""
+        for row in self.cached:
+            row[2] = None
+        for row in self.coloured:
+            row[3] = None
+        self.cached = []
+        self.coloured = []
+        
+    def set_colour(self, indices, colour):
+        """Set background colour of row"""
+        row = self.get_row(indices)
+        if row is not None:
+            row[3] = colour
+            self.coloured.append(row)
+            path = Gtk.TreePath.new_from_indices(indices)
+            self.row_changed(path, self.make_iter(indices))
+        
+    def update_rows(self, parent_indices, rows, items, inserted):
+        """Update child rows of row at parent_indices to match items
+        
+            Rows are matched to items by identity of data objects. Rows are
+            inserted and removed in place with the corresponding signals.
+            
+            Arguments:
+                parent_indices: Indices of parent row, [] for top level
+                rows: List of child rows updated
+                items: List of rows required as [object, child items or None]
+                inserted: List to which paths of inserted rows are appended
+        """
+        item_ids = set(id(item[0]) for item in items)
+        position = 0
+        
+        def remove_row():
+            del rows[position]
+            self.row_deleted(Gtk.TreePath.new_from_indices(parent_indices + [position]))
+            if parent_indices and not rows:
+                self.row_has_child_toggled(Gtk.TreePath.new_from_indices(parent_indices), self.make_iter(parent_indices))
+                
+        for obj, children in items:
+            # Remove rows of deleted objects
+            while position < len(rows) and id(rows[position][0]) not in item_ids:
+                remove_row()
+            indices = parent_indices + [position]
+            if position < len(rows) and rows[position][0] is obj:
+                row = rows[position]
+            else:
+                row = [obj, None, None, None]
+                rows.insert(position, row)
+                path = Gtk.TreePath.new_from_indices(indices)
+                self.row_inserted(path, self.make_iter(indices))
+                inserted.append(path)
+                if parent_indices and len(rows) == 1:
+                    self.row_has_child_toggled(Gtk.TreePath.new_from_indices(parent_indices), self.make_iter(parent_indices))
+            if children is not None or row[1]:
+                if row[1] is None:
+                    row[1] = []
+                self.update_rows(indices, row[1], children if children else [], inserted)
+            position += 1
+        # Remove trailing rows
+        while position < len(rows):
+            remove_row()
+            
+    # Gtk.TreeModel interface
+    
+    def do_get_flags(self):
+        return 0
+        
+    def do_get_n_columns(self):
+        return len(self.column_types)
+        
+    def do_get_column_type(self, column):
+        return self.column_types[column]
+        
+    def do_get_iter(self, path):
+        indices = path.get_indices()
+        if indices and len(indices) <= 3 and self.get_row(indices) is not None:
+            return (True, self.make_iter(indices))
+        return (False, None)
+        
+    def do_get_path(self, tree_iter):
+        return Gtk.TreePath.new_from_indices(self.get_indices(tree_iter))
+        
+    def do_get_value(self, tree_iter, column):
+        indices = self.get_indices(tree_iter)
+        row = self.get_row(indices)
+        if row is None:
+            return None
+        if column == 3:
+            return row[3] if row[3] is not None else misc.MEAS_COLOR_NORMAL
+        if row[2] is None:
+            row[2] = self.value_func(row[0], indices)
+            self.cached.append(row)
+        return row[2][column]
+        
+    def do_iter_next(self, tree_iter):
+        indices = self.get_indices(tree_iter)
+        siblings = self.get_children(indices[:-1])
+        if siblings is not None and indices[-1] + 1 < len(siblings):
+            indices[-1] += 1
+            return (True, self.make_iter(indices))
+        return (False, None)
+        
+    def do_iter_previous(self, tree_iter):
+        indices = self.get_indices(tree_iter)
+        if indices[-1] > 0:
+            indices[-1] -= 1
+            return (True, self.make_iter(indices))
+        return (False, None)
+        
+    def do_iter_children(self, parent):
+        return self.do_iter_nth_child(parent, 0)
+        
+    def do_iter_has_child(self, tree_iter):
+        children = self.get_children(self.get_indices(tree_iter))
+        return bool(children)
+        
+    def do_iter_n_children(self, tree_iter):
+        children = self.get_children(self.get_indices(tree_iter) if tree_iter is not None else [])
+        return len(children) if children else 0
+        
+    def do_iter_nth_child(self, parent, n):
+        indices = self.get_indices(parent) if parent is not None else []
+        children = self.get_children(indices)
+        if children and 0 <= n < len(children):
+            return (True, self.make_iter(indices + [n]))
+        return (False, None)
+        
+    def do_iter_parent(self, child):
+        indices = self.get_indices(child)
+        if len(indices) > 1:
+            return (True, self.make_iter(indices[:-1]))
+        return (False, None)
+
+
 class MeasurementsView:
     """Implements a view for display and manipulation of measurement items over a treeview"""
             
@@ -100,16 +294,8 @@ class MeasurementsView:
     
     def set_colour(self, path, color):
         """Sets the colour of item selected by path"""
-        if len(path) == 1:
-            path_formated = Gtk.TreePath.new_from_string(str(path[0]))
-        elif len(path) == 2:
-            path_formated = Gtk.TreePath.new_from_string(str(path[0]) + ':' + str(path[1]))
-        elif len(path) == 3:
-            path_formated = Gtk.TreePath.new_from_string(str(path[0]) + ':' + str(path[1]) + ':' + str(path[2]))
-        else:
-            return
-        path_iter = self.store.get_iter(path_formated)
-        self.store.set_value(path_iter, 3, color)
+        if 1 <= len(path) <= 3:
+            self.store.set_colour(list(path), color)
 
     def add_cmb(self):
         """Add a CMB to measurement view"""
@@ -248,59 +434,96 @@ class MeasurementsView:
         selection = self.tree.get_selection()
         if selection.count_selected_rows() != 0: # if selection exists
             [model, paths] = selection.get_selected_rows()
-            self.data.delete_row_meas(paths[0].get_indices())
+            paths = [path.get_indices() for path in paths]
+            # Rows under a selected row are deleted along with it
+            rows = [path for path in paths if not any(path[0:level] in paths for level in range(1, len(path)))]
+            # Delete from last row so that paths of rows remaining are not changed
+            with self.data.batch("Delete {} measurement items".format(len(rows))):
+                for path in sorted(rows, reverse=True):
+                    self.data.delete_row_meas(path)
             self.update_store()
 
     def copy_selection(self):
-        """Copy selected row to clipboard"""
+        """Copy selected rows to clipboard
+        
+            Only rows at the same level as the first row selected are copied.
+        """
         selection = self.tree.get_selection()
         if selection.count_selected_rows() != 0: # if selection exists
             test_string = "MeasurementsView"
             [model, paths] = selection.get_selected_rows()
-            path = paths[0].get_indices()
-            if len(path) == 1:
-                item = self.cmbs[path[0]].get_model(clean=True)
-            elif len(path) == 2:
-                item = self.cmbs[path[0]][path[1]].get_model(clean=True)
-            elif len(path) == 3:
-                item = self.cmbs[path[0]][path[1]][path[2]].get_model(clean=True)
-            text = codecs.encode(pickle.dumps([test_string, item]), "base64").decode() # dump item as text
+            level = len(paths[0].get_indices())
+            items = []
+            for path in paths:
+                path = path.get_indices()
+                if len(path) != level:
+                    continue
+                elif len(path) == 1:
+                    items.append(self.cmbs[path[0]].get_model(clean=True))
+                elif len(path) == 2:
+                    items.append(self.cmbs[path[0]][path[1]].get_model(clean=True))
+                elif len(path) == 3:
+                    items.append(self.cmbs[path[0]][path[1]][path[2]].get_model(clean=True))
+            text = codecs.encode(pickle.dumps([test_string, items]), "base64").decode() # dump items as text
             self.clipboard.set_text(text,-1) # push to clipboard
         else: # if no selection
             log.warning("MeasurementsView - copy_selection - No items selected to copy")
+            
+    def paste_item(self, item, path, offset):
+        """Paste item at path
+        
+            Arguments:
+                item: Model of Cmb/Measurement/Completion/MeasurementItem
+                path: Path of selected row, None if no row selected
+                offset: Position of item among items pasted
+        """
+        if item[0] == 'CMB':
+            self.data.add_cmb_at_node(item, path[0] + offset if path else None)
+        elif item[0] in ['Measurement', 'Completion']:
+            if path and len(path) > 1:
+                path = [path[0], path[1] + offset]
+            self.data.add_measurement_at_node(item, path)
+        elif item[0] in ['MeasurementItemHeading', 'MeasurementItemCustom', 'MeasurementItemAbstract']:
+            if path and len(path) > 2:
+                path = [path[0], path[1], path[2] + offset]
+            self.data.add_measurement_item_at_node(item, path)
 
     def paste_at_selection(self):
-        """Paste copied item at selected row"""
+        """Paste copied items at selected row"""
         text = self.clipboard.wait_for_text() # get text from clipboard
         if text != None:
             test_string = "MeasurementsView"
             try:
-                itemlist = pickle.loads(codecs.decode(text.encode(), "base64"))  # recover item from string
-                if itemlist[0] == test_string:
-                    item = itemlist[1]
-                    selection = self.tree.get_selection()
-                    if selection.count_selected_rows() != 0: # if selection exists
-                        [model, paths] = selection.get_selected_rows()
-                        path = paths[0].get_indices()
-                        if item[0] == 'CMB':
-                            self.data.add_cmb_at_node(item,path[0])
-                        elif item[0] in ['Measurement', 'Completion']:
-                            self.data.add_measurement_at_node(item,path)
-                        elif item[0] in ['MeasurementItemHeading', 'MeasurementItemCustom', 'MeasurementItemAbstract']:
-                            self.data.add_measurement_item_at_node(item,path)
-                    else:
-                        if item[0] == 'CMB':
-                            self.data.add_cmb_at_node(item,None)
-                        elif item[0] in ['Measurement', 'Completion']:
-                            self.data.add_measurement_at_node(item,None)
-                        elif item[0] in ['MeasurementItemHeading', 'MeasurementItemCustom', 'MeasurementItemAbstract']:
-                            self.data.add_measurement_item_at_node(item,None)
-                    self.update_store()
-            except:
+                itemlist = pickle.loads(codecs.decode(text.encode(), "base64"))  # recover items from string
+                valid = itemlist[0] == test_string
+            except Exception:
+                valid = False
+            if not valid:
                 log.warning('MeasurementsView - paste_at_selection - No valid data in clipboard')
+                return
+            items = itemlist[1]
+            if isinstance(items[0], str):  # single item copied by earlier versions
+                items = [items]
+            selection = self.tree.get_selection()
+            path = None
+            if selection.count_selected_rows() != 0: # if selection exists
+                [model, paths] = selection.get_selected_rows()
+                path = paths[0].get_indices()
+            try:
+                # Items pasted are undone by batch if any item fails
+                with self.data.batch("Paste {} measurement items at '{}'".format(len(items), path)):
+                    for offset, item in enumerate(items):
+                        self.paste_item(item, path, offset)
+            finally:
+                self.update_store()
         else:
             log.warning('MeasurementsView - paste_at_selection - No text on the clipboard')
 
+    def get_row_values(self, obj, path):
+        """Return values displayed in row of object at path as [text, flag, tooltip]"""
+        flag = self.lock_state[path] if len(path) == 3 else False
+        return [obj.get_text(), flag, obj.get_tooltip()]
+
     def update_store(self, lock_state = None):
         """Update GUI of MeasurementsView from data model while trying to preserve selection
         
@@ -319,19 +542,30 @@ class MeasurementsView:
             [model, paths] = selection.get_selected_rows()
             old_path = paths[0].get_indices()
 
-        # Update StoreView
-        self.store.clear()
-        for p1, cmb in enumerate(self.cmbs):
-            iter_cmb = self.store.append(None,[cmb.get_text(),False,cmb.get_tooltip(),misc.MEAS_COLOR_NORMAL])
-            for p2, meas in enumerate(cmb.items):
-                iter_meas = self.store.append(iter_cmb,[meas.get_text(),False,meas.get_tooltip(),misc.MEAS_COLOR_NORMAL])
+        # Structure of StoreView, row values are computed when displayed
+        items = []
+        for cmb in self.cmbs:
+            meas_items = []
+            for meas in cmb.items:
                 if isinstance(meas, data.measurement.Measurement):
-                    for p3, mitem in enumerate(meas.items):
-                        m_flag = lock_state[[p1, p2, p3]]
-                        self.store.append(iter_meas,[mitem.get_text(), m_flag, mitem.get_tooltip(),misc.MEAS_COLOR_NORMAL])
-                elif isinstance(meas, data.measurement.Completion):
-                    pass
-        self.tree.expand_all()
+                    mitems = [[mitem, None] for mitem in meas.items]
+                else:
+                    mitems = None
+                meas_items.append([meas, mitems])
+            items.append([cmb, meas_items])
+            
+        # Update StoreView with changed rows
+        self.lock_state = lock_state
+        self.store.clear_cache()
+        populate = not self.store.rows
+        inserted = []
+        self.store.update_rows([], self.store.rows, items, inserted)
+        if populate:
+            self.tree.expand_all()
+        else:
+            for path in inserted:
+                self.tree.expand_to_path(path)
+        self.tree.queue_draw()
 
         # Set selection to the nearest item that was selected
         if old_path != []:
@@ -481,7 +715,8 @@ class MeasurementsView:
         
         ## Setup treeview store
         # Item Description, Billed Flag, Tooltip, Colour
-        self.store = Gtk.TreeStore(str,bool,str,str)
+        self.store = MeasurementsModel(self.get_row_values)
+        self.lock_state = data.get_lock_states()
         # Treeview columns
         self.column_desc = Gtk.TreeViewColumn('Item Description')
         self.column_desc.props.expand = True
@@ -502,6 +737,10 @@ class MeasurementsView:
         self.column_desc.add_attribute(self.renderer_desc, "background", 3)
         self.column_toggle.add_attribute(self.renderer_toggle, "active", 1)
         self.tree.set_tooltip_column(2)
+        # Rows of fixed height allow only visible rows to be evaluated
+        self.column_desc.set_sizing(Gtk.TreeViewColumnSizing.FIXED)
+        self.column_toggle.set_sizing(Gtk.TreeViewColumnSizing.FIXED)
+        self.tree.set_fixed_height_mode(True)
         # Set model for store
         self.tree.set_model(self.store)
 
@@ -574,11 +813,12 @@ class AbstractDialog:
         log.info('AbstractDialog - update_store')
               
         # Update mitems
-        self.mitems = self.selected.get_paths()
+        paths = self.selected.get_paths()
+        self.mitems = self.data.get_item_ids(paths)
         
         # Update itemtype and itemnos
-        if self.mitems:
-            path = self.mitems[0]
+        if paths:
+            path = paths[0]
             item = self.data.cmbs[path[0]][path[1]][path[2]]
             self.itemtype = item.itemtype
             self.itemnos = item.itemnos
@@ -687,8 +927,9 @@ class AbstractDialog:
                 self.mitems = model[1][0]
                 self.remark = model[1][1]
                 self.entry_abstract_remark.set_text(self.remark)
-                self.selected = data.datamodel.LockState(self.mitems)
-                self.initial_selected = data.datamodel.LockState(self.mitems)
+                paths = self.data.get_item_paths(self.mitems)
+                self.selected = data.datamodel.LockState(paths)
+                self.initial_selected = data.datamodel.LockState(paths)
                 self.locked = self.data.get_lock_states() - self.initial_selected
         
         # Update GUI
@@ -55,7 +55,7 @@ class ScheduleViewGeneric:
                 column: column in ListStore being edited
         """
         try:  # check whether item evaluates fine
-            eval(new_text)
+            misc.evaluate_expression(new_text)
         except:
             log.warning("ScheduleViewGeneric - onScheduleCellEditedNum - evaluation of [" 
             + new_text + "] failed")
@@ -333,17 +333,17 @@ class ScheduleViewGeneric:
                         if columntype == misc.MEAS_DESC:
                             display_item.append(item_elem)
                         elif columntype == misc.MEAS_NO:
-                            value = str(int(eval(item_elem))) if item_elem not in ['0','0.0'] else ''
+                            value = str(int(misc.evaluate_expression(item_elem))) if item_elem not in ['0','0.0'] else ''
                             display_item.append(value)
                         elif columntype == misc.MEAS_L:
-                            value = str(round(float(eval(item_elem)), 3)) if item_elem not in ['0','0.0'] else ''
+                            value = str(round(float(misc.evaluate_expression(item_elem)), 3)) if item_elem not in ['0','0.0'] else ''
                             display_item.append(value)
                         elif columntype == misc.MEAS_BOOL:
-                            value = eval(item_elem)
+                            value = misc.evaluate_expression(item_elem)
                             display_item.append(value)
                     else:
                         display_item.append("")
-                except TypeError:
+                except (TypeError, ValueError):
                     display_item.append("")
                     log.warning('ScheduleViewGeneric - Wrong value loaded in store - '  + str(item_elem))
             self.store[row] = display_item
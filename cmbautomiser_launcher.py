@@ -42,7 +42,7 @@ if sys.stdout is None:
 if sys.stderr is None:
     sys.stderr = NullWriter()
 
-from cmbautomiser import MainApp
+from cmbautomiser.main import MainApp
 
 if __name__ == '__main__':
     # Setup logging
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+#  conftest.py
+#
+#  Copyright 2014 Manu Varkey <manuvarkey@gmail.com>
+#
+#  This program is free software; you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation; either version 2 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software
+#  Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+#  MA 02110-1301, USA.
+#
+#
+
+import pytest
+
+from cmbautomiser import misc
+from cmbautomiser.data import datamodel
+
+# Version of project files refering to measurement items by path
+PROJECT_FILE_VER_3_1 = 'CMBAUTOMISER_FILE_REFERENCE_VER_3.1'
+
+
+# User data of civil_steel_table_lengths items, labels and weights of bars
+STEEL_USER_DATA = ['8mm', '10mm', '12mm', '16mm', '20mm', '25mm',
+                   '0.395', '0.616', '0.888', '1.579', '2.467', '3.855']
+
+
+def make_record(number):
+    """Return model of record of _1_NLBH item"""
+    return ['Record ' + str(number), '', str(number % 3 + 1), str(number) + '*1.5', '2.0', '', '']
+
+def make_steel_record(number):
+    """Return model of record of civil_steel_table_lengths item"""
+    return ['Bar ' + str(number), str(number + 1), '2', str(number) + '.5', '', '3', '', '', '1.25'] + ['']*7
+
+def make_project_model():
+    """Return data model of project in VER_3.1 format, without ids
+
+        Bills and abstracts refer to measurement items by path.
+    """
+    schedule_model = [['1.' + str(i), 'Item ' + str(i), 'cum', str(100 + i), str(50 + i), '', '30', 'True']
+                      for i in range(5)]
+    cmb_models = []
+    for cmb_no in range(2):
+        items = [['MeasurementItemHeading', ['Heading ' + str(cmb_no)]]]
+        for item_no in range(3):
+            records = [make_record(cmb_no*10 + item_no*3 + count) for count in range(3)]
+            items.append(['MeasurementItemCustom', [['1.' + str(item_no + cmb_no)], records,
+                                                    'Remark', [''], [], '_1_NLBH']])
+        if cmb_no == 0:
+            for item_no in range(2):
+                records = [make_steel_record(item_no*3 + count) for count in range(3)]
+                items.append(['MeasurementItemCustom', [['1.4'], records, 'Steel', [''],
+                                                        list(STEEL_USER_DATA), 'civil_steel_table_lengths']])
+        else:
+            items.append(['MeasurementItemAbstract', [[[0, 0, 4], [0, 0, 5]], 'Abstract']])
+        measurement_model = ['Measurement', ['01/01/2020', items]]
+        cmb_models.append(['CMB', ['CMB ' + str(cmb_no), [measurement_model]]])
+    bill_models = [['BillData', [None, '1', 'Bill 1', '01/02/2020', 1, [[0, 0, 1], [0, 0, 3]],
+                                 {}, {}, {}, {}, {}, {}, misc.BILL_NORMAL, '', []]],
+                   ['BillData', [0, '2', 'Bill 2', '01/03/2020', 1, [[1, 0, 1], [1, 0, 2], [1, 0, 4]],
+                                 {}, {}, {}, {}, {}, {}, misc.BILL_NORMAL, '', []]]]
+    return ['DataModel', [schedule_model, cmb_models, bill_models]]
+
+def load_file(data_model, filename):
+    """Load project file into data model and return project settings"""
+    loader = data_model.load_file(filename)
+    while True:
+        try:
+            next(loader)
+        except StopIteration as stop:
+            return stop.value
+
+
+@pytest.fixture
+def project_settings():
+    """Project settings of new project"""
+    return misc.init_project_settings_dict(misc.init_global_platform_vars())
+
+@pytest.fixture
+def project_model():
+    """Data model of project in VER_3.1 format"""
+    return make_project_model()
+
+@pytest.fixture
+def project(project_model, project_settings):
+    """Project in current file version"""
+    data_model = datamodel.DataModel(project_settings=project_settings)
+    data_model.set_model(project_model)
+    settings = dict(project_settings)
+    settings['$cmbnameofwork$'] = 'Name of work'
+    return [misc.PROJECT_FILE_VER, data_model.get_model(), settings]
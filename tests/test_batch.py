@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+#  test_batch.py
+#
+#  Copyright 2014 Manu Varkey <manuvarkey@gmail.com>
+#
+#  This program is free software; you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation; either version 2 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software
+#  Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+#  MA 02110-1301, USA.
+#
+#
+
+import pytest
+
+from cmbautomiser import misc, batch
+
+from conftest import PROJECT_FILE_VER_3_1
+
+
+@pytest.fixture
+def project_file(tmp_path, project_model, project_settings):
+    """Filename of project in VER_3.1 format"""
+    filename = str(tmp_path / 'project.proj')
+    misc.write_project(filename, [PROJECT_FILE_VER_3_1, project_model, project_settings])
+    return filename
+
+@pytest.fixture
+def rendered(monkeypatch):
+    """List of arguments of render_project calls, with rendering skipped"""
+    calls = []
+    def render_project(data_model, project_settings, folder, cmbs=None, bills=None, max_jobs=None):
+        calls.append([folder, cmbs, bills, max_jobs])
+        return [('cmb_1', misc.CMB_INFO, 'Rendered', 0.0)]
+    monkeypatch.setattr(batch, 'render_project', render_project)
+    monkeypatch.setattr(batch.shutil, 'which', lambda name: name)
+    return calls
+
+
+# Arguments
+
+def test_help(capsys):
+    with pytest.raises(SystemExit) as exit_info:
+        batch.main(['--help'])
+    assert exit_info.value.code == 0
+    assert 'usage: cmbautomiser.batch' in capsys.readouterr().out
+
+@pytest.mark.parametrize('argv', [[], ['project.proj', '-c', 'x'], ['project.proj', '-j']])
+def test_invalid_arguments(argv):
+    with pytest.raises(SystemExit) as exit_info:
+        batch.main(argv)
+    assert exit_info.value.code == 2
+
+
+# Loading and saving
+
+def test_missing_file(tmp_path, rendered):
+    assert batch.main([str(tmp_path / 'missing.proj')]) == 2
+    assert rendered == []
+
+def test_bad_file(tmp_path, rendered):
+    filename = tmp_path / 'bad.proj'
+    filename.write_text('{"not": "a project"}')
+    assert batch.main([str(filename)]) == 2
+    assert rendered == []
+
+@pytest.mark.parametrize('extension', ['.proj', misc.PROJECT_ARCHIVE_EXT])
+def test_save(tmp_path, project_file, rendered, extension):
+    filename = str(tmp_path / ('converted' + extension))
+    assert batch.main([project_file, '-s', filename]) == 0
+    # Nothing rendered without selection of items or output folder
+    assert rendered == []
+    assert misc.ProjectArchive.is_archive(filename) == (extension == misc.PROJECT_ARCHIVE_EXT)
+    data_model, project_settings = batch.load_project(project_file)
+    converted_model, converted_settings = batch.load_project(filename)
+    assert converted_model.get_model() == data_model.get_model()
+    assert converted_settings == project_settings
+
+
+# Rendering
+
+def test_select_all(tmp_path, project_file, rendered):
+    assert batch.main([project_file]) == 0
+    assert rendered == [[str(tmp_path), None, None, misc.LATEX_MAX_JOBS]]
+
+def test_select_items(tmp_path, project_file, rendered):
+    folder = str(tmp_path / 'output')
+    assert batch.main([project_file, '-o', folder, '-c', '2', '1', '-j', '0']) == 0
+    # Items are numbered from 1, with at least one latex job run
+    assert rendered == [[folder, [1, 0], [], 1]]
+    assert batch.main([project_file, '-o', folder, '-b', '2', '-j', '3']) == 0
+    assert rendered[-1] == [folder, [], [1], 3]
+
+def test_latex_not_found(project_file, rendered, monkeypatch):
+    monkeypatch.setattr(batch.shutil, 'which', lambda name: None)
+    assert batch.main([project_file]) == 2
+    assert rendered == []
+
+def test_render_error(project_file, monkeypatch):
+    def render_project(*args):
+        raise KeyError('template')
+    monkeypatch.setattr(batch, 'render_project', render_project)
+    monkeypatch.setattr(batch.shutil, 'which', lambda name: name)
+    assert batch.main([project_file]) == 2
+
+def test_render_failed(project_file, monkeypatch, capsys):
+    monkeypatch.setattr(batch, 'render_project', lambda *args: [('cmb_1', misc.CMB_INFO, 'Rendered', 0.0),
+                                                                ('bill_1', misc.CMB_ERROR, 'Failed', 0.0)])
+    monkeypatch.setattr(batch.shutil, 'which', lambda name: name)
+    assert batch.main([project_file]) == 1
+    assert '2 documents rendered' in capsys.readouterr().out
+
+def test_render_project_not_found(project_file):
+    data_model, project_settings = batch.load_project(project_file)
+    results = batch.render_project(data_model, project_settings, None, [5], [])
+    assert [result[:3] for result in results] == [('cmb_6', misc.CMB_ERROR, 'Document not found in project')]
@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+#  test_datamodel.py
+#
+#  Copyright 2014 Manu Varkey <manuvarkey@gmail.com>
+#
+#  This program is free software; you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation; either version 2 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software
+#  Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+#  MA 02110-1301, USA.
+#
+#
+
+import json
+
+import pytest
+
+from cmbautomiser import misc, undo
+from cmbautomiser.data import datamodel
+
+from conftest import PROJECT_FILE_VER_3_1, load_file
+
+
+def get_state(data_model):
+    """Return derived values of data model compared across loads"""
+    bills = [[bill.paths, bill.bill_nettotal_amount, bill.bill_since_prev_amount, sorted(bill.cmb_ref)]
+             for bill in data_model.bills]
+    abstract = data_model.cmbs[1][0][4]
+    return [bills, abstract.paths, abstract.get_total(), data_model.lock_state.get_paths()]
+
+
+# Loading of project files
+
+def test_load_file(tmp_path, project, project_settings):
+    filename = str(tmp_path / 'project.proj')
+    misc.write_project(filename, project)
+    data_model = datamodel.DataModel(project_settings=project_settings)
+    fractions = []
+    loader = data_model.load_file(filename)
+    while True:
+        try:
+            fractions.append(next(loader))
+        except StopIteration as stop:
+            settings = stop.value
+            break
+    data_model.update()
+    # Progress reported after each CMB and bill
+    assert len(fractions) == 4
+    assert fractions == sorted(fractions)
+    assert 0 < fractions[-1] <= 1
+    assert settings == project[2]
+    assert data_model.get_model() == project[1]
+
+def test_load_file_wrong_version(tmp_path, project, project_settings):
+    filename = str(tmp_path / 'project.proj')
+    misc.write_project(filename, ['CMBAUTOMISER_FILE_REFERENCE_VER_0'] + project[1:])
+    data_model = datamodel.DataModel(project_settings=project_settings)
+    with pytest.raises(ValueError):
+        load_file(data_model, filename)
+
+
+def test_model_parts_reused(project, project_settings):
+    data_model = datamodel.DataModel(project_settings=project_settings)
+    data_model.set_model(project[1])
+    parts = data_model.get_model_parts()
+    assert [json.loads(part.content) for part in parts[1][1]] == project[1][1][1]
+    assert [json.loads(part.content) for part in parts[1][2]] == project[1][1][2]
+    # Only CMBs and bills modified are serialised again
+    data_model.edit_measurement_item([1, 0, 0], data_model.cmbs[1][0][0], 'Heading modified', 'Heading 1')
+    bill_model = data_model.bills[1].get_model()
+    bill_model[1][2] = 'Bill 2 modified'
+    data_model.edit_bill_at_row(bill_model, 1)
+    modified = data_model.get_model_parts()
+    assert [part is old_part for part, old_part in zip(modified[1][1], parts[1][1])] == [True, False]
+    assert [part is old_part for part, old_part in zip(modified[1][2], parts[1][2])] == [True, False]
+    assert json.loads(modified[1][1][1].content) == data_model.cmbs[1].get_model()
+    assert json.loads(modified[1][2][1].content) == data_model.bills[1].get_model()
+    # Parts restored on undo
+    undo.stack().undo()
+    undo.stack().undo()
+    restored = data_model.get_model_parts()
+    assert [part.content for part in restored[1][1]] == [part.content for part in parts[1][1]]
+    assert [part.content for part in restored[1][2]] == [part.content for part in parts[1][2]]
+
+
+# Batches
+
+@pytest.fixture
+def stack():
+    """Empty undo stack set as current stack"""
+    old_stack = undo.stack()
+    new_stack = undo.Stack()
+    undo.setstack(new_stack)
+    yield new_stack
+    undo.setstack(old_stack)
+
+HEADING_MODEL = ['MeasurementItemHeading', ['Heading pasted']]
+
+def test_batch(migrated, stack):
+    model = migrated.get_model()
+    with migrated.batch('Paste'):
+        migrated.add_measurement_item_at_node(HEADING_MODEL, [0, 0, 1])
+        migrated.add_measurement_item_at_node(HEADING_MODEL, [1, 0, 1])
+    assert stack.undocount() == 1
+    assert migrated.bills[0].paths == [[0, 0, 2], [0, 0, 4]]
+    stack.undo()
+    assert migrated.get_model() == model
+    assert migrated.bills[0].paths == [[0, 0, 1], [0, 0, 3]]
+    stack.redo()
+    assert migrated.cmbs[1][0][1].get_text() == migrated.cmbs[0][0][1].get_text()
+
+def test_batch_aborted(migrated, stack):
+    model = migrated.get_model()
+    state = [[bill.paths, bill.bill_nettotal_amount] for bill in migrated.bills]
+    # Operation in middle of batch fails
+    with pytest.raises(IndexError):
+        with migrated.batch('Paste'):
+            migrated.add_measurement_item_at_node(HEADING_MODEL, [0, 0, 1])
+            migrated.add_measurement_item_at_node(HEADING_MODEL, [5, 0, 1])
+            migrated.add_measurement_item_at_node(HEADING_MODEL, [1, 0, 1])
+    # Operations done are undone and left out of undo stack
+    assert migrated.batch_depth == 0
+    assert not stack.canundo()
+    assert migrated.get_model() == model
+    assert [[bill.paths, bill.bill_nettotal_amount] for bill in migrated.bills] == state
+    # Later operations are added to undo stack
+    migrated.add_measurement_item_at_node(HEADING_MODEL, [0, 0, 1])
+    assert stack.undocount() == 1
+    stack.undo()
+    assert migrated.get_model() == model
+
+
+# Migration of VER_3.1 projects
+
+@pytest.fixture
+def migrated(project_model, project_settings):
+    """Data model loaded from VER_3.1 model using set_model"""
+    data_model = datamodel.DataModel(project_settings=project_settings)
+    data_model.set_model(project_model)
+    return data_model
+
+def test_set_model_migrates_paths(migrated):
+    item_ids = [[item.id for item in cmb[0].items] for cmb in migrated.cmbs]
+    assert migrated.bills[0].data.mitems == [item_ids[0][1], item_ids[0][3]]
+    assert migrated.bills[1].data.mitems == [item_ids[1][1], item_ids[1][2], item_ids[1][4]]
+    abstract = migrated.cmbs[1][0][4]
+    assert abstract.get_abstracted_items() == [item_ids[0][4], item_ids[0][5]]
+    # Values are evaluated from items refered
+    assert migrated.bills[0].paths == [[0, 0, 1], [0, 0, 3]]
+    assert migrated.bills[1].paths == [[1, 0, 1], [1, 0, 2], [1, 0, 4]]
+    assert abstract.paths == [[0, 0, 4], [0, 0, 5]]
+    steel_total = migrated.cmbs[0][0][4].get_total()[0] + migrated.cmbs[0][0][5].get_total()[0]
+    assert abstract.get_total()[0] == pytest.approx(steel_total)
+    assert migrated.bills[0].bill_nettotal_amount > 0
+    assert migrated.bills[1].bill_since_prev_amount > 0
+    assert migrated.lock_state.get_paths() == [[0, 0, 1], [0, 0, 3], [0, 0, 4], [0, 0, 5],
+                                               [1, 0, 1], [1, 0, 2], [1, 0, 4]]
+
+def test_set_model_current_version(migrated, project_settings):
+    model = migrated.get_model()
+    data_model = datamodel.DataModel(project_settings=project_settings)
+    data_model.set_model(model)
+    # Ids are retained
+    assert data_model.get_model() == model
+    assert get_state(data_model) == get_state(migrated)
+
+@pytest.fixture
+def forward_model(project_model):
+    """VER_3.1 model with abstract of first CMB refering to items of second CMB"""
+    cmb_models = project_model[1][1]
+    cmb_models.reverse()
+    items = cmb_models[0][1][1][0][1][1]
+    items[4] = ['MeasurementItemAbstract', [[[1, 0, 4], [1, 0, 5]], 'Abstract']]
+    for bill_model in project_model[1][2]:
+        bill_model[1][5] = [[1 - path[0]] + path[1:] for path in bill_model[1][5]]
+    return project_model
+
+def load_parts_updated(data_model, filename):
+    """Load project file, updating after every part as done while displaying a project being opened"""
+    for fraction in data_model.load_file(filename):
+        data_model.update()
+    data_model.update()
+
+@pytest.mark.parametrize('extension', ['.proj', misc.PROJECT_ARCHIVE_EXT])
+def test_load_parts_migrates_paths(tmp_path, extension, project_model, project_settings, migrated):
+    filename = str(tmp_path / ('project' + extension))
+    misc.write_project(filename, [PROJECT_FILE_VER_3_1, project_model, project_settings])
+    data_model = datamodel.DataModel(project_settings=project_settings)
+    load_parts_updated(data_model, filename)
+    assert data_model.get_model() == migrated.get_model()
+    assert get_state(data_model) == get_state(migrated)
+
+@pytest.mark.parametrize('extension', ['.proj', misc.PROJECT_ARCHIVE_EXT])
+def test_load_parts_forward_references(tmp_path, extension, forward_model, project_settings):
+    filename = str(tmp_path / ('project' + extension))
+    misc.write_project(filename, [PROJECT_FILE_VER_3_1, forward_model, project_settings])
+    data_model = datamodel.DataModel(project_settings=project_settings)
+    load_parts_updated(data_model, filename)
+    # Abstract refers to items of CMB read after it
+    item_ids = [item.id for item in data_model.cmbs[1][0].items]
+    abstract = data_model.cmbs[0][0][4]
+    assert abstract.get_abstracted_items() == [item_ids[4], item_ids[5]]
+    assert abstract.paths == [[1, 0, 4], [1, 0, 5]]
+    assert data_model.bills[0].paths == [[1, 0, 1], [1, 0, 3]]
+    expected = datamodel.DataModel(project_settings=project_settings)
+    expected.set_model(forward_model)
+    assert data_model.get_model() == expected.get_model()
+    assert data_model.lock_state.get_paths() == expected.lock_state.get_paths()
+
+def test_load_parts_current_version(tmp_path, project_settings, migrated):
+    filename = str(tmp_path / 'project.proj')
+    misc.write_project(filename, [misc.PROJECT_FILE_VER, migrated.get_model(), project_settings])
+    data_model = datamodel.DataModel(project_settings=project_settings)
+    load_parts_updated(data_model, filename)
+    # Ids read are kept, with no ids assigned before all CMBs are read
+    assert data_model.get_model() == migrated.get_model()
+    assert get_state(data_model) == get_state(migrated)
+
+
+# LockState
+
+def test_lock_state_items():
+    lock_state = datamodel.LockState([[1, 0, 2], [0, 1, 1]])
+    assert len(lock_state) == 2
+    assert lock_state[[1, 0, 2]] is True
+    assert [0, 1, 1] in lock_state
+    assert [0, 1, 2] not in lock_state
+    lock_state[[0, 0, 3]] = True
+    lock_state[[1, 0, 2]] = False
+    lock_state[[5, 5, 5]] = False
+    assert lock_state.get_paths() == [[0, 0, 3], [0, 1, 1]]
+
+def test_lock_state_paths_sorted():
+    lock_state = datamodel.LockState([[2, 0, 1], [0, 10, 1], [0, 2, 3], [0, 2, 1], [1, 0, 0]])
+    assert lock_state.get_paths() == [[0, 2, 1], [0, 2, 3], [0, 10, 1], [1, 0, 0], [2, 0, 1]]
+    assert lock_state.get_paths([0, 2]) == [[0, 2, 1], [0, 2, 3]]
+    assert lock_state.get_paths([0]) == [[0, 2, 1], [0, 2, 3], [0, 10, 1]]
+    assert lock_state.get_paths([3]) == []
+    # Sorted paths are rebuilt after modification
+    lock_state[[0, 2, 2]] = True
+    assert lock_state.get_paths([0, 2]) == [[0, 2, 1], [0, 2, 2], [0, 2, 3]]
+
+def test_lock_state_operators():
+    first = datamodel.LockState([[0, 0, 1], [0, 0, 2]])
+    second = datamodel.LockState([[0, 0, 2], [1, 0, 1]])
+    assert (first + second).get_paths() == [[0, 0, 1], [0, 0, 2], [1, 0, 1]]
+    assert (first - second).get_paths() == [[0, 0, 1]]
+    # Operands are not modified
+    assert first.get_paths() == [[0, 0, 1], [0, 0, 2]]
+    assert second.get_paths() == [[0, 0, 2], [1, 0, 1]]
+    first += second
+    assert first.get_paths() == [[0, 0, 1], [0, 0, 2], [1, 0, 1]]
+    first -= datamodel.LockState([[0, 0, 1]])
+    assert first.get_paths() == [[0, 0, 2], [1, 0, 1]]
+    assert second.get_paths() == [[0, 0, 2], [1, 0, 1]]
+
+def test_lock_state_copy():
+    lock_state = datamodel.LockState([[0, 0, 1]])
+    copy = lock_state.copy()
+    copy[[0, 0, 2]] = True
+    assert lock_state.get_paths() == [[0, 0, 1]]
+    assert copy.get_paths() == [[0, 0, 1], [0, 0, 2]]
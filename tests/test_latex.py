@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+#  test_latex.py
+#
+#  Copyright 2014 Manu Varkey <manuvarkey@gmail.com>
+#
+#  This program is free software; you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation; either version 2 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software
+#  Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+#  MA 02110-1301, USA.
+#
+#
+
+import io, os
+
+import pytest
+
+from cmbautomiser import misc
+
+
+@pytest.fixture(autouse=True)
+def template_cache(monkeypatch):
+    """Empty caches of parsed templates for each test"""
+    monkeypatch.setattr(misc.LatexFile, 'templates', dict())
+    monkeypatch.setattr(misc.LatexFile, 'template_files', dict())
+
+
+# Replacement
+
+def test_replace():
+    latex_file = misc.LatexFile('$a$ and $a$, $b$ $c$')
+    latex_file.replace({'$a$': 'x', '$b$': 'y', '$d$': 'z'})
+    assert latex_file.get_buffer() == 'x and x, y $c$'
+    # Replaced slots are not replaced again
+    latex_file.replace({'$a$': 'w'})
+    assert latex_file.get_buffer() == 'x and x, y $c$'
+
+def test_replace_text():
+    # Keys other than placeholders are replaced in text
+    latex_file = misc.LatexFile('Hello world, $a$')
+    latex_file.replace({'world': 'there', '$a$': 'x'})
+    assert latex_file.get_buffer() == 'Hello there, x'
+
+def test_replace_nested():
+    latex_file = misc.LatexFile('$a$ $b$')
+    # Placeholders in values are replaced by later replacements
+    latex_file.replace({'$a$': '<$c$>', '$b$': misc.LatexFile('[$c$]'), '$c$': 'z'})
+    assert latex_file.get_buffer() == '<z> [z]'
+
+def test_replace_and_clean():
+    latex_file = misc.LatexFile('$a$ $b$')
+    latex_file.replace_and_clean({'$a$': 'a_b 50%', '$b$': '$c$'})
+    assert latex_file.get_buffer() == 'a\\_ b 50\\%  \\$ c\\$ '
+    # Cleaned values are not parsed for placeholders
+    latex_file.replace({'$c$': 'x'})
+    assert latex_file.get_buffer() == 'a\\_ b 50\\%  \\$ c\\$ '
+
+def test_substitute_latex_file():
+    value = misc.LatexFile('($b$)')
+    latex_file = misc.LatexFile('$a$ $a$')
+    latex_file.substitute('$a$', value)
+    latex_file.substitute('$b$', 'x')
+    assert latex_file.get_buffer() == '(x) (x)'
+    # Value substituted is copied
+    assert value.get_buffer() == '($b$)'
+
+
+# Combining
+
+def test_copy():
+    latex_file = misc.LatexFile('$a$')
+    latex_file += misc.LatexFile('$b$')
+    copied = latex_file.copy()
+    copied.replace({'$a$': 'x', '$b$': 'y'})
+    assert copied.get_buffer() == 'x\ny'
+    assert latex_file.get_buffer() == '$a$\n$b$'
+
+def test_add():
+    first = misc.LatexFile('$a$')
+    second = misc.LatexFile('$a$ $b$')
+    combined = first + second
+    combined.replace({'$a$': 'x', '$b$': 'y'})
+    assert combined.get_buffer() == 'x\nx y'
+    assert first.get_buffer() == '$a$'
+    assert second.get_buffer() == '$a$ $b$'
+
+def test_iadd():
+    latex_file = misc.LatexFile('$a$')
+    other = misc.LatexFile('$b$')
+    latex_file += other
+    latex_file += other
+    latex_file.replace({'$b$': 'y'})
+    assert latex_file.get_buffer() == '$a$\ny\ny'
+    assert other.get_buffer() == '$b$'
+
+
+# Templates
+
+def test_from_template():
+    text = 'Name: $name$'
+    latex_file = misc.LatexFile.from_template('plugin.latex', text)
+    latex_file.replace({'$name$': 'first'})
+    assert latex_file.get_buffer() == 'Name: first'
+    parsed = misc.LatexFile.templates['plugin.latex'][1]
+    # Cached template is reused and not modified by replacements
+    latex_file = misc.LatexFile.from_template('plugin.latex', text)
+    assert misc.LatexFile.templates['plugin.latex'][1] is parsed
+    assert latex_file.get_buffer() == 'Name: $name$'
+    latex_file.replace({'$name$': 'second'})
+    assert latex_file.get_buffer() == 'Name: second'
+    # Template parsed again for different text
+    latex_file = misc.LatexFile.from_template('plugin.latex', 'Title: $name$')
+    assert misc.LatexFile.templates['plugin.latex'][1] is not parsed
+    assert latex_file.get_buffer() == 'Title: $name$'
+
+def test_from_file(tmp_path):
+    filename = str(tmp_path / 'template.tex')
+    with open(filename, 'w', encoding='utf8') as template:
+        template.write('Name: $name$')
+    latex_file = misc.LatexFile.from_file(filename)
+    latex_file.replace({'$name$': 'first'})
+    assert misc.LatexFile.from_file(filename).get_buffer() == 'Name: $name$'
+    # Template file read again when modified
+    with open(filename, 'w', encoding='utf8') as template:
+        template.write('Title: $name$')
+    mtime = os.stat(filename).st_mtime
+    os.utime(filename, (mtime + 10, mtime + 10))
+    assert misc.LatexFile.from_file(filename).get_buffer() == 'Title: $name$'
+
+def test_add_from_file(tmp_path):
+    preffix = str(tmp_path / 'preffix.tex')
+    suffix = str(tmp_path / 'suffix.tex')
+    with open(preffix, 'w', encoding='utf8') as template:
+        template.write('begin $a$')
+    with open(suffix, 'w', encoding='utf8') as template:
+        template.write('end $a$')
+    latex_file = misc.LatexFile('$a$')
+    latex_file.add_preffix_from_file(preffix)
+    latex_file.add_suffix_from_file(suffix)
+    latex_file.replace({'$a$': 'x'})
+    assert latex_file.get_buffer() == 'begin x\nx\nend x'
+    filename = str(tmp_path / 'output.tex')
+    latex_file.write(filename)
+    with open(filename, encoding='utf8') as output:
+        assert output.read() == 'begin x\nx\nend x'
+    assert misc.LatexFile.from_file(preffix).get_buffer() == 'begin $a$'
+
+
+# Writer
+
+class FailingSink(io.StringIO):
+    """Text sink raising an error on writing"""
+    
+    def write(self, text):
+        raise OSError('Disk full')
+
+def test_writer(tmp_path):
+    filename = str(tmp_path / 'output.tex')
+    replacements = [({'$a$': 'x_y', '$b$': '$c$'}, True), ({'$d$': '<$c$>', '$c$': 'z'}, False)]
+    parts = ['$a$ $b$', '$c$', '$d$']
+    with misc.LatexWriter(filename, replacements) as writer:
+        for part in parts:
+            writer.write(misc.LatexFile(part))
+    # Same as replacements on parts combined
+    expected = misc.LatexFile(parts[0])
+    for part in parts[1:]:
+        expected += misc.LatexFile(part)
+    expected.replace_and_clean(replacements[0][0])
+    expected.replace(replacements[1][0])
+    with open(filename, encoding='utf8') as output:
+        assert output.read() == expected.get_buffer() == 'x\\_ y \\$ c\\$ \nz\n<z>'
+
+def test_writer_queue():
+    sink = io.StringIO()
+    writer = misc.LatexWriter(sink, queue_size=1)
+    for number in range(100):
+        writer.write(misc.LatexFile(str(number)))
+    writer.close()
+    # Parts written in order and sink passed left open
+    assert sink.getvalue() == '\n'.join(str(number) for number in range(100))
+    assert not sink.closed
+
+def test_writer_error():
+    writer = misc.LatexWriter(FailingSink(), queue_size=1)
+    # Parts queued after an error are discarded without blocking
+    for number in range(10):
+        writer.write(misc.LatexFile(str(number)))
+    with pytest.raises(OSError):
+        writer.close()
+    assert not writer.thread.is_alive()
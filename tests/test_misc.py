@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+#  test_misc.py
+#
+#  Copyright 2014 Manu Varkey <manuvarkey@gmail.com>
+#
+#  This program is free software; you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation; either version 2 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software
+#  Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+#  MA 02110-1301, USA.
+#
+#
+
+import copy, json, zipfile
+
+import pytest
+
+from cmbautomiser import misc
+from cmbautomiser.data import datamodel
+
+from conftest import load_file
+
+
+# Expressions
+
+@pytest.mark.parametrize('text, value', [
+    ('12', 12),
+    (' 2.5 ', 2.5),
+    ('1+2*3', 7),
+    ('(1+2)*3', 9),
+    ('-4+ +2', -2),
+    ('7/2', 3.5),
+    ('7//2', 3),
+    ('7%3', 1),
+    ('2**10', 1024),
+    ('True', True),
+    ('False', False),
+])
+def test_evaluate_expression(text, value):
+    assert misc.evaluate_expression(text) == value
+    # Cached value is returned on repeat
+    assert misc.evaluate_expression(text) == value
+
+@pytest.mark.parametrize('text', [
+    '',
+    'abc',
+    '1+',
+    '"1"',
+    '[1, 2]',
+    '(1, 2)',
+    'abs(-1)',
+    '__import__("os")',
+    '().__class__',
+    '1 if True else 2',
+    '1 < 2',
+    'not 1',
+    '1/0',
+    '2**1000',
+    '9**9**9',
+])
+def test_evaluate_expression_rejected(text):
+    with pytest.raises(ValueError):
+        misc.evaluate_expression(text)
+    # Invalid expressions are cached and raise again
+    with pytest.raises(ValueError):
+        misc.evaluate_expression(text)
+
+def test_evaluate_expression_not_string():
+    with pytest.raises(ValueError):
+        misc.evaluate_expression(None)
+
+def test_float_from_str():
+    assert misc.float_from_str('3*1.5') == 4.5
+    assert misc.float_from_str('') == 0.0
+    assert misc.float_from_str('x') == 0.0
+
+
+# Project files
+
+def test_write_project_json(tmp_path, project):
+    filename = str(tmp_path / 'project.proj')
+    misc.write_project(filename, project)
+    assert not zipfile.is_zipfile(filename)
+    with open(filename) as fileobj:
+        assert json.load(fileobj) == project
+    assert not (tmp_path / 'project.proj.tmp').exists()
+
+def test_write_project_replaces_file(tmp_path, project):
+    filename = tmp_path / 'project.proj'
+    filename.write_text('Old project')
+    misc.write_project(str(filename), project)
+    with open(str(filename)) as fileobj:
+        assert json.load(fileobj) == project
+
+
+@pytest.fixture
+def saver(tmp_path):
+    """ProjectSaver with journals in temporary folder"""
+    return misc.ProjectSaver(str(tmp_path / 'autosave'), lambda: [None, None])
+
+def test_project_saver_snapshot(tmp_path, project, saver):
+    filename = str(tmp_path / 'project.proj')
+    expected = json.loads(json.dumps(project))
+    saver.save(filename, project)
+    # Changes after saving are not written
+    project[1][1][0][0][1] = 'Item modified'
+    project[1][1][2][1][1][2] = 'Bill 2 modified'
+    saver.flush()
+    with open(filename) as fileobj:
+        assert json.load(fileobj) == expected
+
+def test_project_saver_reuses_parts(tmp_path, project, saver, monkeypatch):
+    parts = misc.get_project_parts(project)
+    queued = []
+    monkeypatch.setattr(saver.queue, 'put', queued.append)
+    def deepcopy(*args):
+        raise AssertionError('Project copied')
+    monkeypatch.setattr(copy, 'deepcopy', deepcopy)
+    saver.save(str(tmp_path / 'project.proj'), parts)
+    # Serialised parts are queued without copying
+    snapshot = queued[0][1]
+    assert snapshot[1][1][0] is parts[1][1][0]
+    assert all(part is expected for part, expected in zip(snapshot[1][1][1], parts[1][1][1]))
+    assert all(part is expected for part, expected in zip(snapshot[1][1][2], parts[1][1][2]))
+
+
+# Project archives
+
+def test_write_project_archive(tmp_path, project):
+    filename = str(tmp_path / ('project' + misc.PROJECT_ARCHIVE_EXT))
+    misc.write_project(filename, project)
+    assert misc.ProjectArchive.is_archive(filename)
+    assert misc.ProjectArchive(filename).read_project() == project
+    assert not (tmp_path / ('project' + misc.PROJECT_ARCHIVE_EXT + '.tmp')).exists()
+
+def test_project_round_trip(tmp_path, project, project_settings):
+    json_filename = str(tmp_path / 'project.proj')
+    archive_filename = str(tmp_path / ('project' + misc.PROJECT_ARCHIVE_EXT))
+    # .proj to .cmbz
+    misc.write_project(json_filename, project)
+    data_model = datamodel.DataModel(project_settings=project_settings)
+    settings = load_file(data_model, json_filename)
+    data_model.update()
+    assert settings == project[2]
+    data_model.save_file(archive_filename, settings)
+    # .cmbz to .proj
+    data_model = datamodel.DataModel(project_settings=project_settings)
+    settings = load_file(data_model, archive_filename)
+    data_model.update()
+    assert settings == project[2]
+    assert data_model.get_model() == project[1]
+    data_model.save_file(json_filename, settings)
+    with open(json_filename) as fileobj:
+        assert json.load(fileobj) == project
+
+def test_archive_appends_modified_parts(tmp_path, project):
+    filename = str(tmp_path / ('project' + misc.PROJECT_ARCHIVE_EXT))
+    archive = misc.ProjectArchive(filename)
+    # Schedule, two CMBs and two bills
+    assert archive.write_project(project) == 5
+    assert archive.write_project(project) == 0
+    project[1][1][2][1][1][2] = 'Bill 2 modified'
+    assert archive.write_project(project) == 1
+    assert misc.ProjectArchive(filename).read_project() == project
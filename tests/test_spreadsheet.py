@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+#  test_spreadsheet.py
+#
+#  Copyright 2014 Manu Varkey <manuvarkey@gmail.com>
+#
+#  This program is free software; you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation; either version 2 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software
+#  Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+#  MA 02110-1301, USA.
+#
+#
+
+import openpyxl
+import pytest
+
+from cmbautomiser import misc
+
+
+def get_style(cell):
+    """Return style of cell as (bold, wrap_text, horizontal)"""
+    return (bool(cell.font.b), bool(cell.alignment.wrap_text), cell.alignment.horizontal)
+
+def get_values(sheet):
+    """Return values of rows of sheet"""
+    return [[cell.value for cell in row] for row in sheet.iter_rows()]
+
+
+# Write only sheets
+
+def test_write_rows(tmp_path):
+    filename = str(tmp_path / 'sheet.xlsx')
+    spreadsheet = misc.Spreadsheet(write_only=True)
+    spreadsheet.set_title('CMB')
+    spreadsheet.set_column_widths([10, 20])
+    spreadsheet.write_row(['Heading'], (True, False, 'center'))
+    spreadsheet.write_rows([[[], None], [['a', None, 1.5], (False, True, 'general')]])
+    spreadsheet.write_rows([[['b'], (True, False, 'center')], [['c', 2], None]], [(1, 3)])
+    spreadsheet.save(filename)
+    
+    sheet = openpyxl.load_workbook(filename).active
+    assert sheet.title == 'CMB'
+    assert sheet.column_dimensions['B'].width == 20
+    assert get_values(sheet) == [['Heading', None, None], [None, None, None],
+                                 ['a', None, 1.5], ['b', None, None], ['c', 2, None]]
+    # Cells with values keep their styles
+    assert get_style(sheet['A1']) == (True, False, 'center')
+    assert get_style(sheet['A3']) == (False, True, 'general')
+    assert get_style(sheet['C3']) == (False, True, 'general')
+    assert get_style(sheet['A4']) == (True, False, 'center')
+    # Merged cells numbered from first row written
+    assert [str(cell_range) for cell_range in sheet.merged_cells.ranges] == ['A4:C4']
+
+def test_write_rows_new_sheet(tmp_path):
+    filename = str(tmp_path / 'sheet.xlsx')
+    spreadsheet = misc.Spreadsheet(write_only=True)
+    spreadsheet.write_rows([[['a'], None], [['b'], None]], [(2, 2)])
+    spreadsheet.new_sheet()
+    spreadsheet.write_rows([[['c'], (True, True, 'general')]], [(1, 2)])
+    spreadsheet.save(filename)
+    
+    workbook = openpyxl.load_workbook(filename)
+    first, second = [workbook[name] for name in workbook.sheetnames]
+    assert [str(cell_range) for cell_range in first.merged_cells.ranges] == ['A2:B2']
+    assert [str(cell_range) for cell_range in second.merged_cells.ranges] == ['A1:B1']
+    assert get_values(second) == [['c', None]]
+    assert get_style(second['A1']) == (True, True, 'general')
+
+
+# Spreadsheet buffers
+
+def test_buffer_insert_data():
+    buffer = misc.SpreadsheetBuffer()
+    # Empty sheet has a blank row
+    assert buffer.length() == 1
+    buffer.append_data([['a', 1]], bold=True)
+    buffer.insert_data([['b']], 4, 2)
+    assert buffer.length() == 4
+    assert buffer.rows == [[[], None], [['a', 1], (True, True, 'general')],
+                           [[], None], [[None, 'b'], (False, True, 'general')]]
+    # Rows can only be added below last row
+    with pytest.raises(ValueError):
+        buffer.insert_data([['c']], 4)
+    buffer.pad_rows(6)
+    assert buffer.length() == 6
+
+def test_buffer_append():
+    buffer = misc.SpreadsheetBuffer()
+    buffer.add_merged_cell('Heading', width=3, bold=True)
+    other = misc.SpreadsheetBuffer()
+    other.append_data([['a']])
+    other.add_merged_cell('b')
+    buffer.append(other)
+    # Rows of buffer appended below last row, with merged cells offset
+    assert buffer.length() == 5
+    assert [row[0] for row in buffer.rows] == [[], ['Heading'], [], ['a'], ['b']]
+    assert buffer.merged_cells == [(2, 3), (5, 2)]
+
+def test_buffer_save(tmp_path):
+    filename = str(tmp_path / 'sheet.xlsx')
+    buffer = misc.SpreadsheetBuffer()
+    buffer.set_title('CMB')
+    buffer.set_column_widths([10, 20])
+    buffer.add_merged_cell('Heading', width=2, bold=True, horizontal='center')
+    other = misc.SpreadsheetBuffer()
+    other.append_data([['a', 1.5]], wrap_text=False)
+    buffer.append(other)
+    buffer.save(filename)
+    
+    sheet = openpyxl.load_workbook(filename).active
+    assert sheet.title == 'CMB'
+    assert sheet.column_dimensions['A'].width == 10
+    assert sheet.column_dimensions['B'].width == 20
+    assert get_values(sheet) == [[None, None], ['Heading', None], [None, None], ['a', 1.5]]
+    assert [str(cell_range) for cell_range in sheet.merged_cells.ranges] == ['A2:B2']
+    assert get_style(sheet['A2']) == (True, True, 'center')
+    assert get_style(sheet['B4']) == (False, False, 'general')
+
+
+# Regular sheets
+
+def test_append(tmp_path):
+    filename = str(tmp_path / 'sheet.xlsx')
+    spreadsheet = misc.Spreadsheet()
+    spreadsheet.append_data([['a', 1]], bold=True)
+    other = misc.Spreadsheet()
+    other.insert_data([['b', 2]], horizontal='center')
+    other.add_merged_cell('c', width=2)
+    spreadsheet.append(other)
+    spreadsheet.save(filename)
+    
+    sheet = openpyxl.load_workbook(filename).active
+    assert get_values(sheet) == [[None, None], ['a', 1], ['b', 2], ['c', None]]
+    assert get_style(sheet['B2']) == (True, True, 'general')
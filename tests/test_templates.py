@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+#  test_templates.py
+#
+#  Copyright 2014 Manu Varkey <manuvarkey@gmail.com>
+#
+#  This program is free software; you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation; either version 2 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software
+#  Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+#  MA 02110-1301, USA.
+#
+#
+
+import os, random
+
+import pytest
+
+from cmbautomiser import misc
+from cmbautomiser.data import measurement
+
+
+TEMPLATES = sorted(os.path.splitext(filename)[0] for filename in os.listdir(misc.abs_path('templates'))
+                   if filename.endswith('.py') and not filename.startswith('__'))
+
+
+def make_value(columntype, count, rand):
+    """Return value of column for record, with blank and zero values included"""
+    if columntype == misc.MEAS_DESC:
+        return 'Description ' + str(count)
+    elif columntype == misc.MEAS_CUST:
+        return ''
+    choice = rand.randrange(6)
+    if choice == 0:
+        return ''
+    elif choice == 1:
+        return '0'
+    elif columntype == misc.MEAS_NO:
+        return str(rand.randint(1, 20))
+    elif choice == 2:
+        return str(rand.randint(1, 9)) + '*' + str(rand.randint(1, 9)) + '.5'
+    else:
+        return str(round(rand.uniform(0.1, 50), 3))
+
+def make_item(template, count, seed=1):
+    """Return MeasurementItemCustom of template with count records"""
+    rand = random.Random(seed)
+    item = measurement.MeasurementItemCustom(None, template)
+    for number in range(count):
+        values = [make_value(columntype, number, rand) for columntype in item.columntypes]
+        item.append_record(measurement.RecordCustom(values, item.cust_funcs, item.total_func_item,
+                                                    item.columntypes))
+    return item
+
+
+@pytest.mark.parametrize('template', TEMPLATES)
+@pytest.mark.parametrize('count', [0, 1, 50])
+def test_total_func_columns(template, count):
+    item = make_item(template, count)
+    assert item.total_func_columns is not None
+    expected = item.total_func(item.records, item.user_data)
+    total = item.total_func_columns(item.get_columns(), item.user_data)
+    assert len(total) == len(expected)
+    for value, expected_value in zip(total, expected):
+        assert value == pytest.approx(expected_value)
+
+@pytest.mark.parametrize('template', TEMPLATES)
+def test_get_total_cache(template):
+    item = make_item(template, 10)
+    total = item.get_total()
+    assert item.get_total() == total
+    # Cached total is invalidated on modification of records
+    item.remove_record(0)
+    assert item.get_total() == item.total_func(item.records, item.user_data)
+    assert item.get_columns().length == 9
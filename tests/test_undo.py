@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+#  test_undo.py
+#
+#  Copyright 2014 Manu Varkey <manuvarkey@gmail.com>
+#
+#  This program is free software; you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation; either version 2 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software
+#  Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+#  MA 02110-1301, USA.
+#
+#
+
+import pytest
+
+from cmbautomiser import undo
+
+
+@undo.undoable
+def add_value(values, value):
+    """Undoable function appending value to list"""
+    values.append(value)
+    yield 'Add ' + value
+    values.pop()
+
+@pytest.fixture
+def stack():
+    """Stack set as current undo stack, actions sized by length of their text"""
+    old_stack = undo.stack()
+    new_stack = undo.Stack(sizefunc=lambda action: len(action.text()))
+    undo.setstack(new_stack)
+    yield new_stack
+    undo.setstack(old_stack)
+
+
+# Savepoint
+
+def test_savepoint(stack):
+    values = []
+    # Changed till savepoint is set
+    assert stack.haschanged()
+    stack.savepoint()
+    assert not stack.haschanged()
+    add_value(values, 'a')
+    assert stack.haschanged()
+    stack.undo()
+    assert not stack.haschanged()
+    stack.redo()
+    assert stack.haschanged()
+    stack.savepoint()
+    assert not stack.haschanged()
+    stack.undo()
+    assert stack.haschanged()
+    stack.clear()
+    assert stack.haschanged()
+
+def test_savepoint_after_undo(stack):
+    values = []
+    add_value(values, 'a')
+    add_value(values, 'b')
+    stack.undo()
+    stack.savepoint()
+    # Redos are dropped by a new action
+    add_value(values, 'c')
+    assert values == ['a', 'c']
+    assert not stack.canredo()
+    stack.undo()
+    assert not stack.haschanged()
+    assert values == ['a']
+
+
+# Eviction
+
+def test_size(stack):
+    values = []
+    add_value(values, 'a')
+    add_value(values, 'bb')
+    assert stack.size() == 11
+    stack.undo()
+    assert stack.size() == 11
+    # Size of redos dropped is released
+    add_value(values, 'c')
+    assert stack.size() == 10
+    stack.clear()
+    assert stack.size() == 0
+
+def test_size_computed_once(stack):
+    values = []
+    sized = []
+    stack.sizefunc = lambda action: sized.append(action) or len(action.text())
+    add_value(values, 'a')
+    stack.undo()
+    stack.redo()
+    stack.undo()
+    # Size is kept as action is undone and redone
+    assert len(sized) == 1
+    assert stack.size() == 5
+
+def test_eviction(stack):
+    values = []
+    stack.limit = 12
+    for value in 'abc':
+        add_value(values, value)
+    # Oldest action dropped
+    assert stack.undocount() == 2
+    assert stack.size() == 10
+    stack.undo()
+    stack.undo()
+    assert not stack.canundo()
+    assert values == ['a']
+    stack.redo()
+    stack.redo()
+    assert values == ['a', 'b', 'c']
+
+def test_eviction_keeps_last_action(stack):
+    values = []
+    stack.limit = 3
+    add_value(values, 'a')
+    add_value(values, 'b')
+    assert stack.undocount() == 1
+    stack.undo()
+    assert values == ['a']
+
+def test_eviction_savepoint(stack):
+    values = []
+    stack.limit = 12
+    add_value(values, 'a')
+    add_value(values, 'b')
+    stack.savepoint()
+    add_value(values, 'c')
+    stack.undo()
+    assert not stack.haschanged()
+    # Savepoint stays at state saved when older actions are dropped
+    stack.redo()
+    add_value(values, 'd')
+    assert stack.undocount() == 2
+    stack.undo()
+    stack.undo()
+    assert values == ['a', 'b']
+    assert not stack.haschanged()
+
+def test_eviction_savepoint_dropped(stack):
+    values = []
+    stack.limit = 12
+    stack.savepoint()
+    for value in 'abc':
+        add_value(values, value)
+    # State saved can no longer be reached by undoing
+    assert stack._savepoint is None
+    while stack.canundo():
+        stack.undo()
+        assert stack.haschanged()
+    assert values == ['a']